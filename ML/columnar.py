@@ -0,0 +1,299 @@
+from __future__ import annotations
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Cache layout (one directory per source CSV):
+#   <name>/columns/<i>.values.bin   numeric column, or int32 codes of a categorical one
+#   <name>/columns/<i>.data.bin     UTF-8 bytes of a text column, with
+#   <name>/columns/<i>.offsets.bin  int64 start offsets (n_rows + 1) and
+#   <name>/columns/<i>.missing.bin  a bool mask of missing values
+#   <name>/index.order.bin          row ids grouped by index key
+#   <name>/index.offsets.bin        start of each key's group in index.order.bin
+#   <name>/table.json               schema, categories, index keys and source stat (written last)
+# Every .bin file is raw little-endian data read back with np.memmap, so
+# opening a table costs a JSON parse and nothing is read until it is used.
+FORMAT_VERSION = 1
+MANIFEST_FILE = 'table.json'
+DEFAULT_CHUNK_SIZE = 100_000
+
+# Header names tried, in order, when no index column is given
+INDEX_CANDIDATES = ('disease', 'diseases', 'condition', 'indication', 'uses', 'use')
+
+# Text columns with at most this share of distinct values in the first chunk
+# (when ``categorical`` is not given)
+# are stored as categoricals
+CATEGORICAL_RATIO = 0.5
+
+
+def normalize_key(value) -> str:
+    return str(value).strip().lower()
+
+
+def _source_stat(path: Path) -> dict:
+    stat = os.stat(path)
+    return {'path': str(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _infer_schema(chunk: pd.DataFrame, dtypes: dict, categorical: set[str] | None, index_column: str | None) -> list[dict]:
+    """Column kinds and dtypes from the first chunk, overridden by explicit ``dtypes``"""
+    schema = []
+    for col in chunk.columns:
+        dtype = np.dtype(dtypes[col]) if col in dtypes and dtypes[col] not in ('category', 'str', str) else None
+        series = chunk[col]
+        if col == index_column:
+            kind = 'categorical'
+        elif dtype is None and col in dtypes:
+            kind = 'categorical' if dtypes[col] == 'category' else 'text'
+        elif dtype is not None or pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series):
+            dtype = dtype or (np.dtype(np.float64) if series.isna().any() and series.dtype.kind in 'iub'
+                              else series.dtype)
+            kind = 'numeric'
+        elif categorical is not None:
+            kind = 'categorical' if col in categorical else 'text'
+        else:
+            distinct = series.nunique(dropna=True)
+            kind = 'categorical' if distinct <= CATEGORICAL_RATIO * max(len(series), 1) else 'text'
+        schema.append({'name': col, 'kind': kind, 'dtype': str(dtype) if kind == 'numeric' else None})
+    return schema
+
+
+def build_table(csv_path: Path, out_dir: Path, index_column: str | None = None, dtypes: dict | None = None,
+                categorical: list[str] | None = None, chunk_size: int = DEFAULT_CHUNK_SIZE) -> dict:
+    """Stream a CSV in chunks into a memory-mappable columnar table.
+
+    Only one chunk is held in memory at a time. Column kinds come from the
+    first chunk unless given: numeric columns keep their dtype (``dtypes``
+    overrides it; ints with gaps become float64), low-cardinality text and
+    ``categorical`` columns are dictionary-encoded, other text is stored as
+    a byte blob with offsets. ``index_column`` (default: the first header
+    named like a disease column) gets a row index by normalized value.
+    """
+    csv_path, out_dir = Path(csv_path), Path(out_dir)
+    dtypes = dict(dtypes or {})
+    header = pd.read_csv(csv_path, nrows=0).columns.tolist()
+    if index_column is None:
+        lowered = {col.strip().lower(): col for col in header}
+        index_column = next((lowered[name] for name in INDEX_CANDIDATES if name in lowered), None)
+    elif index_column not in header:
+        raise ValueError(f"Index column '{index_column}' not in {csv_path.name}")
+
+    staging = out_dir.with_name(out_dir.name + '.tmp')
+    shutil.rmtree(staging, ignore_errors=True)
+    (staging / 'columns').mkdir(parents=True)
+
+    started = time.perf_counter()
+    sample = pd.read_csv(csv_path, nrows=chunk_size, low_memory=False)
+    if sample.empty:
+        raise ValueError(f"{csv_path.name} has no rows")
+    schema = _infer_schema(sample, dtypes, set(categorical) if categorical else None, index_column)
+    del sample
+    # Every chunk is parsed with the sample's types instead of re-inferring them
+    read_dtypes = {c['name']: (c['dtype'] if c['kind'] == 'numeric' else str) for c in schema}
+
+    files, categories, text_offsets, n_rows = {}, {}, {}, 0
+    try:
+        for i, column in enumerate(schema):
+            names = ('values',) if column['kind'] != 'text' else ('data', 'offsets', 'missing')
+            files[i] = {name: open(staging / 'columns' / f"{i}.{name}.bin", 'wb') for name in names}
+            if column['kind'] == 'categorical':
+                categories[i] = {}
+            elif column['kind'] == 'text':
+                text_offsets[i] = 0
+                files[i]['offsets'].write(np.zeros(1, dtype=np.int64).tobytes())
+
+        for chunk in pd.read_csv(csv_path, chunksize=chunk_size, dtype=read_dtypes):
+            for i, column in enumerate(schema):
+                series = chunk[column['name']]
+                if column['kind'] == 'numeric':
+                    files[i]['values'].write(np.ascontiguousarray(series.to_numpy(dtype=column['dtype'])).tobytes())
+                elif column['kind'] == 'categorical':
+                    lookup = categories[i]
+                    for value in pd.unique(series.dropna()):
+                        lookup.setdefault(value, len(lookup))
+                    codes = series.map(lookup).fillna(-1).to_numpy(dtype=np.int32)
+                    files[i]['values'].write(codes.tobytes())
+                else:
+                    missing = series.isna().to_numpy()
+                    encoded = [b'' if m else v.encode('utf-8') for v, m in zip(series.to_numpy(), missing)]
+                    lengths = np.fromiter((len(b) for b in encoded), dtype=np.int64, count=len(encoded))
+                    offsets = text_offsets[i] + np.cumsum(lengths)
+                    files[i]['data'].write(b''.join(encoded))
+                    files[i]['offsets'].write(offsets.tobytes())
+                    files[i]['missing'].write(missing.tobytes())
+                    if len(offsets):
+                        text_offsets[i] = int(offsets[-1])
+            n_rows += len(chunk)
+    finally:
+        for handles in files.values():
+            for handle in handles.values():
+                handle.close()
+
+    for i, column in enumerate(schema):
+        if column['kind'] == 'categorical':
+            column['categories'] = [str(value) for value in categories[i]]
+
+    index = None
+    if index_column is not None:
+        position = header.index(index_column)
+        codes = np.fromfile(staging / 'columns' / f"{position}.values.bin", dtype=np.int32)
+        # Several raw values can normalize to the same key ("Fever" / "fever ")
+        keys = sorted({normalize_key(value) for value in schema[position]['categories']})
+        key_ids = {key: k for k, key in enumerate(keys)}
+        key_of_code = np.array([key_ids[normalize_key(value)] for value in schema[position]['categories']]
+                               + [len(keys)], dtype=np.int64)
+        row_keys = key_of_code[codes]  # missing (-1) maps to the sentinel past the last key
+        order = np.argsort(row_keys, kind='stable')
+        offsets = np.searchsorted(row_keys[order], np.arange(len(keys) + 1)).astype(np.int64)
+        order.astype(np.int64).tofile(staging / 'index.order.bin')
+        offsets.tofile(staging / 'index.offsets.bin')
+        index = {'column': index_column, 'keys': keys}
+
+    manifest = {
+        'format_version': FORMAT_VERSION,
+        'rows': n_rows,
+        'columns': schema,
+        'index': index,
+        'source': {**_source_stat(csv_path), 'sha256': _sha256(csv_path)},
+        'build_seconds': round(time.perf_counter() - started, 3),
+    }
+    with open(staging / MANIFEST_FILE, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+
+    if out_dir.exists():
+        shutil.rmtree(out_dir)
+    os.replace(staging, out_dir)
+    return manifest
+
+
+class ColumnarTable:
+    """Read-only, memory-mapped view of a table written by ``build_table``.
+
+    Columns are mapped on first use and only the rows asked for are decoded,
+    so a lookup touches a few pages instead of loading the table.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        with open(self.directory / MANIFEST_FILE, encoding='utf-8') as f:
+            self.manifest = json.load(f)
+        if self.manifest.get('format_version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported table format {self.manifest.get('format_version')} in {directory}")
+        self.columns = [column['name'] for column in self.manifest['columns']]
+        self._positions = {name: i for i, name in enumerate(self.columns)}
+        self._maps: dict[str, np.ndarray] = {}
+        index = self.manifest.get('index')
+        self.index_column = index['column'] if index else None
+        self._keys = {key: i for i, key in enumerate(index['keys'])} if index else {}
+
+    def __len__(self) -> int:
+        return self.manifest['rows']
+
+    def _map(self, name: str, dtype) -> np.ndarray:
+        if name not in self._maps:
+            path = self.directory / name
+            count = os.path.getsize(path) // np.dtype(dtype).itemsize
+            self._maps[name] = np.memmap(path, dtype=dtype, mode='r', shape=(count,)) if count \
+                else np.empty(0, dtype=dtype)
+        return self._maps[name]
+
+    def is_fresh(self, csv_path: Path) -> bool:
+        """True if the CSV still has the size and mtime it had when the table was built"""
+        source = self.manifest['source']
+        stat = _source_stat(Path(csv_path))
+        return stat['size'] == source['size'] and stat['mtime_ns'] == source['mtime_ns']
+
+    def column(self, name: str) -> np.ndarray | pd.Categorical:
+        """A whole column: numeric columns stay memory-mapped, categoricals keep mapped codes"""
+        i = self._positions[name]
+        spec = self.manifest['columns'][i]
+        if spec['kind'] == 'numeric':
+            return self._map(f"columns/{i}.values.bin", spec['dtype'])
+        if spec['kind'] == 'categorical':
+            return pd.Categorical.from_codes(self._map(f"columns/{i}.values.bin", np.int32), spec['categories'])
+        return np.array(self._take_text(i, np.arange(len(self))), dtype=object)
+
+    def _take_text(self, i: int, rows: np.ndarray) -> list:
+        data = self._map(f"columns/{i}.data.bin", np.uint8)
+        offsets = self._map(f"columns/{i}.offsets.bin", np.int64)
+        missing = self._map(f"columns/{i}.missing.bin", np.bool_)
+        return [None if missing[row] else bytes(data[offsets[row]:offsets[row + 1]]).decode('utf-8')
+                for row in rows]
+
+    def take(self, rows, columns: list[str] | None = None) -> pd.DataFrame:
+        """Decode only the given rows of the given columns"""
+        rows = np.asarray(rows, dtype=np.int64)
+        frame = {}
+        for name in columns or self.columns:
+            i = self._positions[name]
+            spec = self.manifest['columns'][i]
+            if spec['kind'] == 'numeric':
+                frame[name] = np.asarray(self._map(f"columns/{i}.values.bin", spec['dtype'])[rows])
+            elif spec['kind'] == 'categorical':
+                codes = np.asarray(self._map(f"columns/{i}.values.bin", np.int32)[rows])
+                frame[name] = pd.Categorical.from_codes(codes, spec['categories'])
+            else:
+                frame[name] = self._take_text(i, rows)
+        return pd.DataFrame(frame, index=rows)
+
+    def rows_for(self, key) -> np.ndarray:
+        """Row ids whose index column matches ``key`` (case and whitespace insensitive)"""
+        if self.index_column is None:
+            raise ValueError('Table was built without an index column')
+        position = self._keys.get(normalize_key(key))
+        if position is None:
+            return np.empty(0, dtype=np.int64)
+        offsets = self._map('index.offsets.bin', np.int64)
+        return np.asarray(self._map('index.order.bin', np.int64)[offsets[position]:offsets[position + 1]])
+
+    def lookup(self, key, columns: list[str] | None = None, limit: int | None = None) -> pd.DataFrame:
+        """Rows for one index key, projected to ``columns``"""
+        return self.take(self.rows_for(key)[:limit], columns)
+
+    def to_pandas(self, columns: list[str] | None = None) -> pd.DataFrame:
+        return self.take(np.arange(len(self)), columns)
+
+
+def open_table(csv_path: Path, cache_dir: Path, rebuild: bool = False, **build_options) -> ColumnarTable:
+    """Open the columnar cache of a CSV, (re)building it when missing or stale"""
+    csv_path = Path(csv_path)
+    directory = Path(cache_dir) / csv_path.stem.replace(' ', '_')
+    if not rebuild and (directory / MANIFEST_FILE).is_file():
+        table = ColumnarTable(directory)
+        if table.is_fresh(csv_path):
+            return table
+    build_table(csv_path, directory, **build_options)
+    return ColumnarTable(directory)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert a CSV into a memory-mapped columnar table')
+    parser.add_argument('csv', help='CSV file to convert')
+    parser.add_argument('out', help='Output directory')
+    parser.add_argument('--index-column', help='Column to index rows by (default: a disease-like header)')
+    parser.add_argument('--categorical', nargs='+', help='Text columns to dictionary-encode')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+    manifest = build_table(Path(args.csv), Path(args.out), index_column=args.index_column,
+                           categorical=args.categorical, chunk_size=args.chunk_size)
+    kinds = ', '.join(f"{column['name']}:{column['kind']}" for column in manifest['columns'])
+    print(f"[columnar] {manifest['rows']} rows in {manifest['build_seconds']}s -> {args.out} ({kinds})")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,19 +1,54 @@
 import pandas as pd
 import numpy as np
+from scipy import sparse
 import pickle
 import os
+import time
+from typing import Optional
+from joblib import Parallel, delayed
 from sklearn.tree import DecisionTreeClassifier
 from sklearn.naive_bayes import MultinomialNB
 from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier, VotingClassifier
 from sklearn.svm import SVC
 from sklearn.linear_model import LogisticRegression
-from sklearn.model_selection import cross_val_score
-from sklearn.preprocessing import StandardScaler
+from sklearn.preprocessing import LabelEncoder, StandardScaler
+from sklearn.utils import Bunch
 import warnings
 warnings.filterwarnings('ignore')
 
+try:
+    from ML.datasets import read_csv_cached
+    from ML.incremental import (boosting_stages, changed_rows, extend_boosting, refit_forest_trees,
+                                refit_naive_bayes, row_hashes, warm_start_fit)
+    from ML.linear_engine import SparseLinearScorer, is_linear_model
+    from ML.model_store import load_any, resolve_artifact, save_artifact
+    from ML.pivot import SymptomPivot, load_pivot
+    from ML.ranking import top_k
+    from ML.selection import augment_symptom_subsets, cross_validate, measure_latency, model_size, select_model
+    from ML.tree_engine import FlatTreeEnsemble, is_tree_model
+    from ML.vectorizer import SymptomVectorizer
+except ImportError:  # run as a script from inside ML/
+    from datasets import read_csv_cached
+    from incremental import (boosting_stages, changed_rows, extend_boosting, refit_forest_trees,
+                             refit_naive_bayes, row_hashes, warm_start_fit)
+    from linear_engine import SparseLinearScorer, is_linear_model
+    from model_store import load_any, resolve_artifact, save_artifact
+    from pivot import SymptomPivot, load_pivot
+    from ranking import top_k
+    from selection import augment_symptom_subsets, cross_validate, measure_latency, model_size, select_model
+    from tree_engine import FlatTreeEnsemble, is_tree_model
+    from vectorizer import SymptomVectorizer
+
+def _fit_and_score(estimator, x, y):
+    """Fit one estimator; returns it with its training accuracy and fit time"""
+    started = time.perf_counter()
+    estimator.fit(x, y)
+    seconds = time.perf_counter() - started
+    return estimator, estimator.score(x, y), seconds
+
+
 class DiseasePredictionModel:
-    def __init__(self):
+    def __init__(self, use_tree_engine=True, use_linear_scorer=True):
         self.dt_model = None
         self.nb_model = None
         self.rf_model = None
@@ -23,173 +58,468 @@ class DiseasePredictionModel:
         self.ensemble_model = None
         self.scaler = None
         self.feature_cols = None
+        self.vectorizer = None
         self.diseases = None
         self.best_model = None
         self.best_accuracy = 0
+        self.selection = None
+        self.student_model = None
+        self.distillation = None
+        # Row hashes of the training set, for update_models, and how many
+        # times the models were trained or updated
+        self.training_rows = None
+        self.bundle_version = 0
+        self.last_update = None
+        # Tree models predict through ML/tree_engine.py and Naive Bayes and
+        # Logistic Regression through ML/linear_engine.py, compiled on first use
+        self.use_tree_engine = use_tree_engine
+        self.use_linear_scorer = use_linear_scorer
+        self._engines = {}
         
-    def load_data(self):
+    def load_data(self, use_cache=True, source='edges'):
+        """Training matrix and labels, one row per disease.
+        
+        source='edges' builds a sparse CSR matrix from the common_clean.csv
+        edge list (see pivot.py); 'pivot' reads the dense common Pivoted.csv.
+        """
         base_dir = os.path.dirname(os.path.abspath(__file__))
+        if source == 'edges':
+            pivot = load_pivot() if use_cache else SymptomPivot.from_edges()
+            self.feature_cols = list(pivot.symptoms)
+            self.vectorizer = SymptomVectorizer(self.feature_cols)
+            return pivot.matrix(), np.asarray(pivot.diseases, dtype=object)
+        
         data_path = os.path.join(base_dir, '..', 'Datasets', 'common Pivoted.csv')
-        df_pivoted = pd.read_csv(data_path)
+        df_pivoted = read_csv_cached(data_path) if use_cache else pd.read_csv(data_path)
         
         if 'Unnamed: 0' in df_pivoted.columns:
             df_pivoted = df_pivoted.drop('Unnamed: 0', axis=1)
         
         self.feature_cols = [col for col in df_pivoted.columns if col != 'Source']
+        self.vectorizer = SymptomVectorizer(self.feature_cols)
         x = df_pivoted[self.feature_cols]
         y = df_pivoted['Source']
         
         return x, y
     
-    def train_models(self):
-        x, y = self.load_data()
-        
-        # Scale features for models that benefit from it
-        self.scaler = StandardScaler()
-        x_scaled = self.scaler.fit_transform(x)
-        
-        models = {}
-        
-        # Decision Tree with optimized parameters
-        self.dt_model = DecisionTreeClassifier(
-            max_depth=20,
-            min_samples_split=5,
-            min_samples_leaf=2,
-            random_state=42
-        )
-        self.dt_model.fit(x, y)
-        dt_accuracy = self.dt_model.score(x, y)
-        models['Decision Tree'] = (self.dt_model, dt_accuracy, x)
-        
-        # Multinomial Naive Bayes
-        self.nb_model = MultinomialNB(alpha=0.1)
-        self.nb_model.fit(x, y)
-        nb_accuracy = self.nb_model.score(x, y)
-        models['Naive Bayes'] = (self.nb_model, nb_accuracy, x)
-        
-        # Random Forest
-        self.rf_model = RandomForestClassifier(
-            n_estimators=100,
-            max_depth=15,
-            min_samples_split=5,
-            random_state=42
-        )
-        self.rf_model.fit(x, y)
-        rf_accuracy = self.rf_model.score(x, y)
-        models['Random Forest'] = (self.rf_model, rf_accuracy, x)
-        
-        # Gradient Boosting
-        self.gb_model = GradientBoostingClassifier(
-            n_estimators=100,
-            learning_rate=0.1,
-            max_depth=6,
-            random_state=42
-        )
-        self.gb_model.fit(x, y)
-        gb_accuracy = self.gb_model.score(x, y)
-        models['Gradient Boosting'] = (self.gb_model, gb_accuracy, x)
-        
-        # SVM
-        self.svm_model = SVC(
-            kernel='rbf',
-            C=1.0,
-            probability=True,
-            random_state=42
-        )
-        self.svm_model.fit(x_scaled, y)
-        svm_accuracy = self.svm_model.score(x_scaled, y)
-        models['SVM'] = (self.svm_model, svm_accuracy, x_scaled)
-        
-        # Logistic Regression
-        self.lr_model = LogisticRegression(
-            max_iter=1000,
-            random_state=42
-        )
-        self.lr_model.fit(x_scaled, y)
-        lr_accuracy = self.lr_model.score(x_scaled, y)
-        models['Logistic Regression'] = (self.lr_model, lr_accuracy, x_scaled)
+    def build_estimators(self):
+        """Unfitted base estimators as (name, attribute, estimator, scaled input),
+        slowest first so a parallel run starts on them straight away"""
+        return [
+            ('Gradient Boosting', 'gb_model', GradientBoostingClassifier(
+                n_estimators=100,
+                learning_rate=0.1,
+                max_depth=6,
+                random_state=42
+            ), False),
+            ('SVM', 'svm_model', SVC(
+                kernel='rbf',
+                C=1.0,
+                probability=True,
+                random_state=42
+            ), True),
+            ('Random Forest', 'rf_model', RandomForestClassifier(
+                n_estimators=100,
+                max_depth=15,
+                min_samples_split=5,
+                random_state=42
+            ), False),
+            ('Logistic Regression', 'lr_model', LogisticRegression(
+                max_iter=1000,
+                random_state=42
+            ), True),
+            ('Decision Tree', 'dt_model', DecisionTreeClassifier(
+                max_depth=20,
+                min_samples_split=5,
+                min_samples_leaf=2,
+                random_state=42
+            ), False),
+            ('Naive Bayes', 'nb_model', MultinomialNB(alpha=0.1), False),
+        ]
+    
+    def build_ensemble(self, y):
+        """Soft-voting ensemble over the already fitted RF, GB and DT models.
         
-        # Ensemble Model (Voting Classifier)
-        self.ensemble_model = VotingClassifier(
+        Fitting a VotingClassifier would clone and refit all three; setting its
+        fitted attributes directly gives the same model without the extra work.
+        """
+        ensemble = VotingClassifier(
             estimators=[
                 ('rf', self.rf_model),
                 ('gb', self.gb_model),
                 ('dt', self.dt_model)
             ],
-            voting='soft'
+            voting='soft',
+            # Only changes transform(); skl2onnx cannot convert the flattened form
+            flatten_transform=False
         )
-        self.ensemble_model.fit(x, y)
+        ensemble.estimators_ = [self.rf_model, self.gb_model, self.dt_model]
+        ensemble.named_estimators_ = Bunch(rf=self.rf_model, gb=self.gb_model, dt=self.dt_model)
+        ensemble.le_ = LabelEncoder().fit(y)
+        ensemble.classes_ = ensemble.le_.classes_
+        return ensemble
+    
+    def train_models(self, n_jobs=-1, use_cache=True, cv_folds=5, max_p99_ms=None, accuracy_tolerance=0.005,
+                     source='edges'):
+        """Fit every model, using up to n_jobs processes (-1: all cores), then
+        pick best_model by cross-validated accuracy and serving latency.
+        
+        max_p99_ms is a single-row latency budget; models within
+        accuracy_tolerance of the best CV accuracy count as tied and the
+        fastest wins. cv_folds < 2 falls back to training-set accuracy.
+        """
+        started = time.perf_counter()
+        self._engines = {}
+        self.student_model = self.distillation = self.last_update = None
+        x, y = self.load_data(use_cache=use_cache, source=source)
+        self.training_rows = {'labels': list(y), 'hashes': row_hashes(x, y, self.feature_cols)}
+        self.bundle_version += 1
+        print(f"Loaded data in {time.perf_counter() - started:.2f}s")
+        
+        # Scale features for models that benefit from it (centered, so dense)
+        self.scaler = StandardScaler()
+        x_scaled = self.scaler.fit_transform(x.toarray() if sparse.issparse(x) else x)
+        
+        estimators = self.build_estimators()
+        results = Parallel(n_jobs=n_jobs)(
+            delayed(_fit_and_score)(estimator, x_scaled if scaled else x, y)
+            for _, _, estimator, scaled in estimators
+        )
+        
+        models, fit_seconds = {}, {}
+        for (name, attr, _, scaled), (model, accuracy, seconds) in zip(estimators, results):
+            setattr(self, attr, model)
+            models[name] = (model, accuracy, scaled)
+            fit_seconds[name] = seconds
+            print(f"{name} trained in {seconds:.2f}s")
+        
+        # Ensemble Model (Voting Classifier)
+        fit_started = time.perf_counter()
+        self.ensemble_model = self.build_ensemble(y)
         ensemble_accuracy = self.ensemble_model.score(x, y)
-        models['Ensemble'] = (self.ensemble_model, ensemble_accuracy, x)
+        models['Ensemble'] = (self.ensemble_model, ensemble_accuracy, False)
+        fit_seconds['Ensemble'] = time.perf_counter() - fit_started
+        print(f"Ensemble assembled in {fit_seconds['Ensemble']:.2f}s")
         
         self.diseases = self.dt_model.classes_
         
-        # Find best model
-        for name, (model, accuracy, _) in models.items():
-            print(f"{name} Accuracy: {accuracy:.4f}")
-            if accuracy > self.best_accuracy:
-                self.best_accuracy = accuracy
-                self.best_model = model
+        table = {name: {'train_accuracy': float(accuracy), 'fit_seconds': round(fit_seconds[name], 4)}
+                 for name, (_, accuracy, _) in models.items()}
+        if cv_folds >= 2:
+            cv_started = time.perf_counter()
+            cv_results = cross_validate(
+                [(name, estimator, scaled) for name, _, estimator, scaled in estimators], x, y,
+                folds=cv_folds, n_jobs=n_jobs,
+                ensembles={'Ensemble': ['Random Forest', 'Gradient Boosting', 'Decision Tree']}
+            )
+            print(f"Cross-validated in {time.perf_counter() - cv_started:.2f}s")
+            rows = x.toarray() if sparse.issparse(x) else x.to_numpy()
+            for name, (model, _, scaled) in models.items():
+                # Time what predict_disease will run, the tree engine included
+                served, scaled = self._served(model, scaled)
+                predict = (lambda m: lambda r: m.predict_proba(self.scaler.transform(r)))(served) if scaled \
+                    else served.predict_proba
+                table[name].update(cv_results[name])
+                table[name].update(measure_latency(predict, rows))
+                table[name]['size_bytes'] = model_size(model)
+            selected = select_model(table, max_p99_ms=max_p99_ms, accuracy_tolerance=accuracy_tolerance)
+            accuracy_key = 'cv_accuracy'
+        else:
+            selected = max(table, key=lambda name: table[name]['train_accuracy'])
+            accuracy_key = 'train_accuracy'
+        
+        for name, row in table.items():
+            line = f"{name} Accuracy: {row['train_accuracy']:.4f}"
+            if 'cv_accuracy' in row:
+                line += (f" | CV {row['cv_accuracy']:.4f} (+/- {row['cv_std']:.4f})"
+                         f" | p99 {row['p99_ms']:.2f} ms | batch {row['batch_ms']:.1f} ms"
+                         f" | {row['size_bytes'] / 1024:.0f} KB")
+            print(line)
+        
+        self.best_model = models[selected][0]
+        self.best_accuracy = table[selected][accuracy_key]
+        self.selection = {
+            'selected': selected,
+            'metric': accuracy_key,
+            'max_p99_ms': max_p99_ms,
+            'accuracy_tolerance': accuracy_tolerance,
+            'results': table,
+        }
         
-        print(f"\nBest Model Accuracy: {self.best_accuracy:.4f}")
+        print(f"\nBest Model: {selected} ({accuracy_key.replace('_', ' ')} {self.best_accuracy:.4f})")
+        print(f"Total training time: {time.perf_counter() - started:.2f}s")
         
         return self
     
-    def predict_disease(self, symptoms, model_type='best', top_n=3):
+    def update_models(self, use_cache=True, source='edges', min_boosting_stages=10, max_boosting_growth=2.0,
+                      max_changed_fraction=0.5, subset_copies=4, random_state=42, **train_options):
+        """Bring loaded models up to date with the current training rows,
+        retraining only what changed; falls back to train_models when it can't.
+        
+        Rows are matched to the previous training set by hash (see
+        incremental.py). Random Forest refits only the trees whose bootstrap
+        drew a changed row and Naive Bayes recounts only the changed
+        diseases, both equal to a fresh fit; the forest saves little unless
+        one or two rows changed, as most trees draw any few given rows.
+        Gradient Boosting adds stages in proportion to the change (at least
+        min_boosting_stages) on top of the old ones, and is refitted from
+        scratch instead once that would take it past max_boosting_growth
+        times its configured stages. Logistic Regression warm-starts from
+        its previous weights, and the Decision Tree and SVM, which have no
+        incremental fit, are refitted. New symptoms or diseases, a different
+        number of rows or more than max_changed_fraction of the rows changed
+        retrain everything with train_options. A distilled student is
+        distilled again.
+        
+        The previous and updated models are compared on subset_copies
+        patient-like subsets of every training row, and of the changed rows
+        alone. These are augmented training rows, not held-out data, so the
+        comparison shows whether the update fits the new rows without
+        losing the old ones rather than how it generalises. It is kept in
+        last_update and saved with the bundle.
+        """
         if self.dt_model is None:
+            raise ValueError("No models to update. Call load_model() or train_models() first.")
+        
+        started = time.perf_counter()
+        previous_features = self.feature_cols
+        x, y = self.load_data(use_cache=use_cache, source=source)
+        y = np.asarray(y, dtype=object)
+        hashes = row_hashes(x, y, self.feature_cols)
+        changed = changed_rows(self.training_rows, hashes, y) if self.feature_cols == previous_features else None
+        had_student = self.student_model is not None
+        if changed is None or len(changed) > max_changed_fraction * len(hashes):
+            reason = 'too many changed rows' if changed is not None else 'symptoms, diseases or rows changed'
+            print(f"Retraining from scratch: {reason}")
+            self.train_models(use_cache=use_cache, source=source, **train_options)
+            if had_student:
+                self.distill(use_cache=use_cache, source=source)
+            return self
+        if len(changed) == 0:
+            print("No training rows changed")
+            return self
+        
+        previous_labels = np.asarray(self.training_rows['labels'], dtype=object)
+        diseases = set(y[changed]) | set(previous_labels[changed])
+        print(f"{len(changed)} of {len(hashes)} rows changed ({len(diseases)} diseases)")
+        
+        # Patient-like subsets of every training row, flagged where the row changed
+        subsets, subsets_y = augment_symptom_subsets(x, y, subset_copies, random_state=random_state + 2)
+        subsets = subsets.toarray()
+        in_changed = np.tile(np.isin(np.arange(len(hashes)), changed), subset_copies + 1)
+        candidates = [(name, attr, scaled) for name, attr, _, scaled in self.build_estimators()]
+        candidates.append(('Ensemble', 'ensemble_model', False))
+        previous = self._subset_predictions(candidates, subsets)
+        
+        x_dense = x.toarray() if sparse.issparse(x) else x
+        updates = {}
+        
+        def timed(name, update):
+            step = time.perf_counter()
+            updates[name] = {'update': update(), 'seconds': round(time.perf_counter() - step, 4)}
+        
+        def refit(model, rows, warm_start=False):
+            if warm_start:
+                warm_start_fit(model, rows, y)
+                return 'warm start'
+            model.fit(rows, y)
+            return 'refit'
+        
+        timed('Random Forest', lambda: f"refit {refit_forest_trees(self.rf_model, x, y, changed)} of "
+                                       f"{len(self.rf_model.estimators_)} trees")
+        timed('Naive Bayes', lambda: f"recounted {refit_naive_bayes(self.nb_model, x, y, diseases)} rows")
+        stages = boosting_stages(self.gb_model, len(changed) / len(hashes), min_boosting_stages)
+        base_stages = next(estimator.n_estimators for _, attr, estimator, _ in self.build_estimators()
+                           if attr == 'gb_model')
+        if self.gb_model.n_estimators_ + stages > max_boosting_growth * base_stages:
+            # Stages only accumulate, so past the cap start over at the configured size
+            timed('Gradient Boosting', lambda: f"{refit(self.gb_model.set_params(n_estimators=base_stages), x)} "
+                                               f"with {base_stages} stages")
+        else:
+            timed('Gradient Boosting', lambda: f"added {stages} stages "
+                                               f"(now {extend_boosting(self.gb_model, x, y, stages)})")
+        timed('Decision Tree', lambda: refit(self.dt_model, x))
+        # The scaler follows the new rows, as in train_models
+        self.scaler = StandardScaler()
+        x_scaled = self.scaler.fit_transform(x_dense)
+        timed('Logistic Regression', lambda: refit(self.lr_model, x_scaled, warm_start=True))
+        timed('SVM', lambda: refit(self.svm_model, x_scaled))
+        
+        previous_ensemble = self.ensemble_model
+        self.ensemble_model = self.build_ensemble(y)
+        if self.best_model is previous_ensemble:
+            self.best_model = self.ensemble_model
+        updates['Ensemble'] = {'update': 'reassembled', 'seconds': 0.0}
+        self._engines = {}
+        
+        updated = self._subset_predictions(candidates, subsets)
+        for name, row in updates.items():
+            row.update({
+                'previous_accuracy': float(np.mean(previous[name] == subsets_y)),
+                'updated_accuracy': float(np.mean(updated[name] == subsets_y)),
+                'previous_changed_accuracy': float(np.mean(previous[name][in_changed] == subsets_y[in_changed])),
+                'updated_changed_accuracy': float(np.mean(updated[name][in_changed] == subsets_y[in_changed])),
+            })
+            print(f"{name}: {row['update']} in {row['seconds']:.2f}s | subsets {row['previous_accuracy']:.4f}"
+                  f" -> {row['updated_accuracy']:.4f} | changed rows {row['previous_changed_accuracy']:.4f}"
+                  f" -> {row['updated_changed_accuracy']:.4f}")
+        
+        self.training_rows = {'labels': list(y), 'hashes': hashes}
+        self.bundle_version += 1
+        if had_student:
+            self.distill(use_cache=use_cache, source=source)
+        self.last_update = {
+            'version': self.bundle_version,
+            'changed_rows': int(len(changed)),
+            'rows': len(hashes),
+            'diseases': sorted(diseases),
+            'subset_rows': int(len(subsets_y)),
+            'seconds': round(time.perf_counter() - started, 4),
+            'models': updates,
+        }
+        print(f"Updated to version {self.bundle_version} in {self.last_update['seconds']:.2f}s")
+        
+        return self
+    
+    def _subset_predictions(self, candidates, rows):
+        """Labels each (name, attribute, scaled input) model predicts for dense rows"""
+        scaled_rows = self.scaler.transform(rows)
+        return {name: np.asarray(getattr(self, attr).predict(scaled_rows if scaled else self._model_input(rows, False)),
+                                 dtype=object)
+                for name, attr, scaled in candidates}
+    
+    def distill(self, copies=8, top_classes=5, hard_weight=0.1, c=1.0, use_cache=True, source='edges',
+                random_state=42):
+        """Fit student_model, a multinomial logistic regression on raw symptom
+        rows, to the soft probabilities of the voting ensemble (the teacher).
+        
+        The transfer set is every training row plus `copies` patient-like
+        subsets of each (see selection.py). Each transfer row is repeated for
+        the teacher's top_classes diseases, weighted by their probabilities,
+        so the student learns the teacher's ranking rather than one label;
+        the training rows also keep their own disease at hard_weight, which
+        leaves every disease among the student's classes. Agreement is
+        measured on subsets drawn with another seed: top-1 is the share of
+        rows where both models pick the same disease, top-3 the share where
+        the teacher's pick is in the student's top three.
+        """
+        if self.ensemble_model is None:
             raise ValueError("Models not trained. Call train_models() first.")
         
-        input_vector = [0] * len(self.feature_cols)
-        found_symptoms = []
+        started = time.perf_counter()
+        x, y = self.load_data(use_cache=use_cache, source=source)
+        teacher, _ = self._served(self.ensemble_model)
+        
+        def teacher_probabilities(rows):
+            return teacher.predict_proba(self._model_input(rows.toarray(), False))
+        
+        rows, _ = augment_symptom_subsets(x, y, copies, random_state=random_state)
+        probabilities = teacher_probabilities(rows)
+        top_indices = np.argsort(-probabilities, axis=1)[:, :top_classes]
+        classes = self.ensemble_model.classes_
+        n_rows = rows.shape[0]
+        soft_x = rows[np.repeat(np.arange(n_rows), top_classes)]
+        soft_y = classes[top_indices.ravel()]
+        soft_weight = np.take_along_axis(probabilities, top_indices, axis=1).ravel()
+        hard_x = sparse.csr_matrix(x.to_numpy() if isinstance(x, pd.DataFrame) else x)
+        transfer_x = sparse.vstack([soft_x, hard_x], format='csr')
+        transfer_y = np.concatenate([soft_y, np.asarray(y, dtype=object)])
+        sample_weight = np.concatenate([soft_weight, np.full(hard_x.shape[0], hard_weight)])
         
-        for symptom in symptoms:
-            if symptom in self.feature_cols:
-                input_vector[self.feature_cols.index(symptom)] = 1
-                found_symptoms.append(symptom)
+        student = LogisticRegression(C=c, max_iter=1000, random_state=random_state)
+        student.fit(transfer_x, transfer_y, sample_weight=sample_weight)
+        if not np.array_equal(student.classes_, classes):
+            raise ValueError("Student classes differ from the teacher's")
+        fit_seconds = time.perf_counter() - started
         
-        input_vector = np.array([input_vector])
-        input_df = pd.DataFrame(input_vector, columns=self.feature_cols)
+        held_out, _ = augment_symptom_subsets(x, y, copies, random_state=random_state + 1)
+        teacher_top1 = np.argmax(teacher_probabilities(held_out), axis=1)
+        self.student_model = student
+        served, _ = self._served(student)
+        student_top3 = np.argsort(-served.predict_proba(self._model_input(held_out.toarray(), False)), axis=1)[:, :3]
         
-        # Select model based on type
+        dense = hard_x.toarray()
+        self.distillation = {
+            'transfer_rows': int(n_rows),
+            'top_classes': top_classes,
+            'hard_weight': hard_weight,
+            'evaluation_rows': int(held_out.shape[0]),
+            'top1_agreement': float(np.mean(student_top3[:, 0] == teacher_top1)),
+            'top3_agreement': float(np.mean((student_top3 == teacher_top1[:, np.newaxis]).any(axis=1))),
+            'fit_seconds': round(fit_seconds, 4),
+            'teacher': {'name': 'Ensemble', 'size_bytes': model_size(self.ensemble_model),
+                        **measure_latency(lambda r: teacher.predict_proba(self._model_input(r, False)), dense)},
+            'student': {'name': 'Logistic Regression', 'size_bytes': model_size(student),
+                        **measure_latency(lambda r: served.predict_proba(self._model_input(r, False)), dense)},
+        }
+        
+        teacher_row, student_row = self.distillation['teacher'], self.distillation['student']
+        print(f"Student distilled in {fit_seconds:.2f}s | top-1 agreement {self.distillation['top1_agreement']:.4f}"
+              f" | top-3 agreement {self.distillation['top3_agreement']:.4f}")
+        print(f"Teacher p99 {teacher_row['p99_ms']:.2f} ms, {teacher_row['size_bytes'] / 1024:.0f} KB"
+              f" | student p99 {student_row['p99_ms']:.2f} ms, {student_row['size_bytes'] / 1024:.0f} KB")
+        
+        return self
+    
+    def _served(self, model, scaled=False):
+        """What predictions run on for a model (its tree engine or linear scorer
+        if it has one, else the model) and whether that expects scaled input"""
+        tree = self.use_tree_engine and is_tree_model(model)
+        if not tree and not (self.use_linear_scorer and is_linear_model(model)):
+            return model, scaled
+        engine = self._engines.get(id(model))
+        if engine is None or engine.estimator is not model:
+            # The linear scorer folds the scaler into its weights
+            engine = FlatTreeEnsemble(model) if tree else SparseLinearScorer(model, self.scaler if scaled else None)
+            self._engines[id(model)] = engine
+        return engine, False
+    
+    def _select_model(self, model_type):
+        """Model for a model_type name and whether it expects scaled input"""
         if model_type == 'best':
             model = self.best_model
             # Check if model needs scaled input
-            if model in [self.svm_model, self.lr_model]:
-                input_data = self.scaler.transform(input_vector)
-            else:
-                input_data = input_df
-        elif model_type == 'ensemble':
-            model = self.ensemble_model
-            input_data = input_df
-        elif model_type == 'random_forest':
-            model = self.rf_model
-            input_data = input_df
-        elif model_type == 'gradient_boosting':
-            model = self.gb_model
-            input_data = input_df
-        elif model_type == 'svm':
-            model = self.svm_model
-            input_data = self.scaler.transform(input_vector)
-        elif model_type == 'logistic_regression':
-            model = self.lr_model
-            input_data = self.scaler.transform(input_vector)
-        elif model_type == 'decision_tree':
-            model = self.dt_model
-            input_data = input_df
-        else:  # naive_bayes
-            model = self.nb_model
-            input_data = input_df
+            return self._served(model, any(model is scaled for scaled in (self.svm_model, self.lr_model)))
+        if model_type == 'student':
+            if self.student_model is None:
+                raise ValueError("No student model. Call distill() first.")
+            return self._served(self.student_model)
+        models = {
+            'ensemble': (self.ensemble_model, False),
+            'random_forest': (self.rf_model, False),
+            'gradient_boosting': (self.gb_model, False),
+            'svm': (self.svm_model, True),
+            'logistic_regression': (self.lr_model, True),
+            'decision_tree': (self.dt_model, False),
+        }
+        model, scaled = models.get(model_type, (self.nb_model, False))  # naive_bayes
+        return self._served(model, scaled)
+    
+    def _model_input(self, input_matrix, scaled):
+        if scaled:
+            return self.scaler.transform(input_matrix)
+        # Models fitted on the sparse edge-list matrix have no feature names
+        if hasattr(self.dt_model, 'feature_names_in_'):
+            return pd.DataFrame(input_matrix, columns=self.feature_cols)
+        return input_matrix
+    
+    def predict_disease(self, symptoms, model_type='best', top_n=3):
+        if self.dt_model is None:
+            raise ValueError("Models not trained. Call train_models() first.")
         
-        predicted_disease = model.predict(input_data)[0]
-        probabilities = model.predict_proba(input_data)[0]
+        input_vector, found_symptoms = self.vectorizer.transform_one(symptoms, dtype=np.int64)
+        model, scaled = self._select_model(model_type)
+        input_data = self._model_input(input_vector, scaled)
         
-        top_indices = np.argsort(probabilities)[::-1][:top_n]
+        predicted_disease = model.predict(input_data)[0]
+        probabilities = model.predict_proba(input_data)
+        top_indices, top_probabilities = top_k(probabilities, top_n)[0]
         predictions = []
         
-        for i, idx in enumerate(top_indices):
+        for i, (idx, probability) in enumerate(zip(top_indices, top_probabilities)):
             predictions.append({
                 'disease': self.diseases[idx],
-                'probability': probabilities[idx],
+                'probability': probability,
                 'rank': i + 1
             })
         
@@ -200,7 +530,37 @@ class DiseasePredictionModel:
             'model_used': model_type
         }
     
-    def save_model(self, filename='disease_prediction_model.pkl'):
+    def predict_topk_batch(self, symptom_lists, k=3, min_probability=0.0, model_type='best'):
+        """Ranked differential for many symptom lists from one predict_proba pass
+        
+        Returns one {'found_symptoms', 'predictions'} dict per input, with at
+        most k predictions of probability >= min_probability, best first.
+        """
+        if self.dt_model is None:
+            raise ValueError("Models not trained. Call train_models() first.")
+        
+        symptom_lists = list(symptom_lists)
+        if not symptom_lists:
+            return []
+        input_matrix = self.vectorizer.transform(symptom_lists, dtype=np.int64)
+        model, scaled = self._select_model(model_type)
+        probabilities = model.predict_proba(self._model_input(input_matrix, scaled))
+        
+        results = []
+        for symptoms, (top_indices, top_probabilities) in zip(symptom_lists,
+                                                              top_k(probabilities, k, min_probability)):
+            results.append({
+                'found_symptoms': self.vectorizer.columns(symptoms)[1],
+                'predictions': [
+                    {'disease': self.diseases[idx], 'probability': float(probability), 'rank': rank}
+                    for rank, (idx, probability) in enumerate(zip(top_indices, top_probabilities), start=1)
+                ]
+            })
+        return results
+    
+    def save_model(self, filename='disease_prediction_model.pkl', artifact_format='pickle'):
+        """Persist all models as one pickle, or with artifact_format='mmap' as a
+        directory artifact whose large arrays can be memory-mapped by workers"""
         base_dir = os.path.dirname(os.path.abspath(__file__))
         pkl_dir = os.path.join(base_dir, '..', 'Datasets', 'pkl')
         os.makedirs(pkl_dir, exist_ok=True)
@@ -218,20 +578,31 @@ class DiseasePredictionModel:
             'scaler': self.scaler,
             'feature_cols': self.feature_cols,
             'diseases': self.diseases,
-            'best_accuracy': self.best_accuracy
+            'best_accuracy': self.best_accuracy,
+            'selection': self.selection,
+            'student_model': self.student_model,
+            'distillation': self.distillation,
+            'training_rows': self.training_rows,
+            'bundle_version': self.bundle_version,
+            'last_update': self.last_update
         }
         
-        with open(filepath, 'wb') as f:
-            pickle.dump(model_data, f)
+        if artifact_format == 'mmap':
+            filepath = os.path.splitext(filepath)[0]
+            save_artifact(model_data, filepath)
+        else:
+            with open(filepath, 'wb') as f:
+                pickle.dump(model_data, f)
         print(f"Model saved to {filepath}")
     
-    def load_model(self, filename='disease_prediction_model.pkl'):
+    def load_model(self, filename='disease_prediction_model.pkl', mmap_mode='c'):
+        """Load saved models, preferring a memory-mapped directory artifact
+        next to the pickle when one exists"""
         base_dir = os.path.dirname(os.path.abspath(__file__))
         pkl_dir = os.path.join(base_dir, '..', 'Datasets', 'pkl')
-        filepath = os.path.join(pkl_dir, filename)
+        filepath = resolve_artifact(os.path.join(pkl_dir, filename))
         
-        with open(filepath, 'rb') as f:
-            model_data = pickle.load(f)
+        model_data = load_any(filepath, mmap_mode=mmap_mode)
         
         self.dt_model = model_data['dt_model']
         self.nb_model = model_data['nb_model']
@@ -243,19 +614,51 @@ class DiseasePredictionModel:
         self.best_model = model_data['best_model']
         self.scaler = model_data['scaler']
         self.feature_cols = model_data['feature_cols']
+        self.vectorizer = SymptomVectorizer(self.feature_cols)
         self.diseases = model_data['diseases']
         self.best_accuracy = model_data['best_accuracy']
+        self.selection = model_data.get('selection')
+        self.student_model = model_data.get('student_model')
+        self.distillation = model_data.get('distillation')
+        self.training_rows = model_data.get('training_rows')
+        self.bundle_version = model_data.get('bundle_version', 0)
+        self.last_update = model_data.get('last_update')
+        self._engines = {}
         
         return self
 
 
-def main(retrain_only: bool = False):
+def main(retrain_only: bool = False, artifact_format: str = 'pickle', n_jobs: int = -1,
+         cv_folds: int = 5, max_p99_ms: Optional[float] = None, source: str = 'edges', distill: bool = True,
+         incremental: bool = False):
     """Train (and optionally quick test) then persist the common disease model.
 
     Args:
         retrain_only: if True, skip test predictions (useful for automation).
+        artifact_format: 'pickle' or 'mmap' (directory artifact, see model_store.py).
+        n_jobs: processes used to fit the models in parallel (-1: all cores).
+        cv_folds: folds for model selection (< 2 selects by training accuracy).
+        max_p99_ms: single-row p99 latency budget for the selected model.
+        source: 'edges' (sparse matrix from common_clean.csv) or 'pivot' (common Pivoted.csv).
+        distill: also fit the student model the service serves by default.
+        incremental: update the saved models from the rows changed since they
+            were trained (see DiseasePredictionModel.update_models) instead
+            of training from scratch.
     """
-    model = DiseasePredictionModel().train_models()
+    train_options = {'n_jobs': n_jobs, 'cv_folds': cv_folds, 'max_p99_ms': max_p99_ms}
+    model = None
+    if incremental:
+        try:
+            # Read into memory: the update changes arrays the artifact would map
+            model = DiseasePredictionModel().load_model(mmap_mode=None)
+        except FileNotFoundError:
+            print("No saved model to update; training from scratch")
+    if model is not None:
+        model.update_models(source=source, **train_options)
+    else:
+        model = DiseasePredictionModel().train_models(source=source, **train_options)
+        if distill:
+            model.distill(source=source)
     if not retrain_only:
         test_symptoms = ['shortness of breath', 'cough', 'palpitation', 'chill', 'asthenia']
         best_result = model.predict_disease(test_symptoms, model_type='best')
@@ -263,12 +666,28 @@ def main(retrain_only: bool = False):
         print(f"Best Model ({best_result['model_used']}) prediction: {best_result['primary_prediction']}")
         ensemble_result = model.predict_disease(test_symptoms, model_type='ensemble')
         print(f"Ensemble prediction: {ensemble_result['primary_prediction']}")
-    model.save_model()
+        if model.student_model is not None:
+            student_result = model.predict_disease(test_symptoms, model_type='student')
+            print(f"Student prediction: {student_result['primary_prediction']}")
+    model.save_model(artifact_format=artifact_format)
     return 0
 
 if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser(description="Rebuild common disease prediction model")
     parser.add_argument('--retrain-only', action='store_true', help='Skip sample prediction output')
+    parser.add_argument('--format', choices=['pickle', 'mmap'], default='pickle',
+                        help='Save as a single pickle or a memory-mappable directory artifact')
+    parser.add_argument('--jobs', type=int, default=-1, help='Models fitted in parallel (-1: all cores)')
+    parser.add_argument('--cv-folds', type=int, default=5, help='Cross-validation folds for model selection (0: off)')
+    parser.add_argument('--max-p99-ms', type=float, help='Single-row p99 latency budget for the selected model')
+    parser.add_argument('--source', choices=['edges', 'pivot'], default='edges',
+                        help='Train on the common_clean.csv edge list or the prebuilt common Pivoted.csv')
+    parser.add_argument('--no-distill', action='store_true',
+                        help='Skip distilling the ensemble into the student model')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Update the saved models from the training rows that changed since they were trained')
     args = parser.parse_args()
-    raise SystemExit(main(retrain_only=args.retrain_only))
+    raise SystemExit(main(retrain_only=args.retrain_only, artifact_format=args.format, n_jobs=args.jobs,
+                          cv_folds=args.cv_folds, max_p99_ms=args.max_p99_ms, source=args.source,
+                          distill=not args.no_distill, incremental=args.incremental))
@@ -0,0 +1,115 @@
+from __future__ import annotations
+import hashlib
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+try:
+    from ML.columnar import ColumnarTable, open_table
+except ImportError:  # run as a script from inside ML/
+    from columnar import ColumnarTable, open_table
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+DATASETS_DIR = BASE_DIR / 'Datasets'
+# Parsed copies of the CSVs, named by the hash of the CSV they came from
+CACHE_DIR = DATASETS_DIR / '.cache'
+MEDICINES_CSV = DATASETS_DIR / 'medicines.csv'
+
+# Bundled training CSV per model key: (file, target column, non-feature columns).
+# Feature columns keep the CSV order, which is the order the models were fitted on.
+MODEL_DATASETS = {
+    'diabetes': ('diabetes.csv', 'Outcome', ['Outcome']),
+    'heart': ('heart.csv', 'target', ['target']),
+    'parkinsons': ('parkinsons.csv', 'status', ['name', 'status']),
+    'decision_tree': ('common Pivoted.csv', 'Source', ['Unnamed: 0', 'Source']),
+    'common': ('common Pivoted.csv', 'Source', ['Unnamed: 0', 'Source']),
+    'common_teacher': ('common Pivoted.csv', 'Source', ['Unnamed: 0', 'Source']),
+}
+
+
+def dataset_path(model_key: str) -> Path:
+    if model_key not in MODEL_DATASETS:
+        raise ValueError(f"No bundled dataset for model '{model_key}'. Choices: {sorted(MODEL_DATASETS)}")
+    return DATASETS_DIR / MODEL_DATASETS[model_key][0]
+
+
+def load_model_dataset(model_key: str, n_rows: int | None = None) -> tuple[np.ndarray, np.ndarray, list[str]]:
+    """Load a model's bundled dataset as a float32 feature matrix.
+
+    Returns ``(x, y, feature_names)``; ``n_rows`` limits how many rows are read.
+    """
+    path = dataset_path(model_key)
+    if not path.is_file():
+        raise FileNotFoundError(f"Dataset not found: {path}")
+    _, target, drop = MODEL_DATASETS[model_key]
+    df = pd.read_csv(path, nrows=n_rows)
+    feature_names = [col for col in df.columns if col not in drop]
+    x = df[feature_names].to_numpy(dtype=np.float32)
+    return x, df[target].to_numpy(), feature_names
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_csv_cached(path: Path, cache_dir: Path = CACHE_DIR) -> pd.DataFrame:
+    """``pd.read_csv`` with a binary ``.npz`` copy keyed by the CSV's hash.
+
+    An edited CSV gets a new hash, so a stale cache is never read. Columns
+    sharing a numeric dtype are stored as one 2-D block and text columns as
+    fixed-width unicode, so the cache loads without pickle.
+    """
+    path = Path(path)
+    cache_path = Path(cache_dir) / f"{path.stem.replace(' ', '_')}.{_sha256(path)[:16]}.npz"
+    if cache_path.is_file():
+        with np.load(cache_path, allow_pickle=False) as data:
+            columns = data['columns'].tolist()
+            series = {}
+            for name in data.files:
+                if name.startswith('index_'):
+                    block = data[name.replace('index_', 'block_')]
+                    for position, col in enumerate(data[name]):
+                        series[columns[col]] = block[:, position]
+            return pd.DataFrame(series, columns=columns)
+
+    df = pd.read_csv(path)
+    arrays = {'columns': np.asarray(df.columns, dtype=str)}
+    groups: dict[str, list[int]] = {}
+    for i, dtype in enumerate(df.dtypes):
+        groups.setdefault('str' if dtype == object else str(dtype), []).append(i)
+    for k, (dtype, cols) in enumerate(groups.items()):
+        block = df.iloc[:, cols].to_numpy()
+        arrays[f"index_{k}"] = np.asarray(cols)
+        arrays[f"block_{k}"] = block.astype(str) if dtype == 'str' else block
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    staging = cache_path.with_name(cache_path.name + '.tmp')
+    with open(staging, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(staging, cache_path)
+    return df
+
+
+def load_medicines(rebuild: bool = False, **build_options) -> ColumnarTable:
+    """Memory-mapped columnar view of medicines.csv, indexed by disease.
+
+    The first call streams the CSV in chunks into ``Datasets/.cache/medicines``;
+    later calls only open that cache, until the CSV's size or mtime changes.
+    """
+    if not MEDICINES_CSV.is_file():
+        raise FileNotFoundError(f"Dataset not found: {MEDICINES_CSV}")
+    with open(MEDICINES_CSV, 'rb') as f:
+        if f.read(len(b'version https://git-lfs')) == b'version https://git-lfs':
+            raise FileNotFoundError(f"{MEDICINES_CSV.name} is a Git LFS pointer; run `git lfs pull` first")
+    return open_table(MEDICINES_CSV, CACHE_DIR, rebuild=rebuild, **build_options)
+
+
+def medicines_for(disease: str, columns: list[str] | None = None, limit: int | None = None,
+                  table: ColumnarTable | None = None) -> pd.DataFrame:
+    """Medicines rows for a predicted disease, decoding only ``columns``"""
+    return (table or load_medicines()).lookup(disease, columns=columns, limit=limit)
@@ -1,15 +1,27 @@
 from __future__ import annotations
 import argparse
+import copy
+import hashlib
 import os
 import pickle
 from pathlib import Path
 from typing import Any
 
+import numpy as np
+import onnx
+import onnxruntime as ort
 from skl2onnx import convert_sklearn
 from skl2onnx.common.data_types import FloatTensorType
+from sklearn.ensemble import VotingClassifier
+from sklearn.pipeline import make_pipeline
 from datetime import datetime, timezone
 import json
 
+try:
+    from ML.datasets import load_model_dataset
+except ImportError:  # run as a script from inside ML/
+    from datasets import load_model_dataset
+
 # Map logical names to actual pickle/sav paths
 BASE_DIR = Path(__file__).resolve().parent.parent
 DATASETS_DIR = BASE_DIR / 'Datasets'
@@ -22,8 +34,18 @@ MODEL_PATHS = {
     'parkinsons': SAV_DIR / 'parkinsons_model.sav',
     'decision_tree': SAV_DIR / 'decision_tree_model.sav',
     'common': PKL_DIR / 'disease_prediction_model.pkl',
+    'common_teacher': PKL_DIR / 'disease_prediction_model.pkl',
 }
 
+# Model each symptom key exports from the common bundle, as the service serves it
+BUNDLE_MODELS = {'common': 'student_model', 'common_teacher': 'ensemble_model'}
+
+# Same tolerances the service applies before serving an ONNX graph
+MAX_LABEL_MISMATCH = 0.01
+MAX_PROBABILITY_ERROR = 1e-3
+
+QUANTIZABLE_OPS = {'MatMul', 'Gemm', 'Conv'}
+
 
 def load_pickle(path: Path) -> Any:
     if not path.is_file():
@@ -32,38 +54,167 @@ def load_pickle(path: Path) -> Any:
         return pickle.load(f)
 
 
-def export_model(model_key: str, out_path: Path):
+def resolve_estimator(model: Any, bundle_model: str = 'best_model'):
+    """Return the estimator to convert plus its feature names.
+
+    The common model is pickled as a dict bundle; its ``bundle_model`` is
+    exported (``best_model`` when the bundle has none, e.g. no distilled
+    student), with the scaler folded into one pipeline graph when that model
+    was trained on scaled features (SVM / Logistic Regression).
+    """
+    if isinstance(model, dict):
+        estimator = model.get(bundle_model)
+        if estimator is None:
+            estimator = model['best_model']
+        if estimator is model.get('svm_model') or estimator is model.get('lr_model'):
+            estimator = make_pipeline(model['scaler'], estimator)
+        elif isinstance(estimator, VotingClassifier) and estimator.flatten_transform:
+            # Ensembles saved before flatten_transform=False; skl2onnx only converts that form
+            estimator = copy.copy(estimator).set_params(flatten_transform=False)
+        return estimator, list(model['feature_cols'])
+    names = getattr(model, 'feature_names_in_', None)
+    return model, list(names) if names is not None else None
+
+
+def optimize_graph(path: Path):
+    """Apply onnxruntime's portable (basic) graph optimizations in place."""
+    optimized_path = path.with_suffix('.opt.onnx')
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_BASIC
+    options.optimized_model_filepath = str(optimized_path)
+    ort.InferenceSession(str(path), sess_options=options, providers=['CPUExecutionProvider'])
+    os.replace(optimized_path, path)
+
+
+def quantize_graph(path: Path, mode: str) -> bool:
+    """Dynamic int8 or float16 weight quantization, in place.
+
+    Only MatMul/Gemm-style nodes are affected; ai.onnx.ml tree/SVM/linear
+    operators are kept in float32. Returns False when nothing was quantizable.
+    """
+    model = onnx.load(str(path))
+    if not any(node.op_type in QUANTIZABLE_OPS and node.domain in ('', 'ai.onnx') for node in model.graph.node):
+        print(f"[export] Nothing to quantize in {path.name} (only ai.onnx.ml operators)")
+        return False
+    if mode == 'int8':
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(str(path), str(path), weight_type=QuantType.QInt8)
+    elif mode == 'float16':
+        from onnxconverter_common import float16
+        onnx.save(float16.convert_float_to_float16(model, keep_io_types=True), str(path))
+    else:
+        raise ValueError(f"Unknown quantization mode '{mode}'")
+    return True
+
+
+def parity_check(model_key: str, estimator: Any, path: Path, n_rows: int) -> dict:
+    """Compare the exported graph with the pickled estimator on dataset rows."""
+    x, _, _ = load_model_dataset(model_key, n_rows)
+    session = ort.InferenceSession(str(path), providers=['CPUExecutionProvider'])
+    outputs = session.run(None, {session.get_inputs()[0].name: x})
+
+    labels = np.asarray(estimator.predict(x)).astype(str)
+    label_mismatch = float(np.mean(labels != np.asarray(outputs[0]).astype(str)))
+    max_probability_error = None
+    if hasattr(estimator, 'predict_proba') and len(outputs) > 1:
+        max_probability_error = float(np.max(np.abs(estimator.predict_proba(x) - outputs[1])))
+    return {
+        'rows': int(len(x)),
+        'label_mismatch': label_mismatch,
+        'max_probability_error': max_probability_error,
+    }
+
+
+def _classifier_steps(estimator: Any) -> list:
+    """The classifier objects whose ZipMap output should be disabled."""
+    if hasattr(estimator, 'steps'):
+        estimator = estimator.steps[-1][1]
+    return [estimator] if hasattr(estimator, 'classes_') else []
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _json_value(value):
+    return value.item() if hasattr(value, 'item') else value
+
+
+def export_model(model_key: str, out_path: Path, optimize: bool = True,
+                 quantize: str | None = None, parity_rows: int = 200) -> dict:
+    """Export one model to ONNX and return its manifest entry."""
     model_path = MODEL_PATHS.get(model_key)
     if not model_path:
         raise ValueError(f"Unknown model key '{model_key}'. Choices: {sorted(MODEL_PATHS)}")
     model = load_pickle(model_path)
-    if not hasattr(model, 'n_features_in_'):
+    estimator, feature_names = resolve_estimator(model, BUNDLE_MODELS.get(model_key, 'best_model'))
+    if not hasattr(estimator, 'n_features_in_'):
         raise ValueError('Model object missing n_features_in_ attribute (needed for ONNX conversion)')
-    n_features = getattr(model, 'n_features_in_')
+    n_features = int(getattr(estimator, 'n_features_in_'))
+    if feature_names is None:
+        try:
+            _, _, feature_names = load_model_dataset(model_key, n_rows=0)
+        except (FileNotFoundError, ValueError):
+            feature_names = None
+
     print(f"[export] Converting '{model_key}' model with {n_features} features -> ONNX")
     initial_type = [('input', FloatTensorType([None, n_features]))]
-    onnx_model = convert_sklearn(model, initial_types=initial_type)
+    # zipmap=False keeps probabilities as a plain (N, n_classes) tensor
+    options = {id(step): {'zipmap': False} for step in _classifier_steps(estimator)}
+    onnx_model = convert_sklearn(estimator, initial_types=initial_type, options=options)
     out_path.parent.mkdir(parents=True, exist_ok=True)
     with open(out_path, 'wb') as f:
         f.write(onnx_model.SerializeToString())
-    print(f"[export] Wrote ONNX model to {out_path}")
+
+    if optimize:
+        optimize_graph(out_path)
+    if quantize and not quantize_graph(out_path, quantize):
+        quantize = None
+
+    try:
+        parity = parity_check(model_key, estimator, out_path, parity_rows)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"[export][WARN] Skipped parity check for {model_key}: {e}")
+        parity = None
+    if parity:
+        print(f"[export] Parity vs pickle on {parity['rows']} rows: label mismatch "
+              f"{parity['label_mismatch']:.4f}, max probability error {parity['max_probability_error']}")
+        probability_error = parity['max_probability_error'] or 0.0
+        if parity['label_mismatch'] > MAX_LABEL_MISMATCH or probability_error > MAX_PROBABILITY_ERROR:
+            print(f"[export][WARN] {model_key} exceeds parity tolerance; the service will keep serving its pickle")
+
+    classes = getattr(estimator, 'classes_', None)
+    output_names = [output.name for output in onnx_model.graph.output]
+    print(f"[export] Wrote ONNX model to {out_path} ({out_path.stat().st_size // 1024} KB)")
+    return {
+        'key': model_key,
+        'file': out_path.name,
+        'n_features': n_features,
+        'feature_names': feature_names,
+        'classes': [_json_value(c) for c in classes] if classes is not None else None,
+        'has_probabilities': hasattr(estimator, 'predict_proba'),
+        'outputs': output_names,
+        'optimized': optimize,
+        'quantization': quantize,
+        'parity': parity,
+        'size_bytes': out_path.stat().st_size,
+        'source': model_path.name,
+        'source_sha256': file_sha256(model_path),
+    }
 
 
-def export_multiple(model_keys: list[str], out_dir: Path, write_manifest: bool):
+def export_multiple(model_keys: list[str], out_dir: Path, write_manifest: bool,
+                    optimize: bool = True, quantize: str | None = None, parity_rows: int = 200):
     out_dir.mkdir(parents=True, exist_ok=True)
     manifest_models = []
     for key in model_keys:
         target = out_dir / f"{key}.onnx"
         try:
-            model_path = MODEL_PATHS.get(key)
-            model = load_pickle(model_path) if model_path else None
-            n_features = getattr(model, 'n_features_in_', None) if model else None
-            export_model(key, target)
-            manifest_models.append({
-                'key': key,
-                'file': target.name,
-                'n_features': int(n_features) if isinstance(n_features, (int, float)) else None
-            })
+            manifest_models.append(export_model(key, target, optimize, quantize, parity_rows))
         except Exception as e:
             print(f"[export][WARN] Failed to export {key}: {e}")
     if write_manifest:
@@ -85,19 +236,23 @@ def main():
     parser.add_argument('--out', help='Single model ONNX output path (when using --model)')
     parser.add_argument('--out-dir', default='web/models', help='Output directory for multi/all export')
     parser.add_argument('--manifest', action='store_true', help='Write models_manifest.json (multi/all modes)')
+    parser.add_argument('--no-optimize', action='store_true', help='Skip onnxruntime graph optimizations')
+    parser.add_argument('--quantize', choices=['int8', 'float16'], help='Optional dynamic weight quantization')
+    parser.add_argument('--parity-rows', type=int, default=200, help='Dataset rows used for the parity check')
     args = parser.parse_args()
+    export_options = {'optimize': not args.no_optimize, 'quantize': args.quantize, 'parity_rows': args.parity_rows}
 
     if args.model:
         out_path = Path(args.out or 'web/models/disease_model.onnx')
-        export_model(args.model, out_path)
+        export_model(args.model, out_path, **export_options)
         return
 
     if args.models:
-        export_multiple(args.models, Path(args.out_dir), args.manifest)
+        export_multiple(args.models, Path(args.out_dir), args.manifest, **export_options)
         return
 
     if args.all:
-        export_multiple(sorted(MODEL_PATHS.keys()), Path(args.out_dir), args.manifest)
+        export_multiple(sorted(MODEL_PATHS.keys()), Path(args.out_dir), args.manifest, **export_options)
         return
 
 
@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import numpy as np
+from scipy import sparse
+from scipy.special import expit
+from sklearn.linear_model import LogisticRegression
+from sklearn.naive_bayes import MultinomialNB
+from sklearn.preprocessing import StandardScaler
+
+
+def is_linear_model(estimator) -> bool:
+    """Whether ``SparseLinearScorer`` can score this estimator"""
+    return isinstance(estimator, (MultinomialNB, LogisticRegression))
+
+
+def _link(estimator) -> str:
+    """How a model turns its linear scores into probabilities, as its predict_proba does"""
+    if isinstance(estimator, MultinomialNB):
+        return 'log'
+    # multi_class is gone in newer scikit-learn, where binary models use the
+    # sigmoid and multiclass ones the softmax
+    multi_class = getattr(estimator, 'multi_class', 'auto')
+    if len(estimator.classes_) <= 2:
+        # Before 1.5 a multinomial binary model took the softmax of (-d, d)
+        return 'softmax2' if multi_class == 'multinomial' else 'sigmoid'
+    if multi_class == 'ovr' or (multi_class != 'multinomial' and estimator.solver == 'liblinear'):
+        return 'ovr'
+    return 'softmax'
+
+
+def _softmax(scores: np.ndarray) -> np.ndarray:
+    scores = np.exp(scores - scores.max(axis=1, keepdims=True))
+    scores /= scores.sum(axis=1, keepdims=True)
+    return scores
+
+
+def _log_normalize(scores: np.ndarray) -> np.ndarray:
+    """exp(scores - logsumexp(scores)) per row, as naive Bayes normalizes its joint log likelihood"""
+    top = scores.max(axis=1, keepdims=True)
+    norm = np.log(np.exp(scores - top).sum(axis=1, keepdims=True)) + top
+    return np.exp(scores - norm)
+
+
+class SparseLinearScorer:
+    """Scores a fitted MultinomialNB or LogisticRegression from each row's nonzero features.
+
+    Both models are linear in their input before the final link: Naive Bayes
+    adds up ``feature_log_prob_`` rows on top of the class log prior, and
+    logistic regression adds up ``coef_`` columns on top of the intercept.
+    The per-feature class weights are kept as one (features, classes)
+    matrix, so a symptom row with a handful of ones costs a handful of row
+    sums rather than a dense product over every feature. Batches are one
+    matrix product, sparse or dense as the input comes.
+
+    A ``StandardScaler`` the model was trained behind is folded into the
+    weights and bias, so callers pass raw (unscaled, still sparse) rows.
+    Probabilities match the estimator to floating-point rounding, since only
+    the summation order differs.
+    """
+
+    def __init__(self, estimator, scaler=None):
+        if not is_linear_model(estimator):
+            raise ValueError(f"Cannot score {type(estimator).__name__}: not MultinomialNB or LogisticRegression")
+        self.estimator = estimator
+        self.classes_ = estimator.classes_
+        self.n_features_in_ = estimator.n_features_in_
+        self.link = _link(estimator)
+
+        if isinstance(estimator, MultinomialNB):
+            if scaler is not None:
+                raise ValueError('MultinomialNB takes counts; it cannot be scored behind a scaler')
+            weights = estimator.feature_log_prob_.T
+            bias = estimator.class_log_prior_
+        else:
+            weights = estimator.coef_.T.astype(np.float64)
+            bias = estimator.intercept_.astype(np.float64)
+        if scaler is not None:
+            if not isinstance(scaler, StandardScaler):
+                raise ValueError(f"Cannot fold {type(scaler).__name__} into the weights: only StandardScaler")
+            # w . (x - mean) / scale + b == (w / scale) . x + (b - w . mean / scale)
+            if scaler.scale_ is not None:
+                weights = weights / scaler.scale_[:, np.newaxis]
+            if scaler.mean_ is not None and scaler.with_mean:
+                bias = bias - scaler.mean_ @ weights
+        self.weights = np.ascontiguousarray(weights, dtype=np.float64)
+        self.bias = np.asarray(bias, dtype=np.float64)
+
+    def _check_input(self, x):
+        """CSR input as is, dense input as an array"""
+        if not sparse.issparse(x):
+            x = np.asarray(x)
+        if x.ndim != 2 or x.shape[1] != self.n_features_in_:
+            raise ValueError(f"X has {x.shape[-1]} features, but the model expects {self.n_features_in_}")
+        return x.tocsr() if sparse.issparse(x) else x
+
+    def decision_scores(self, x) -> np.ndarray:
+        """Linear scores before the link, (rows, classes) or (rows, 1) for binary LR"""
+        x = self._check_input(x)
+        if x.shape[0] == 1:
+            # One row: sum the weight rows of its nonzero features
+            if sparse.issparse(x):
+                columns, values = x.indices, x.data
+            else:
+                columns = np.flatnonzero(x[0])
+                values = x[0, columns]
+            return (values.astype(np.float64) @ self.weights[columns] + self.bias)[np.newaxis]
+        return np.asarray(x.astype(np.float64) @ self.weights) + self.bias
+
+    def _predict(self, x):
+        """Returns (labels, probabilities)"""
+        scores = self.decision_scores(x)
+        if scores.shape[1] == 1:
+            scores = scores[:, 0]
+            labels = self.classes_.take((scores > 0).astype(np.intp), axis=0)
+            if self.link == 'softmax2':
+                proba = _softmax(np.column_stack([-scores, scores]))
+            else:
+                positive = expit(scores)
+                proba = np.column_stack([1 - positive, positive])
+            return labels, proba
+
+        labels = self.classes_.take(np.argmax(scores, axis=1), axis=0)
+        if self.link == 'log':
+            proba = _log_normalize(scores)
+        elif self.link == 'ovr':
+            proba = expit(scores)
+            proba /= proba.sum(axis=1, keepdims=True)
+        else:
+            proba = _softmax(scores)
+        return labels, proba
+
+    def predict_proba(self, x) -> np.ndarray:
+        return self._predict(x)[1]
+
+    def predict(self, x) -> np.ndarray:
+        return self._predict(x)[0]
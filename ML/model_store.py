@@ -0,0 +1,182 @@
+from __future__ import annotations
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import shutil
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+# Directory artifact layout:
+#   <name>/model.pkl      pickle of the object graph, large arrays replaced by references
+#   <name>/arrays/*.npy   the arrays themselves, memory-mapped on load
+#   <name>/artifact.json  format version, array list and content hashes (written last)
+FORMAT_VERSION = 1
+SKELETON_FILE = 'model.pkl'
+ARRAYS_DIR = 'arrays'
+MANIFEST_FILE = 'artifact.json'
+
+# Arrays smaller than this stay inline in the pickle
+DEFAULT_THRESHOLD = 4096
+
+
+class _ArrayPickler(pickle.Pickler):
+    """Pickler that writes large NumPy arrays to separate .npy files."""
+
+    def __init__(self, file, array_dir: Path, threshold: int):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.array_dir = array_dir
+        self.threshold = threshold
+        self.arrays: list[dict] = []
+        # id -> (name, array); holding the array keeps ids of temporaries from being reused
+        self._saved: dict[int, tuple[str, np.ndarray]] = {}
+
+    def persistent_id(self, obj):
+        if not isinstance(obj, np.ndarray) or obj.dtype.hasobject or obj.nbytes < self.threshold:
+            return None
+        saved = self._saved.get(id(obj))
+        if saved is None:
+            name = f"{len(self.arrays):05d}.npy"
+            np.save(self.array_dir / name, np.ascontiguousarray(obj), allow_pickle=False)
+            self.arrays.append({'file': name, 'shape': list(obj.shape), 'dtype': str(obj.dtype),
+                                'nbytes': int(obj.nbytes)})
+            saved = self._saved[id(obj)] = (name, obj)
+        return ('ndarray', saved[0])
+
+
+class _ArrayUnpickler(pickle.Unpickler):
+    def __init__(self, file, array_dir: Path, mmap_mode: str | None):
+        super().__init__(file)
+        self.array_dir = array_dir
+        self.mmap_mode = mmap_mode
+
+    def persistent_load(self, pid):
+        kind, name = pid
+        if kind != 'ndarray':
+            raise pickle.UnpicklingError(f"Unknown persistent id {pid!r}")
+        return np.load(self.array_dir / name, mmap_mode=self.mmap_mode, allow_pickle=False)
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def is_artifact_dir(path: Path) -> bool:
+    return Path(path).is_dir() and (Path(path) / MANIFEST_FILE).is_file()
+
+
+def resolve_artifact(path: Path, prefer_directory: bool = True) -> Path:
+    """Pick the directory artifact next to a .pkl/.sav file when one exists."""
+    path = Path(path)
+    if prefer_directory and not is_artifact_dir(path) and is_artifact_dir(path.with_suffix('')):
+        return path.with_suffix('')
+    return path
+
+
+def artifact_version_file(path: Path) -> Path:
+    """File whose content changes whenever the artifact does (for change detection)."""
+    path = Path(path)
+    return path / MANIFEST_FILE if is_artifact_dir(path) else path
+
+
+def save_artifact(obj: Any, directory: Path, threshold: int = DEFAULT_THRESHOLD) -> dict:
+    """Save an object graph as a directory artifact with memory-mappable arrays.
+
+    The artifact is built next to ``directory`` and swapped in at the end, so
+    readers never see a half-written one.
+    """
+    directory = Path(directory)
+    staging = directory.with_name(directory.name + '.tmp')
+    shutil.rmtree(staging, ignore_errors=True)
+    (staging / ARRAYS_DIR).mkdir(parents=True)
+
+    with open(staging / SKELETON_FILE, 'wb') as f:
+        pickler = _ArrayPickler(f, staging / ARRAYS_DIR, threshold)
+        pickler.dump(obj)
+
+    content = hashlib.sha256(_sha256(staging / SKELETON_FILE).encode())
+    for array in pickler.arrays:
+        content.update(_sha256(staging / ARRAYS_DIR / array['file']).encode())
+    manifest = {
+        'format_version': FORMAT_VERSION,
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'content_sha256': content.hexdigest(),
+        'array_bytes': sum(array['nbytes'] for array in pickler.arrays),
+        'arrays': pickler.arrays,
+    }
+    with open(staging / MANIFEST_FILE, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+
+    if directory.exists():
+        previous = directory.with_name(directory.name + '.old')
+        shutil.rmtree(previous, ignore_errors=True)
+        os.replace(directory, previous)
+        os.replace(staging, directory)
+        shutil.rmtree(previous, ignore_errors=True)
+    else:
+        os.replace(staging, directory)
+    return manifest
+
+
+def load_artifact(directory: Path, mmap_mode: str | None = 'c') -> Any:
+    """Load a directory artifact with its arrays memory-mapped.
+
+    The default ``mmap_mode='c'`` maps the files copy-on-write: estimators
+    that insist on writable buffers (libsvm) still work, and since nothing
+    writes to them, forked workers keep sharing the same page-cache pages
+    instead of each holding a private copy. Use ``'r'`` for strictly
+    read-only maps or ``None`` to read the arrays into memory.
+    """
+    directory = Path(directory)
+    with open(directory / MANIFEST_FILE, encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get('format_version') != FORMAT_VERSION:
+        raise ValueError(f"Unsupported artifact format {manifest.get('format_version')} in {directory}")
+    with open(directory / SKELETON_FILE, 'rb') as f:
+        return _ArrayUnpickler(f, directory / ARRAYS_DIR, mmap_mode).load()
+
+
+def load_any(path: Path, mmap_mode: str | None = 'c') -> Any:
+    """Load either a plain pickle file or a directory artifact."""
+    path = Path(path)
+    if is_artifact_dir(path):
+        return load_artifact(path, mmap_mode)
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def convert(pickle_path: Path, out_dir: Path | None = None, threshold: int = DEFAULT_THRESHOLD) -> Path:
+    """Convert a .pkl/.sav file into a directory artifact next to it."""
+    pickle_path = Path(pickle_path)
+    out_dir = Path(out_dir) if out_dir else pickle_path.with_suffix('')
+    with open(pickle_path, 'rb') as f:
+        obj = pickle.load(f)
+    manifest = save_artifact(obj, out_dir, threshold)
+    print(f"[model-store] {pickle_path.name} -> {out_dir} "
+          f"({len(manifest['arrays'])} arrays, {manifest['array_bytes'] // 1024} KB memory-mappable)")
+    return out_dir
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert pickled models to the memory-mapped directory format')
+    parser.add_argument('paths', nargs='+', help='.pkl/.sav files to convert')
+    parser.add_argument('--out', help='Output directory (single input only)')
+    parser.add_argument('--threshold', type=int, default=DEFAULT_THRESHOLD,
+                        help='Arrays at least this many bytes are stored as .npy files')
+    args = parser.parse_args()
+    if args.out and len(args.paths) > 1:
+        parser.error('--out can only be used with a single input')
+    for path in args.paths:
+        convert(Path(path), Path(args.out) if args.out else None, args.threshold)
+
+
+if __name__ == '__main__':
+    main()
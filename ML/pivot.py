@@ -0,0 +1,215 @@
+from __future__ import annotations
+import argparse
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Iterable
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+EDGES_CSV = BASE_DIR / 'Datasets' / 'common_clean.csv'
+CACHE_PATH = BASE_DIR / 'Datasets' / '.cache' / 'common_pivot.npz'
+EDGE_COLUMNS = ['Source', 'Target', 'Weight']
+DEFAULT_CHUNK_SIZE = 50_000
+
+
+def _prefix_sha256(path: Path, n_bytes: int) -> str:
+    """Hash of the first ``n_bytes`` of a file"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        remaining = n_bytes
+        while remaining > 0:
+            block = f.read(min(1 << 20, remaining))
+            if not block:
+                break
+            digest.update(block)
+            remaining -= len(block)
+    return digest.hexdigest()
+
+
+class SymptomPivot:
+    """Sparse disease x symptom matrix built from a Source,Target,Weight edge list.
+
+    Rows are diseases and columns symptoms. Memory is proportional to the
+    number of edges: the matrix is kept as CSR and names as two lists.
+    Ordering is stable: a full build sorts names (the layout of the old
+    ``common Pivoted.csv``) and later appends only add new diseases/symptoms
+    at the end, so existing row and column positions never move. A repeated
+    (disease, symptom) pair keeps its latest weight.
+    """
+
+    def __init__(self):
+        self.diseases: list[str] = []
+        self.symptoms: list[str] = []
+        self._disease_index: dict[str, int] = {}
+        self._symptom_index: dict[str, int] = {}
+        self.weights = sparse.csr_matrix((0, 0), dtype=np.float32)
+        # Bytes of the edge CSV consumed so far and their hash, for incremental updates
+        self.source_bytes = 0
+        self.source_sha256 = None
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return len(self.diseases), len(self.symptoms)
+
+    @property
+    def nnz(self) -> int:
+        return self.weights.nnz
+
+    def _codes(self, names: np.ndarray, index: dict[str, int], labels: list[str]) -> np.ndarray:
+        for name in pd.unique(names):
+            if name not in index:
+                index[name] = len(labels)
+                labels.append(name)
+        return np.fromiter((index[name] for name in names), dtype=np.int32, count=len(names))
+
+    def add_edges(self, edges: pd.DataFrame):
+        """Merge a frame of Source/Target/Weight edges into the matrix"""
+        edges = edges.dropna(subset=['Source', 'Target'])
+        if edges.empty:
+            return self
+        rows = self._codes(edges['Source'].astype(str).to_numpy(), self._disease_index, self.diseases)
+        cols = self._codes(edges['Target'].astype(str).to_numpy(), self._symptom_index, self.symptoms)
+        weights = pd.to_numeric(edges['Weight'], errors='coerce').fillna(1).to_numpy(dtype=np.float32)
+
+        # Last occurrence of a pair wins, both within this batch and over existing entries
+        keys = rows.astype(np.int64) * (len(self.symptoms) + 1) + cols
+        _, last = np.unique(keys[::-1], return_index=True)
+        last = len(keys) - 1 - last
+        update = sparse.csr_matrix((weights[last], (rows[last], cols[last])), shape=self.shape)
+
+        current = self.weights
+        current.resize(self.shape)
+        # Zero out pairs being overwritten, then add the new weights
+        self.weights = (current - current.multiply(update.astype(bool)) + update).tocsr()
+        self.weights.sort_indices()
+        return self
+
+    def matrix(self, weighted: bool = False, dtype=np.float32) -> sparse.csr_matrix:
+        """CSR feature matrix: binary presence by default, edge weights if ``weighted``"""
+        matrix = self.weights.astype(dtype)
+        if not weighted:
+            matrix.data[:] = 1
+        return matrix
+
+    @classmethod
+    def from_edges(cls, path: Path = EDGES_CSV, chunk_size: int = DEFAULT_CHUNK_SIZE) -> 'SymptomPivot':
+        """Full build: stream the edge list, then sort disease and symptom names"""
+        pivot = cls()
+        pivot._consume(Path(path), 0, chunk_size, header=True)
+        pivot._sort_names()
+        return pivot
+
+    def update_from(self, path: Path = EDGES_CSV, chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+        """Apply edges appended to ``path`` since the last build or update.
+
+        Returns the number of new edges. If the part already read was changed
+        (not just appended to), the pivot is rebuilt from scratch instead.
+        """
+        path = Path(path)
+        size = os.path.getsize(path)
+        if size < self.source_bytes or _prefix_sha256(path, self.source_bytes) != self.source_sha256:
+            rebuilt = SymptomPivot.from_edges(path, chunk_size)
+            self.__dict__.update(rebuilt.__dict__)
+            return self.nnz
+        if size == self.source_bytes:
+            return 0
+        before = self.nnz
+        self._consume(path, self.source_bytes, chunk_size, header=False)
+        return self.nnz - before
+
+    def _consume(self, path: Path, offset: int, chunk_size: int, header: bool):
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            reader = pd.read_csv(f, chunksize=chunk_size, header=0 if header else None,
+                                 names=None if header else EDGE_COLUMNS, dtype={'Source': str, 'Target': str})
+            for chunk in reader:
+                self.add_edges(chunk)
+        self.source_bytes = os.path.getsize(path)
+        self.source_sha256 = _prefix_sha256(path, self.source_bytes)
+
+    def _sort_names(self):
+        disease_order = np.argsort(np.array(self.diseases, dtype=object), kind='stable')
+        symptom_order = np.argsort(np.array(self.symptoms, dtype=object), kind='stable')
+        self.weights = self.weights[disease_order][:, symptom_order].tocsr()
+        self.weights.sort_indices()
+        self.diseases = [self.diseases[i] for i in disease_order]
+        self.symptoms = [self.symptoms[i] for i in symptom_order]
+        self._disease_index = {name: i for i, name in enumerate(self.diseases)}
+        self._symptom_index = {name: i for i, name in enumerate(self.symptoms)}
+
+    def save(self, path: Path = CACHE_PATH):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        staging = path.with_name(path.name + '.tmp')
+        with open(staging, 'wb') as f:
+            np.savez(f, data=self.weights.data, indices=self.weights.indices, indptr=self.weights.indptr,
+                     shape=np.array(self.shape), diseases=np.array(self.diseases, dtype=str),
+                     symptoms=np.array(self.symptoms, dtype=str),
+                     source=np.array(json.dumps({'bytes': self.source_bytes, 'sha256': self.source_sha256})))
+        os.replace(staging, path)
+
+    @classmethod
+    def load(cls, path: Path = CACHE_PATH) -> 'SymptomPivot':
+        pivot = cls()
+        with np.load(path, allow_pickle=False) as data:
+            pivot.weights = sparse.csr_matrix((data['data'], data['indices'], data['indptr']),
+                                              shape=tuple(data['shape']))
+            pivot.diseases = data['diseases'].tolist()
+            pivot.symptoms = data['symptoms'].tolist()
+            source = json.loads(str(data['source']))
+        pivot._disease_index = {name: i for i, name in enumerate(pivot.diseases)}
+        pivot._symptom_index = {name: i for i, name in enumerate(pivot.symptoms)}
+        pivot.source_bytes, pivot.source_sha256 = source['bytes'], source['sha256']
+        return pivot
+
+
+def load_pivot(path: Path = EDGES_CSV, cache_path: Path = CACHE_PATH, rebuild: bool = False) -> SymptomPivot:
+    """Cached pivot of the edge list, updated in place with any appended edges"""
+    if not rebuild and Path(cache_path).is_file():
+        pivot = SymptomPivot.load(cache_path)
+        if pivot.update_from(path):
+            pivot.save(cache_path)
+        return pivot
+    pivot = SymptomPivot.from_edges(path)
+    pivot.save(cache_path)
+    return pivot
+
+
+def append_edges(edges: Iterable[tuple[str, str, float]], path: Path = EDGES_CSV):
+    """Append (disease, symptom, weight) rows to the edge list CSV"""
+    frame = pd.DataFrame(list(edges), columns=EDGE_COLUMNS)
+    needs_newline = False
+    if os.path.getsize(path) > 0:
+        with open(path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            needs_newline = f.read(1) != b'\n'
+    with open(path, 'a', encoding='utf-8', newline='') as f:
+        if needs_newline:
+            f.write('\n')
+        frame.to_csv(f, header=False, index=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build or update the sparse disease x symptom pivot')
+    parser.add_argument('--edges', default=str(EDGES_CSV), help='Source,Target,Weight edge list')
+    parser.add_argument('--cache', default=str(CACHE_PATH), help='Where the pivot is cached')
+    parser.add_argument('--rebuild', action='store_true', help='Ignore the cache and rebuild from scratch')
+    parser.add_argument('--add', nargs=3, action='append', metavar=('DISEASE', 'SYMPTOM', 'WEIGHT'),
+                        help='Append an edge to the edge list before updating (repeatable)')
+    args = parser.parse_args()
+    if args.add:
+        append_edges([(disease, symptom, float(weight)) for disease, symptom, weight in args.add], Path(args.edges))
+    pivot = load_pivot(Path(args.edges), Path(args.cache), rebuild=args.rebuild)
+    dense_bytes = pivot.shape[0] * pivot.shape[1] * 8
+    sparse_bytes = pivot.weights.data.nbytes + pivot.weights.indices.nbytes + pivot.weights.indptr.nbytes
+    print(f"[pivot] {pivot.shape[0]} diseases x {pivot.shape[1]} symptoms, {pivot.nnz} edges "
+          f"({sparse_bytes // 1024} KB sparse vs {dense_bytes // 1024} KB dense)")
+
+
+if __name__ == '__main__':
+    main()
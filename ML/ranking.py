@@ -0,0 +1,31 @@
+from __future__ import annotations
+
+import numpy as np
+
+
+def top_k(probabilities: np.ndarray, k: int, min_probability: float = 0.0) -> list[tuple[np.ndarray, np.ndarray]]:
+    """Top ``k`` classes of every row of a probability matrix, best first.
+
+    ``np.argpartition`` selects the k largest in O(n_classes) per row and
+    only those k are sorted. Classes below ``min_probability`` are dropped,
+    so a row can come back with fewer than k entries. Returns one
+    ``(class_indices, probabilities)`` pair per row.
+    """
+    probabilities = np.asarray(probabilities)
+    n_classes = probabilities.shape[1]
+    k = max(0, min(int(k), n_classes))
+    if k == 0:
+        return [(np.empty(0, dtype=np.intp), np.empty(0, dtype=probabilities.dtype))] * len(probabilities)
+
+    if k < n_classes:
+        indices = np.argpartition(-probabilities, k - 1, axis=1)[:, :k]
+    else:
+        indices = np.broadcast_to(np.arange(n_classes), probabilities.shape)
+    values = np.take_along_axis(probabilities, indices, axis=1)
+    order = np.argsort(-values, axis=1, kind='stable')
+    indices = np.take_along_axis(indices, order, axis=1)
+    values = np.take_along_axis(values, order, axis=1)
+
+    # Rows are sorted, so the cutoff keeps a prefix of each
+    kept = (values >= min_probability).sum(axis=1)
+    return [(indices[i, :n], values[i, :n]) for i, n in enumerate(kept)]
@@ -0,0 +1,144 @@
+from __future__ import annotations
+import pickle
+import time
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from scipy import sparse
+from sklearn.base import clone
+from sklearn.model_selection import StratifiedKFold
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
+from sklearn.svm import SVC, NuSVC
+
+# The pivoted dataset has exactly one row per disease, so plain stratified
+# k-fold has nothing to hold out. Each fold instead holds out copies of the
+# rows with a random subset of their symptoms dropped, which is also what a
+# patient-reported symptom list looks like.
+DEFAULT_KEEP_PROBABILITY = 0.7
+
+
+def augment_symptom_subsets(x, y, copies: int, keep_probability: float = DEFAULT_KEEP_PROBABILITY,
+                            random_state: int = 42) -> tuple[sparse.csr_matrix, np.ndarray]:
+    """Original rows plus ``copies`` variants of each with symptoms randomly dropped.
+
+    Works on the non-zeros of a CSR matrix, so dense or sparse input costs
+    memory proportional to the symptoms present. Every variant keeps at
+    least one of its row's symptoms.
+    """
+    rng = np.random.default_rng(random_state)
+    x = sparse.csr_matrix(x.to_numpy() if isinstance(x, pd.DataFrame) else x, copy=True)
+    x.eliminate_zeros()
+    y = np.asarray(y)
+    row_lengths = np.diff(x.indptr)
+    row_of_entry = np.repeat(np.arange(x.shape[0]), row_lengths)
+    blocks = [x]
+    for _ in range(copies):
+        keep = rng.random(x.nnz) < keep_probability
+        emptied = np.flatnonzero((np.bincount(row_of_entry[keep], minlength=x.shape[0]) == 0) & (row_lengths > 0))
+        keep[x.indptr[emptied] + rng.integers(row_lengths[emptied])] = True
+        variant = sparse.csr_matrix((np.where(keep, x.data, 0), x.indices.copy(), x.indptr.copy()), shape=x.shape)
+        variant.eliminate_zeros()
+        blocks.append(variant)
+    return sparse.vstack(blocks, format='csr'), np.tile(y, copies + 1)
+
+
+def _fold_probabilities(name: str, estimator, scaled: bool, x: sparse.csr_matrix, y: np.ndarray,
+                        train_index: np.ndarray, test_index: np.ndarray):
+    """Fit a fresh copy of one candidate on a fold and score its held-out rows"""
+    model = make_pipeline(StandardScaler(), clone(estimator)) if scaled else clone(estimator)
+    if scaled:
+        # Centered scaling is dense anyway
+        x = x.toarray()
+    model.fit(x[train_index], y[train_index])
+    probabilities = model.predict_proba(x[test_index])
+    # Score an SVC on the labels it serves, which come from its decision function
+    if isinstance(model[-1] if scaled else model, (SVC, NuSVC)):
+        return name, test_index, model.predict(x[test_index]), probabilities
+    return name, test_index, model.classes_[np.argmax(probabilities, axis=1)], probabilities
+
+
+def cross_validate(candidates: list[tuple[str, object, bool]], x, y,
+                   folds: int = 5, n_jobs: int = -1, ensembles: dict[str, list[str]] | None = None,
+                   keep_probability: float = DEFAULT_KEEP_PROBABILITY,
+                   random_state: int = 42) -> dict[str, dict]:
+    """Stratified k-fold accuracy for every (name, estimator, scaled input) candidate.
+
+    All (candidate, fold) fits run in one joblib pool. ``ensembles`` maps a
+    name to member candidates whose fold probabilities are averaged (soft
+    voting), so an ensemble is scored without fitting its members again.
+    """
+    x_cv, y_cv = augment_symptom_subsets(x, y, folds - 1, keep_probability, random_state)
+    splits = list(StratifiedKFold(n_splits=folds, shuffle=True, random_state=random_state).split(x_cv, y_cv))
+    fold_results = Parallel(n_jobs=n_jobs)(
+        delayed(_fold_probabilities)(name, estimator, scaled, x_cv, y_cv, train_index, test_index)
+        for name, estimator, scaled in candidates
+        for train_index, test_index in splits
+    )
+
+    scores: dict[str, list[float]] = {}
+    probabilities: dict[str, list[tuple[np.ndarray, np.ndarray]]] = {}
+    for name, test_index, predicted, fold_probabilities in fold_results:
+        scores.setdefault(name, []).append(float(np.mean(predicted == y_cv[test_index])))
+        probabilities.setdefault(name, []).append((test_index, fold_probabilities))
+
+    # Every class is in every training fold, so columns line up across members
+    classes = np.unique(y_cv)
+    for name, members in (ensembles or {}).items():
+        scores[name] = []
+        for fold in range(folds):
+            test_index = probabilities[members[0]][fold][0]
+            mean = np.mean([probabilities[member][fold][1] for member in members], axis=0)
+            scores[name].append(float(np.mean(classes[np.argmax(mean, axis=1)] == y_cv[test_index])))
+
+    return {name: {'cv_accuracy': float(np.mean(values)), 'cv_std': float(np.std(values)), 'folds': folds}
+            for name, values in scores.items()}
+
+
+def measure_latency(predict: Callable[[np.ndarray], object], rows: np.ndarray,
+                    single_rows: int = 200, batch_size: int = 256) -> dict:
+    """Single-row p50/p99 and whole-batch latency of ``predict``, in milliseconds"""
+    rows = rows.toarray() if sparse.issparse(rows) else rows
+    rows = np.asarray(rows, dtype=np.float32)
+    predict(rows[:1])  # warm up
+    timings = []
+    for i in range(single_rows):
+        row = rows[i % len(rows):i % len(rows) + 1]
+        started = time.perf_counter()
+        predict(row)
+        timings.append(time.perf_counter() - started)
+    batch = np.resize(rows, (batch_size, rows.shape[1]))
+    started = time.perf_counter()
+    predict(batch)
+    batch_seconds = time.perf_counter() - started
+    return {
+        'p50_ms': round(float(np.percentile(timings, 50)) * 1000, 4),
+        'p99_ms': round(float(np.percentile(timings, 99)) * 1000, 4),
+        'batch_ms': round(batch_seconds * 1000, 4),
+        'batch_size': batch_size,
+    }
+
+
+def model_size(model) -> int:
+    """Size of a fitted model when pickled, in bytes"""
+    return len(pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def select_model(results: dict[str, dict], max_p99_ms: float | None = None,
+                 accuracy_tolerance: float = 0.0) -> str:
+    """Pick a model from a results table.
+
+    Candidates over the ``max_p99_ms`` single-row budget are dropped (if all
+    are over it, the fastest is used). Among the rest, models within
+    ``accuracy_tolerance`` of the best CV accuracy count as tied, and the
+    fastest of those wins.
+    """
+    within_budget = {name: row for name, row in results.items()
+                     if max_p99_ms is None or row['p99_ms'] <= max_p99_ms}
+    if not within_budget:
+        return min(results, key=lambda name: results[name]['p99_ms'])
+    best = max(row['cv_accuracy'] for row in within_budget.values())
+    tied = [name for name, row in within_budget.items() if row['cv_accuracy'] >= best - accuracy_tolerance]
+    return min(tied, key=lambda name: within_budget[name]['p99_ms'])
@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+import numpy as np
+from scipy import sparse
+from scipy.special import expit
+from sklearn.cluster import KMeans
+from sklearn.svm import SVC
+
+COUPLINGS = ('average', 'solve')
+
+# libsvm clips pairwise probabilities to [MIN_PROBABILITY, 1 - MIN_PROBABILITY]
+_MIN_PROBABILITY = 1e-7
+
+
+def is_svm_model(estimator) -> bool:
+    """Whether ``ApproximateSVC`` can stand in for this estimator"""
+    return isinstance(estimator, SVC) and estimator.kernel in ('rbf', 'poly', 'sigmoid', 'linear')
+
+
+def _pair_coefficients(estimator):
+    """Each one-vs-one classifier's weight on every support vector, as libsvm orders them.
+
+    Returns ``(coefficients, first, second)``: a sparse (pairs, support
+    vectors) matrix, since a pair only weighs the support vectors of its
+    two classes, and the two class indices of each pair. ``_dual_coef_`` is
+    libsvm's own layout, before scikit-learn flips the sign for binary models.
+    """
+    dual_coef = estimator._dual_coef_
+    dual_coef = np.asarray(dual_coef.toarray() if sparse.issparse(dual_coef) else dual_coef, dtype=np.float64)
+    n_support = np.asarray(estimator._n_support)
+    starts = np.concatenate([[0], np.cumsum(n_support)])
+    first, second = np.triu_indices(len(n_support), k=1)
+    rows, columns, values = [], [], []
+    for pair, (i, j) in enumerate(zip(first, second)):
+        for row, cls in ((j - 1, i), (i, j)):
+            span = np.arange(starts[cls], starts[cls + 1])
+            rows.append(np.full(len(span), pair))
+            columns.append(span)
+            values.append(dual_coef[row, span])
+    coefficients = sparse.csr_matrix((np.concatenate(values), (np.concatenate(rows), np.concatenate(columns))),
+                                     shape=(len(first), dual_coef.shape[1]))
+    return coefficients, first, second
+
+
+def couple_pairwise(upper: np.ndarray, first: np.ndarray, second: np.ndarray, n_classes: int) -> np.ndarray:
+    """Class probabilities from each pair's probability of its first class, (rows, pairs).
+
+    Solves the problem libsvm's ``multiclass_probability`` iterates towards
+    (Wu, Lin and Weng, 2004, method 2): minimise ``p' Q p`` subject to
+    ``sum(p) = 1``, as one bordered linear system per row.
+    """
+    n_rows = len(upper)
+    lower = 1 - upper
+    # Q[t, j] = -r[j, t] r[t, j] and Q[t, t] = sum_j r[j, t]^2
+    system = np.ones((n_rows, n_classes + 1, n_classes + 1))
+    system[:, :n_classes, :n_classes] = 0.0
+    system[:, first, second] = system[:, second, first] = -upper * lower
+    diagonal = np.arange(n_classes)
+    system[:, diagonal, diagonal] = (np.asarray(lower ** 2 @ _incidence(first, n_classes))
+                                     + np.asarray(upper ** 2 @ _incidence(second, n_classes)))
+    system[:, n_classes, n_classes] = 0.0
+    target = np.zeros((n_rows, n_classes + 1, 1))
+    target[:, n_classes] = 1.0
+    return np.linalg.solve(system, target)[:, :n_classes, 0]
+
+
+def _incidence(classes: np.ndarray, n_classes: int):
+    """(pairs, classes) 0/1 matrix marking each pair's class in ``classes``"""
+    return sparse.csr_matrix((np.ones(len(classes)), (np.arange(len(classes)), classes)),
+                             shape=(len(classes), n_classes))
+
+
+class ApproximateSVC:
+    """Serves a fitted ``SVC`` from a precomputed form of its one-vs-one decision functions.
+
+    Every pairwise decision value is a weighted sum of kernel values against
+    the support vectors. By default those sums are kept exactly, as one
+    sparse (support vectors, pairs) matrix, so a batch costs one kernel
+    block and one product rather than a libsvm loop per row. With
+    ``n_components`` below the number of support vectors the model is
+    reduced instead: the k-means centers of the support vectors become the
+    expansion vectors, with weights fitted by least squares to reproduce the
+    exact decision values at every support vector, so a row costs
+    ``n_components`` kernel evaluations however many support vectors the
+    model has. Linear kernels collapse exactly into primal weights.
+
+    ``predict`` votes over the pairs like libsvm. ``predict_proba`` applies
+    the model's own Platt scaling (``probA_``, ``probB_``), then couples the
+    pairwise probabilities: ``coupling='solve'`` solves libsvm's coupling
+    problem per row, ``'average'`` takes each class's mean pairwise
+    probability, which is linear in the number of pairs. Both are exact for
+    binary models. ``predict_proba`` only exists when the SVC was fitted
+    with ``probability=True``.
+    """
+
+    def __init__(self, estimator, n_components: int | None = None, coupling: str = 'average',
+                 random_state: int = 0):
+        if not is_svm_model(estimator):
+            raise ValueError(f"Cannot approximate {type(estimator).__name__}: not an SVC with a built-in kernel")
+        if coupling not in COUPLINGS:
+            raise ValueError(f"Unknown coupling '{coupling}' (expected one of {', '.join(COUPLINGS)})")
+        self.estimator = estimator
+        self.coupling = coupling
+        self.classes_ = estimator.classes_
+        self.n_features_in_ = estimator.n_features_in_
+        self.kernel = estimator.kernel
+        self.gamma = float(estimator._gamma)
+        self.degree = estimator.degree
+        self.coef0 = estimator.coef0
+
+        coefficients, self.first, self.second = _pair_coefficients(estimator)
+        support_vectors = np.asarray(estimator.support_vectors_, dtype=np.float64)
+        self.exact = self.kernel == 'linear' or n_components is None or n_components >= len(support_vectors)
+        self.landmarks = self._landmark_norms = None
+        if self.kernel == 'linear':
+            self.weights = np.asarray((coefficients @ support_vectors).T)
+        elif self.exact:
+            self._set_landmarks(support_vectors)
+            self.weights = coefficients.T.tocsc()
+        else:
+            self._set_landmarks(KMeans(n_clusters=n_components, n_init=3,
+                                       random_state=random_state).fit(support_vectors).cluster_centers_)
+            # W minimising |K(sv, L) W - K(sv, sv) C'|: the exact decisions at the support vectors
+            exact = np.asarray(coefficients @ self._kernel(support_vectors, support_vectors)).T
+            self.weights = np.linalg.lstsq(self._kernel(support_vectors), exact, rcond=None)[0]
+        self.n_components = len(support_vectors) if self.landmarks is None else len(self.landmarks)
+        self.intercept = np.asarray(estimator._intercept_, dtype=np.float64)
+
+        # Not estimator.probability: newer scikit-learn deprecates the parameter
+        self.has_probabilities = hasattr(estimator, 'predict_proba')
+        if self.has_probabilities:
+            self.prob_a = np.asarray(estimator.probA_, dtype=np.float64)
+            self.prob_b = np.asarray(estimator.probB_, dtype=np.float64)
+            # Class c's summed pairwise probability is upper @ sign[:, c] + offset[c]
+            n_classes = len(self.classes_)
+            self._sign = _incidence(self.first, n_classes) - _incidence(self.second, n_classes)
+            self._offset = np.bincount(self.second, minlength=n_classes).astype(np.float64)
+
+    def _set_landmarks(self, landmarks):
+        self.landmarks = np.ascontiguousarray(landmarks, dtype=np.float64)
+        self._landmark_norms = (self.landmarks ** 2).sum(axis=1)
+
+    def _kernel(self, x, landmarks=None) -> np.ndarray:
+        """Kernel values between rows of ``x`` and the landmarks (or other rows)"""
+        norms = self._landmark_norms
+        if landmarks is None:
+            landmarks = self.landmarks
+        elif self.kernel == 'rbf':
+            norms = (landmarks ** 2).sum(axis=1)
+        if self.kernel == 'rbf':
+            distances = (x ** 2).sum(axis=1)[:, np.newaxis] - 2 * (x @ landmarks.T) + norms
+            return np.exp(-self.gamma * np.maximum(distances, 0.0))
+        products = x @ landmarks.T
+        if self.kernel == 'poly':
+            return (self.gamma * products + self.coef0) ** self.degree
+        return np.tanh(self.gamma * products + self.coef0)
+
+    def _check_input(self, x) -> np.ndarray:
+        x = np.asarray(x.toarray() if sparse.issparse(x) else x, dtype=np.float64)
+        if x.ndim != 2 or x.shape[1] != self.n_features_in_:
+            raise ValueError(f"X has {x.shape[-1]} features, but the model expects {self.n_features_in_}")
+        return x
+
+    def pair_decisions(self, x) -> np.ndarray:
+        """libsvm's one-vs-one decision values, (rows, pairs); positive favours the pair's first class"""
+        x = self._check_input(x)
+        features = x if self.kernel == 'linear' else self._kernel(x)
+        return np.asarray(features @ self.weights) + self.intercept
+
+    def predict(self, x) -> np.ndarray:
+        decisions = self.pair_decisions(x)
+        n_rows, n_classes = len(decisions), len(self.classes_)
+        winners = np.where(decisions > 0, self.first, self.second)
+        votes = np.bincount((winners + n_classes * np.arange(n_rows)[:, np.newaxis]).ravel(),
+                            minlength=n_rows * n_classes).reshape(n_rows, n_classes)
+        # Ties go to the lowest class index, as in libsvm
+        return self.classes_.take(np.argmax(votes, axis=1), axis=0)
+
+    def _predict_proba(self, x) -> np.ndarray:
+        decisions = self.pair_decisions(x)
+        # libsvm's sigmoid_predict: 1 / (1 + exp(A f + B))
+        upper = np.clip(expit(-(decisions * self.prob_a + self.prob_b)), _MIN_PROBABILITY, 1 - _MIN_PROBABILITY)
+        n_classes = len(self.classes_)
+        if n_classes == 2:
+            return np.column_stack([upper[:, 0], 1 - upper[:, 0]])
+        if self.coupling == 'solve':
+            return couple_pairwise(upper, self.first, self.second, n_classes)
+        # Each pair splits a probability of one between its classes, so the
+        # per-class means over n_classes - 1 pairs, scaled by 2 / n_classes, sum to one
+        return (np.asarray(upper @ self._sign) + self._offset) / len(self.first)
+
+    @property
+    def predict_proba(self):
+        # Only there for probability=True models, as on the SVC itself
+        if not self.has_probabilities:
+            raise AttributeError('predict_proba is not available when probability=False')
+        return self._predict_proba
@@ -0,0 +1,381 @@
+from __future__ import annotations
+import copy
+
+import numpy as np
+import sklearn
+from scipy import sparse
+from sklearn.dummy import DummyClassifier
+from sklearn.ensemble import (ExtraTreesClassifier, GradientBoostingClassifier, RandomForestClassifier,
+                              VotingClassifier)
+from sklearn.tree import DecisionTreeClassifier, ExtraTreeClassifier
+
+# Before scikit-learn 1.4 classifier trees stored class counts in tree_.value
+# and predict_proba normalized them per row; since then they store fractions
+_NORMALIZE_LEAVES = tuple(int(part) for part in sklearn.__version__.split('.')[:2]) < (1, 4)
+
+# Past these, batches go to the wrapped estimator: the engine saves per-call
+# and per-tree overhead, but scikit-learn's compiled traversal wins once the
+# per-row work dominates. Rows per call; rows x trees (leaves looked up) for
+# binary input; rows x levels summed over trees (nodes visited) otherwise.
+DEFAULT_MAX_ROWS = 32
+DEFAULT_MAX_LEAVES = 1 << 18
+DEFAULT_MAX_VISITS = 1 << 18
+
+_WORD = (1 << 64) - 1
+
+
+def is_tree_model(estimator) -> bool:
+    """Whether ``FlatTreeEnsemble`` can compile this estimator"""
+    if isinstance(estimator, VotingClassifier):
+        return estimator.voting == 'soft' and all(is_tree_model(member) for member in estimator.estimators_)
+    return isinstance(estimator, (DecisionTreeClassifier, ExtraTreeClassifier, RandomForestClassifier,
+                                  ExtraTreesClassifier, GradientBoostingClassifier))
+
+
+def _leaf_probabilities(tree) -> np.ndarray:
+    """Per-node class probabilities exactly as the tree's predict_proba returns them"""
+    values = tree.tree_.value[:, 0, :tree.n_classes_].astype(np.float64)
+    if _NORMALIZE_LEAVES:
+        normalizer = values.sum(axis=1)[:, np.newaxis]
+        normalizer[normalizer == 0.0] = 1.0
+        values /= normalizer
+    return values
+
+
+def _leaf_layout(tree_):
+    """A tree's leaves left to right, and each node's leaf range as ``(first, count)`` lists.
+
+    Nodes are visited depth-first with the left child first, so the leaves
+    under any node are a contiguous run of that order.
+    """
+    left, right = tree_.children_left.tolist(), tree_.children_right.tolist()
+    preorder, stack = [], [0]
+    while stack:
+        node = stack.pop()
+        preorder.append(node)
+        if left[node] >= 0:
+            stack.append(right[node])
+            stack.append(left[node])
+    count = [1] * tree_.node_count
+    for node in reversed(preorder):
+        if left[node] >= 0:
+            count[node] = count[left[node]] + count[right[node]]
+    first = [0] * tree_.node_count
+    for node in preorder:
+        if left[node] >= 0:
+            first[left[node]] = first[node]
+            first[right[node]] = first[node] + count[left[node]]
+    leaves = [node for node in preorder if left[node] < 0]
+    return leaves, first, count
+
+
+def _bit_range(words: int, first: int, count: int) -> list[int]:
+    """Bits ``first`` to ``first + count`` set, as ``words`` 64-bit words"""
+    bits = ((1 << count) - 1) << first
+    return [(bits >> (64 * word)) & _WORD for word in range(words)]
+
+
+class _Member:
+    """One fitted model's slice of the flattened trees and how to combine its leaves"""
+
+    __slots__ = ('estimator', 'start', 'stop', 'node_offset', 'leaf_values', 'average', 'init', 'n_outputs')
+
+    def __init__(self, estimator, start, stop, node_offset, leaf_values, average=False, init=None, n_outputs=1):
+        self.estimator = estimator
+        self.start = start
+        self.stop = stop
+        self.node_offset = node_offset
+        self.leaf_values = leaf_values
+        self.average = average
+        self.init = init
+        self.n_outputs = n_outputs
+
+
+class FlatTreeEnsemble:
+    """Evaluates a fitted tree model with all of its trees flattened into shared node arrays.
+
+    Supports decision trees, random forests (and extra trees), gradient
+    boosting classifiers, and soft-voting ensembles of those. Every tree's
+    nodes go into contiguous feature/threshold/child arrays, with leaves
+    pointing back at themselves, and a batch is traversed one level at a
+    time over all trees in a few NumPy operations instead of one
+    ``predict_proba`` call per tree. Leaf values are combined in the same
+    order and with the same arithmetic as scikit-learn, so probabilities
+    match the original estimator bit for bit.
+
+    Inputs that are all 0/1 (symptom vectors, dense or sparse) take a
+    bit-packed path instead. Each tree's leaves are bits of a bitvector,
+    and a split that a set feature turns false clears the bits of the
+    leaves under its left child; the leaf reached is the lowest bit left
+    standing. Only trees that test one of a row's set features are
+    evaluated this way, the rest reuse the leaf an all-zero row reaches,
+    so the cost follows the number of symptoms rather than rows x trees.
+
+    Exposes ``predict``, ``predict_proba``, ``classes_`` and
+    ``n_features_in_``, so it can stand in for the estimator it wraps.
+    Batches over ``max_rows``, ``max_leaves`` or ``max_visits`` (see
+    above) and inputs with NaN are passed to the original estimator.
+    """
+
+    def __init__(self, estimator, max_rows: int | None = DEFAULT_MAX_ROWS,
+                 max_leaves: int | None = DEFAULT_MAX_LEAVES, max_visits: int | None = DEFAULT_MAX_VISITS):
+        if not is_tree_model(estimator):
+            raise ValueError(f"Cannot compile {type(estimator).__name__}: not a supported tree classifier")
+        self.estimator = estimator
+        self.max_rows = max_rows
+        self.max_leaves = max_leaves
+        self.max_visits = max_visits
+        self.classes_ = estimator.classes_
+        self.n_features_in_ = estimator.n_features_in_
+        self.voting = isinstance(estimator, VotingClassifier)
+        self.weights = None
+        if self.voting and estimator.weights is not None:
+            self.weights = [weight for member, weight in zip(estimator.estimators, estimator.weights)
+                            if member[1] != 'drop']
+
+        trees, self.members = [], []
+        for member in (estimator.estimators_ if self.voting else [estimator]):
+            self.members.append(self._add_member(member, trees))
+        self.n_trees = len(trees)
+        self._compile_nodes(trees)
+        self._compile_bitvectors(trees)
+
+    def _compile_nodes(self, trees):
+        features, thresholds, children, depths, roots = [], [], [], [], []
+        offset = 0
+        for tree in trees:
+            t = tree.tree_
+            nodes = np.arange(t.node_count) + offset
+            leaf = t.children_left < 0
+            roots.append(offset)
+            features.append(np.where(leaf, 0, t.feature))
+            thresholds.append(np.where(leaf, np.inf, t.threshold))
+            # (left, right) pairs; leaves loop back to themselves, so extra levels leave them in place
+            children.append(np.column_stack([np.where(leaf, nodes, t.children_left + offset),
+                                             np.where(leaf, nodes, t.children_right + offset)]).ravel())
+            depths.append(t.max_depth)
+            offset += t.node_count
+        if offset >= np.iinfo(np.int32).max // 2:
+            raise ValueError(f"Too many nodes to compile: {offset}")
+
+        self.n_nodes = offset
+        self.feature = np.concatenate(features).astype(np.intp)
+        self.threshold = np.concatenate(thresholds).astype(np.float64)
+        self.children = np.concatenate(children).astype(np.int32)
+        # Traverse deepest trees first, so each level only touches a prefix of the columns
+        depths = np.asarray(depths)
+        order = np.argsort(-depths, kind='stable')
+        self.restore = np.argsort(order)
+        self.roots = np.asarray(roots, dtype=np.int32)[order]
+        self.active = [int((depths > level).sum()) for level in range(int(depths.max(initial=0)))]
+        self.visits_per_row = int(depths.sum())
+
+    def _compile_bitvectors(self, trees):
+        layouts = [_leaf_layout(tree.tree_) for tree in trees]
+        self.words = max(1, (max(len(leaves) for leaves, _, _ in layouts) + 63) // 64)
+        base, leaf_nodes, leaf_start = [], [], []
+        flip_feature, flip_tree, flip_mask = [], [], []
+        offset = 0
+        for index, (tree, (leaves, first, count)) in enumerate(zip(trees, layouts)):
+            t = tree.tree_
+            leaf_start.append(len(leaf_nodes))
+            leaf_nodes.extend(node + offset for node in leaves)
+            bits = _bit_range(self.words, 0, len(leaves))
+            for node, left, feature, threshold in zip(range(t.node_count), t.children_left.tolist(),
+                                                      t.feature.tolist(), t.threshold.tolist()):
+                if left < 0 or threshold >= 1.0:
+                    continue  # a leaf, or 0 and 1 both go left
+                mask = [~word & _WORD for word in _bit_range(self.words, first[left], count[left])]
+                if threshold < 0.0:
+                    # 0 and 1 both go right: the left subtree is never reached
+                    bits = [word & m for word, m in zip(bits, mask)]
+                else:
+                    flip_feature.append(feature)
+                    flip_tree.append(index)
+                    flip_mask.append(mask)
+            base.append(bits)
+            offset += t.node_count
+
+        self.base_bits = np.array(base, dtype=np.uint64).reshape(self.n_trees, self.words)
+        self.leaf_nodes = np.asarray(leaf_nodes, dtype=np.int32)
+        self.leaf_start = np.asarray(leaf_start, dtype=np.intp)
+        # Splits flipped by each feature, grouped by feature
+        by_feature = np.argsort(np.asarray(flip_feature, dtype=np.intp), kind='stable')
+        self.flip_tree = np.asarray(flip_tree, dtype=np.intp)[by_feature]
+        self.flip_mask = np.array(flip_mask, dtype=np.uint64).reshape(-1, self.words)[by_feature]
+        self.flip_start = np.zeros(self.n_features_in_ + 1, dtype=np.intp)
+        np.cumsum(np.bincount(np.asarray(flip_feature, dtype=np.intp), minlength=self.n_features_in_),
+                  out=self.flip_start[1:])
+        self.zero_leaves = self._exit_leaves(np.arange(self.n_trees), self.base_bits)
+
+    def _exit_leaves(self, trees, bits):
+        """Flattened node index of the leftmost leaf still set in each tree's bitvector"""
+        word = np.argmax(bits != 0, axis=1) if self.words > 1 else np.zeros(len(bits), dtype=np.intp)
+        value = bits[np.arange(len(bits)), word]
+        lowest = value & (~value + np.uint64(1))
+        rank = word * 64 + np.log2(lowest).astype(np.intp)
+        return self.leaf_nodes[self.leaf_start[trees] + rank]
+
+    def _add_member(self, estimator, trees):
+        start, node_offset = len(trees), sum(tree.tree_.node_count for tree in trees)
+        if isinstance(estimator, GradientBoostingClassifier):
+            stages = estimator.estimators_
+            trees.extend(stages.ravel())
+            # scale * value, the product predict_stages adds for every stage
+            leaf_values = np.concatenate([estimator.learning_rate * tree.tree_.value[:, 0, 0]
+                                          for tree in stages.ravel()])
+            if estimator.init_ != 'zero' and not isinstance(estimator.init_, DummyClassifier):
+                raise ValueError('Gradient boosting with a custom init estimator is not supported')
+            # The default prior is the same raw score for every row
+            init = estimator._raw_predict_init(np.zeros((1, estimator.n_features_in_), dtype=np.float32))
+            return _Member(estimator, start, len(trees), node_offset, leaf_values, init=init[0],
+                           n_outputs=stages.shape[1])
+        if getattr(estimator, 'n_outputs_', 1) != 1:
+            raise ValueError('Multi-output trees are not supported')
+        members = estimator.estimators_ if hasattr(estimator, 'estimators_') else [estimator]
+        trees.extend(members)
+        leaf_values = np.concatenate([_leaf_probabilities(tree) for tree in members])
+        return _Member(estimator, start, len(trees), node_offset, leaf_values,
+                       average=hasattr(estimator, 'estimators_'))
+
+    def _check_input(self, x):
+        """Float32 CSR or C-ordered dense input, as the tree estimators convert it"""
+        if sparse.issparse(x):
+            x = sparse.csr_matrix(x, dtype=np.float32)
+        else:
+            x = np.ascontiguousarray(x, dtype=np.float32)
+        if x.ndim != 2 or x.shape[1] != self.n_features_in_:
+            raise ValueError(f"X has {x.shape[-1]} features, but the model expects {self.n_features_in_}")
+        return x
+
+    @staticmethod
+    def _is_binary(x) -> bool:
+        values = x.data if sparse.issparse(x) else x
+        return bool(((values == 0) | (values == 1)).all())
+
+    def apply(self, x) -> np.ndarray:
+        """(n_rows, n_trees) index into the flattened nodes of the leaf each row reaches in each tree"""
+        x = self._check_input(x)
+        apply = self._apply_binary if self._is_binary(x) else self._apply_dense
+        if sparse.issparse(x) and apply is self._apply_dense:
+            x = x.toarray()
+        step = max(1, self.max_rows or x.shape[0])
+        return np.concatenate([apply(x[begin:begin + step]) for begin in range(0, x.shape[0], step)] or
+                              [np.empty((0, self.n_trees), dtype=np.int32)])
+
+    def _apply_dense(self, x):
+        nodes = np.repeat(self.roots[np.newaxis, :], len(x), axis=0)
+        rows = np.arange(len(x))[:, np.newaxis]
+        for active in self.active:
+            node = nodes[:, :active]
+            go_right = x[rows, self.feature[node]] > self.threshold[node]
+            nodes[:, :active] = self.children[2 * node + go_right]
+        return nodes[:, self.restore]
+
+    def _apply_binary(self, x):
+        rows, columns = x.nonzero()
+        if sparse.issparse(x):
+            keep = x.data[x.data != 0] == 1  # nonzero() already skips explicit zeros
+            rows, columns = rows[keep], columns[keep]
+        n_rows = x.shape[0]
+        leaves = np.repeat(self.zero_leaves[np.newaxis, :], n_rows, axis=0)
+        starts = self.flip_start[columns]
+        counts = self.flip_start[columns + 1] - starts
+        if not counts.any():
+            return leaves
+        # Every split flipped by every set feature, as an index into the (row, tree) bitvectors
+        ends = np.cumsum(counts)
+        flips = np.arange(ends[-1]) + np.repeat(starts - (ends - counts), counts)
+        pairs = np.repeat(rows, counts) * self.n_trees + self.flip_tree[flips]
+        bits = np.repeat(self.base_bits[np.newaxis, :, :], n_rows, axis=0).reshape(-1, self.words)
+        for word in range(self.words):
+            np.bitwise_and.at(bits[:, word], pairs, self.flip_mask[flips, word])
+        touched = np.zeros(n_rows * self.n_trees, dtype=bool)
+        touched[pairs] = True
+        touched = np.flatnonzero(touched)
+        leaves.ravel()[touched] = self._exit_leaves(touched % self.n_trees, bits[touched])
+        return leaves
+
+    def _member_output(self, member, leaves):
+        """A member's predict_proba (or boosting raw scores) from its slice of the leaves"""
+        nodes = leaves[:, member.start:member.stop] - member.node_offset
+        values = member.leaf_values[nodes]
+        if member.init is not None:
+            n_rows = len(leaves)
+            stages = values.reshape(n_rows, -1, member.n_outputs)
+            # Sum stage by stage after the init score, like predict_stages
+            raw = np.concatenate([np.broadcast_to(member.init, (n_rows, 1, member.n_outputs)), stages], axis=1)
+            return np.add.reduce(raw, axis=1)
+        if member.average:
+            # A forest adds its trees' probabilities in order, then divides
+            proba = np.add.reduce(values, axis=1)
+            proba /= member.stop - member.start
+            return proba
+        return values[:, 0]
+
+    @staticmethod
+    def _boosting_result(member, raw):
+        """Labels and probabilities from gradient boosting raw scores, as the estimator computes them"""
+        loss = member.estimator._loss
+        scores = raw.ravel() if raw.shape[1] == 1 else raw
+        if hasattr(loss, 'predict_proba'):
+            proba = loss.predict_proba(scores)
+        else:
+            proba = loss._raw_prediction_to_proba(scores)  # scikit-learn < 1.4
+        # GradientBoostingClassifier.predict decides on the raw scores
+        encoded = (raw[:, 0] >= 0).astype(int) if raw.shape[1] == 1 else np.argmax(raw, axis=1)
+        return member.estimator.classes_[encoded], proba
+
+    def unlimited(self) -> FlatTreeEnsemble:
+        """A copy sharing the compiled arrays that never hands batches to the estimator"""
+        engine = copy.copy(self)
+        engine.max_rows = engine.max_leaves = engine.max_visits = None
+        return engine
+
+    def _use_engine(self, x) -> str | None:
+        """'binary' or 'dense' for the traversal to use, or None to call the estimator"""
+        n_rows = x.shape[0]
+        if self.max_rows is not None and n_rows > self.max_rows:
+            return None
+        if self._is_binary(x):
+            return None if self.max_leaves is not None and n_rows * self.n_trees > self.max_leaves else 'binary'
+        values = x.data if sparse.issparse(x) else x
+        if np.isnan(values).any():
+            return None
+        return None if self.max_visits is not None and n_rows * self.visits_per_row > self.max_visits else 'dense'
+
+    def _predict(self, x):
+        """Returns (labels, probabilities)"""
+        x = self._check_input(x)
+        path = self._use_engine(x)
+        boosting = not self.voting and self.members[0].init is not None
+        if path is None:
+            if boosting:
+                raw = self.estimator.decision_function(x).reshape(x.shape[0], -1)
+                return self._boosting_result(self.members[0], raw)
+            proba = self.estimator.predict_proba(x)
+            return self.classes_.take(np.argmax(proba, axis=1), axis=0), proba
+
+        if path == 'binary':
+            leaves = self._apply_binary(x)
+        else:
+            leaves = self._apply_dense(x.toarray() if sparse.issparse(x) else x)
+        outputs = []
+        for member in self.members:
+            output = self._member_output(member, leaves)
+            if member.init is not None:
+                labels, output = self._boosting_result(member, output)
+                if boosting:
+                    return labels, output
+            outputs.append(output)
+        if self.voting:
+            proba = np.average(np.asarray(outputs), axis=0, weights=self.weights)
+        else:
+            proba = outputs[0]
+        return self.classes_.take(np.argmax(proba, axis=1), axis=0), proba
+
+    def predict_proba(self, x) -> np.ndarray:
+        return self._predict(x)[1]
+
+    def predict(self, x) -> np.ndarray:
+        return self._predict(x)[0]
@@ -0,0 +1,93 @@
+from __future__ import annotations
+import re
+from typing import Iterable
+
+import numpy as np
+from scipy import sparse
+
+
+def normalize_symptom(symptom: str) -> str:
+    """Canonical lookup key for a symptom name (case, spacing, separators)."""
+    key = str(symptom).strip().lower().replace('_', ' ').replace('’', "'")
+    return re.sub(r'\s+', ' ', key)
+
+
+class SymptomVectorizer:
+    """Maps symptom lists to binary feature rows using a precomputed column index.
+
+    The symptom -> column dict is built once (at model load time), so
+    vectorizing a request costs O(symptoms) instead of O(symptoms x features).
+    Lookups accept the exact feature name, its normalized form, or any alias
+    passed in ``aliases`` (alias -> feature name).
+    """
+
+    def __init__(self, feature_cols: Iterable[str], aliases: dict[str, str] | None = None):
+        self.feature_cols = list(feature_cols)
+        self.n_features = len(self.feature_cols)
+        self.column_index: dict[str, int] = {}
+        for i, name in enumerate(self.feature_cols):
+            self.column_index.setdefault(normalize_symptom(name), i)
+        for alias, name in (aliases or {}).items():
+            column = self.column_index.get(normalize_symptom(name))
+            if column is None:
+                raise ValueError(f"Alias '{alias}' points to unknown feature '{name}'")
+            self.column_index.setdefault(normalize_symptom(alias), column)
+        # Exact names always win over normalized collisions
+        self._exact_index = {name: i for i, name in enumerate(self.feature_cols)}
+
+    def index_of(self, symptom: str) -> int | None:
+        column = self._exact_index.get(symptom)
+        if column is None:
+            column = self.column_index.get(normalize_symptom(symptom))
+        return column
+
+    def columns(self, symptoms: Iterable[str]) -> tuple[list[int], list[str]]:
+        """Return the de-duplicated column indices and the symptoms that matched."""
+        columns, found, seen = [], [], set()
+        for symptom in symptoms:
+            column = self.index_of(symptom)
+            if column is None or column in seen:
+                continue
+            seen.add(column)
+            columns.append(column)
+            found.append(symptom)
+        return columns, found
+
+    def transform_one(self, symptoms: Iterable[str], out: np.ndarray | None = None,
+                      dtype=np.float32) -> tuple[np.ndarray, list[str]]:
+        """Vectorize one symptom list into a (1, n_features) row.
+
+        Pass a preallocated ``out`` row to reuse its memory between calls.
+        """
+        if out is None:
+            out = np.zeros((1, self.n_features), dtype=dtype)
+        else:
+            out.fill(0)
+        columns, found = self.columns(symptoms)
+        out.reshape(-1)[columns] = 1
+        return out, found
+
+    def transform(self, symptom_lists: Iterable[Iterable[str]], as_sparse: bool = False,
+                  dtype=np.float32):
+        """Vectorize many symptom lists at once.
+
+        Returns a scipy CSR matrix when ``as_sparse`` is set, otherwise a dense
+        (N, n_features) array filled in a single scatter.
+        """
+        indptr, indices = [0], []
+        for symptoms in symptom_lists:
+            columns, _ = self.columns(symptoms)
+            indices.extend(columns)
+            indptr.append(len(indices))
+        n_rows = len(indptr) - 1
+        indices = np.asarray(indices, dtype=np.int32)
+        indptr = np.asarray(indptr, dtype=np.int32)
+
+        if as_sparse:
+            data = np.ones(len(indices), dtype=dtype)
+            return sparse.csr_matrix((data, indices, indptr), shape=(n_rows, self.n_features))
+
+        out = np.zeros((n_rows, self.n_features), dtype=dtype)
+        rows = np.repeat(np.arange(n_rows), np.diff(indptr))
+        out[rows, indices] = 1
+        return out
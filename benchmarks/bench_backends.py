@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Benchmark: pickle (scikit-learn) vs ONNX Runtime inference per model key,
+measured on rows from the bundled Datasets/*.csv files
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+os.environ.setdefault('ML_EAGER_WARMUP', '0')
+
+import ml_service  # noqa: E402
+from ML.datasets import load_model_dataset  # noqa: E402
+from serving.backends import OnnxBackend, check_parity  # noqa: E402
+
+
+def rows_per_second(backend, rows, batch_size, min_seconds):
+    """Best-effort steady-state throughput for one batch size"""
+    batches = [rows[i:i + batch_size] for i in range(0, len(rows) - batch_size + 1, batch_size)]
+    backend.predict(batches[0])  # warm up
+    scored, start = 0, time.perf_counter()
+    while time.perf_counter() - start < min_seconds:
+        for batch in batches:
+            backend.predict(batch)
+            scored += len(batch)
+    return scored / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare pickle and ONNX inference backends')
+    parser.add_argument('--models', nargs='+', help='Model keys (default: all in the ONNX manifest)')
+    parser.add_argument('--batch-sizes', nargs='+', type=int, default=[1, 32, 256])
+    parser.add_argument('--seconds', type=float, default=1.0, help='Minimum timing window per measurement')
+    parser.add_argument('--threads', type=int, default=ml_service.ONNX_INTRA_OP_THREADS, help='ONNX intra-op threads')
+    args = parser.parse_args()
+
+    manifest = ml_service.load_onnx_manifest()
+    for model_key in args.models or sorted(manifest):
+        try:
+            reference = ml_service.build_sklearn_backend(model_key, ml_service.load_model(model_key))
+            entry = manifest[model_key]
+            onnx_backend = OnnxBackend(
+                ml_service.ONNX_DIR / entry['file'],
+                classes=entry.get('classes', reference.classes),
+                has_probabilities=reference.has_probabilities,
+                intra_op_threads=args.threads
+            )
+            rows, _, _ = load_model_dataset(model_key)
+        except Exception as e:
+            print(f"[bench][SKIP] {model_key}: {e}")
+            continue
+
+        rows = np.tile(rows, (max(1, -(-max(args.batch_sizes) // len(rows))), 1))
+        parity = check_parity(reference, onnx_backend, rows[:1000])
+        print(f"[bench] {model_key}: parity {'OK' if parity['passed'] else 'FAILED'} "
+              f"(label mismatch {parity['label_mismatch']:.4f}, max prob error {parity['max_probability_error']})")
+        for batch_size in args.batch_sizes:
+            sklearn_rps = rows_per_second(reference, rows, batch_size, args.seconds)
+            onnx_rps = rows_per_second(onnx_backend, rows, batch_size, args.seconds)
+            print(f"[bench]   batch {batch_size:>5}: sklearn {sklearn_rps:>11,.0f} rows/s | "
+                  f"onnx {onnx_rps:>11,.0f} rows/s | speedup {onnx_rps / sklearn_rps:5.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Benchmark: per-request cost of the request instrumentation (stage histograms)
+and of the slow-request profiler, on /predict through the Flask test client.
+Each configuration runs in its own process, since the service reads its
+settings at import time.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+CONFIGS = {
+    'off': {'ML_REQUEST_METRICS': '0'},
+    'metrics': {'ML_REQUEST_METRICS': '1', 'ML_PROFILE_SLOW_MS': '0'},
+    'profiler': {'ML_REQUEST_METRICS': '1', 'ML_PROFILE_SLOW_MS': '10000'},
+}
+# Cache and micro-batching off so every request takes the same path
+COMMON_ENV = {'ML_EAGER_WARMUP': '0', 'ML_MODEL_WATCH': '0', 'ML_CACHE': '0', 'ML_MICROBATCH': '0'}
+
+HEART_SAMPLE = {'age': 63, 'sex': 1, 'cp': 3, 'trestbps': 145, 'chol': 233, 'fbs': 1, 'restecg': 0,
+                'thalach': 150, 'exang': 0, 'oldpeak': 2.3, 'slope': 0, 'ca': 0, 'thal': 1}
+
+
+def run_config(model_key, model_file, requests, repeats):
+    """Time /predict in this process, plus the bookkeeping of one traced request on its own"""
+    sys.path.insert(0, str(BASE_DIR))
+    import ml_service
+    from serving.instrumentation import stage
+
+    if model_file:
+        ml_service.MODEL_PATHS[model_key] = Path(model_file)
+    client = ml_service.app.test_client()
+    body = {'model': model_key, 'data': HEART_SAMPLE}
+    response = client.post('/predict', json=body)
+    if response.status_code != 200:
+        return {'error': response.get_json().get('details', response.status_code)}
+
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        for _ in range(requests):
+            client.post('/predict', json=body)
+        timings.append((time.perf_counter() - started) / requests * 1e6)
+
+    # Cost of one stage block outside a request (what disabled metrics pay)
+    started = time.perf_counter()
+    for _ in range(100_000):
+        with stage('noop'):
+            pass
+    idle_stage_ns = (time.perf_counter() - started) / 100_000 * 1e9
+
+    # begin + the five /predict stages + end, without the request around them
+    trace_ns = 0.0
+    if ml_service.instrumentation is not None:
+        started = time.perf_counter()
+        for _ in range(20_000):
+            ml_service.instrumentation.begin('/bench')
+            for name in ('parse', 'prepare', 'cache', 'inference', 'serialize'):
+                with stage(name):
+                    pass
+            ml_service.instrumentation.end(200)
+        trace_ns = (time.perf_counter() - started) / 20_000 * 1e9
+    return {'us_per_request': timings, 'idle_stage_ns': idle_stage_ns, 'trace_ns': trace_ns}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the overhead of request instrumentation')
+    parser.add_argument('--model', default='heart', help='Model key to call /predict with')
+    parser.add_argument('--model-file', help='Artifact to load for --model instead of its MODEL_PATHS entry')
+    parser.add_argument('--requests', type=int, default=2000, help='Requests per timed repeat')
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--config', choices=CONFIGS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.config:
+        print(json.dumps(run_config(args.model, args.model_file, args.requests, args.repeats)))
+        return
+
+    baseline = None
+    for name, env in CONFIGS.items():
+        command = [sys.executable, __file__, '--config', name, '--model', args.model,
+                   '--requests', str(args.requests), '--repeats', str(args.repeats)]
+        if args.model_file:
+            command += ['--model-file', args.model_file]
+        completed = subprocess.run(command, capture_output=True, text=True, cwd=BASE_DIR,
+                                   env=dict(os.environ, **COMMON_ENV, **env))
+        try:
+            result = json.loads(completed.stdout.strip().splitlines()[-1])
+        except (IndexError, ValueError):
+            print(f"[bench][SKIP] {name}: {completed.stderr.strip().splitlines()[-1:]}")
+            continue
+        if 'error' in result:
+            print(f"[bench][SKIP] {name}: {result['error']}")
+            continue
+        # Best repeat, the least disturbed by other load on the machine
+        per_request = min(result['us_per_request'])
+        baseline = per_request if baseline is None else baseline
+        print(f"[bench] {name:<9} {per_request:8.1f} us/request | overhead {per_request - baseline:+7.1f} us "
+              f"({(per_request / baseline - 1) * 100:+5.1f}%) | traced request bookkeeping "
+              f"{result['trace_ns'] / 1000:6.1f} us | idle stage() {result['idle_stage_ns']:5.0f} ns")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Benchmark: naive pd.read_csv of medicines.csv vs the chunked columnar cache
+(ML/columnar.py). Each phase runs in its own process so peak RSS is its own.
+"""
+
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+from ML.columnar import ColumnarTable, build_table  # noqa: E402
+from ML.datasets import CACHE_DIR, MEDICINES_CSV  # noqa: E402
+
+PHASES = ('read_csv', 'build', 'open_lookup')
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_phase(phase, csv_path, cache_dir, disease, chunk_size):
+    """Run one phase in this process and return its timings"""
+    import pandas as pd
+
+    started = time.perf_counter()
+    result = {'phase': phase}
+    if phase == 'read_csv':
+        df = pd.read_csv(csv_path, low_memory=False)
+        result['rows'] = len(df)
+        if disease is not None:
+            column = next((c for c in df.columns if c.strip().lower() in ('disease', 'diseases', 'condition',
+                                                                            'indication', 'uses', 'use')), None)
+            lookup_started = time.perf_counter()
+            if column is not None:
+                result['matches'] = int((df[column].astype(str).str.strip().str.lower() == disease.lower()).sum())
+            result['lookup_ms'] = (time.perf_counter() - lookup_started) * 1000
+    elif phase == 'build':
+        manifest = build_table(csv_path, cache_dir, chunk_size=chunk_size)
+        result['rows'] = manifest['rows']
+    else:
+        table = ColumnarTable(cache_dir)
+        result['rows'] = len(table)
+        if disease is not None and table.index_column is not None:
+            lookup_started = time.perf_counter()
+            result['matches'] = len(table.lookup(disease))
+            result['lookup_ms'] = (time.perf_counter() - lookup_started) * 1000
+    result['seconds'] = time.perf_counter() - started
+    result['peak_rss_mb'] = peak_rss_mb()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare read_csv and the columnar cache for medicines.csv')
+    parser.add_argument('--csv', default=str(MEDICINES_CSV))
+    parser.add_argument('--cache-dir', default=str(CACHE_DIR / 'bench_medicines'))
+    parser.add_argument('--disease', help='Disease to look up (default: first key of the index)')
+    parser.add_argument('--chunk-size', type=int, default=100_000)
+    parser.add_argument('--phase', choices=PHASES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.phase:
+        print(json.dumps(run_phase(args.phase, Path(args.csv), Path(args.cache_dir), args.disease, args.chunk_size)))
+        return
+
+    csv_path = Path(args.csv)
+    if not csv_path.is_file():
+        print(f"[bench][SKIP] {csv_path} not found")
+        return
+    with open(csv_path, 'rb') as f:
+        if f.read(len(b'version https://git-lfs')) == b'version https://git-lfs':
+            print(f"[bench][SKIP] {csv_path.name} is a Git LFS pointer; run `git lfs pull` first")
+            return
+
+    print(f"[bench] {csv_path.name}: {csv_path.stat().st_size / 1e6:.1f} MB")
+    disease = args.disease
+    for phase in ('build', 'open_lookup', 'read_csv'):
+        if disease is None and phase != 'build':
+            keys = (ColumnarTable(args.cache_dir).manifest.get('index') or {}).get('keys') or []
+            disease = keys[0] if keys else None
+        command = [sys.executable, __file__, '--phase', phase, '--csv', args.csv, '--cache-dir', args.cache_dir,
+                   '--chunk-size', str(args.chunk_size)] + (['--disease', disease] if disease else [])
+        result = json.loads(subprocess.run(command, check=True, capture_output=True, text=True).stdout)
+        lookup = f" | lookup {result['lookup_ms']:8.2f} ms ({result.get('matches', 0)} rows)" \
+            if 'lookup_ms' in result else ''
+        print(f"[bench] {phase:<12} {result['seconds']:7.2f}s | peak RSS {result['peak_rss_mb']:8.1f} MB{lookup}")
+
+
+if __name__ == '__main__':
+    main()
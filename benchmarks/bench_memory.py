@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Benchmark: resident memory of N forked workers loading the same model from
+its pickle vs its memory-mapped directory artifact (ML/model_store.py).
+Reads RSS/PSS from /proc/<pid>/smaps_rollup, so Linux only.
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+os.environ.setdefault('ML_EAGER_WARMUP', '0')
+
+import ml_service  # noqa: E402
+from ML.datasets import load_model_dataset  # noqa: E402
+from ML.model_store import is_artifact_dir, load_any  # noqa: E402
+
+
+def memory_kb(pid):
+    """(Rss, Pss) of a process in KB"""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup", encoding='utf-8') as f:
+        for line in f:
+            parts = line.split()
+            if parts[0] in ('Rss:', 'Pss:'):
+                values[parts[0][:-1]] = int(parts[1])
+    return values['Rss'], values['Pss']
+
+
+def worker(model_key, path, rows, ready, release):
+    """Load the model, score rows once so every page it needs is touched, then idle"""
+    try:
+        backend = ml_service.build_sklearn_backend(model_key, load_any(path))
+        backend.predict(rows)
+    except Exception as e:
+        ready.put(e)
+        return
+    ready.put(os.getpid())
+    release.wait()
+
+
+def measure(model_key, path, rows, n_workers):
+    """Fork n workers that each load ``path``; return summed (Rss, Pss) in KB and the load time"""
+    context = multiprocessing.get_context('fork')
+    ready, release = context.Queue(), context.Event()
+    started = time.perf_counter()
+    workers = [context.Process(target=worker, args=(model_key, path, rows, ready, release))
+               for _ in range(n_workers)]
+    for process in workers:
+        process.start()
+    pids = [ready.get(timeout=300) for _ in workers]
+    elapsed = time.perf_counter() - started
+    try:
+        for pid in pids:
+            if isinstance(pid, Exception):
+                raise pid
+        usage = [memory_kb(pid) for pid in pids]
+    finally:
+        release.set()
+        for process in workers:
+            process.join()
+    return sum(u[0] for u in usage), sum(u[1] for u in usage), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare worker memory for pickled vs memory-mapped models')
+    parser.add_argument('--models', nargs='+', default=list(ml_service.MODEL_PATHS), help='Model keys')
+    parser.add_argument('--workers', nargs='+', type=int, default=[1, 2, 4, 8])
+    parser.add_argument('--rows', type=int, default=256, help='Rows each worker scores after loading')
+    args = parser.parse_args()
+
+    if not Path('/proc/self/smaps_rollup').exists():
+        print('[bench][SKIP] /proc/<pid>/smaps_rollup is not available on this system')
+        return
+
+    for model_key in args.models:
+        pickle_path = ml_service.MODEL_PATHS.get(model_key)
+        try:
+            rows, _, _ = load_model_dataset(model_key, n_rows=args.rows)
+            if pickle_path is None or not pickle_path.exists():
+                raise FileNotFoundError(f"Model file not found: {pickle_path}")
+        except Exception as e:
+            print(f"[bench][SKIP] {model_key}: {e}")
+            continue
+
+        formats = [('pickle', pickle_path)]
+        if is_artifact_dir(pickle_path.with_suffix('')):
+            formats.append(('mmap', pickle_path.with_suffix('')))
+        else:
+            print(f"[bench] {model_key}: no directory artifact, convert with "
+                  f"python ML/model_store.py {pickle_path.relative_to(BASE_DIR)}")
+
+        for n_workers in args.workers:
+            for name, path in formats:
+                try:
+                    rss, pss, elapsed = measure(model_key, path, rows, n_workers)
+                except Exception as e:
+                    print(f"[bench][SKIP] {model_key} {name}: {e}")
+                    continue
+                print(f"[bench] {model_key:<13} {name:<6} workers {n_workers}: "
+                      f"RSS {rss / 1024:8.1f} MB | PSS {pss / 1024:8.1f} MB | "
+                      f"PSS/worker {pss / 1024 / n_workers:7.1f} MB | ready in {elapsed:5.2f}s")
+
+
+if __name__ == '__main__':
+    main()
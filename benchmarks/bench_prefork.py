@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Benchmark: startup time and total memory of N pre-forked workers sharing
+preloaded models (ml_prefork.py) vs N independent ml_service.py processes.
+Reads PSS from /proc/<pid>/smaps_rollup, so Linux only.
+"""
+
+import argparse
+import http.client
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+HEART_REQUEST = json.dumps({'model': 'heart', 'data': {
+    'age': 63, 'sex': 1, 'cp': 3, 'trestbps': 145, 'chol': 233, 'fbs': 1, 'restecg': 0,
+    'thalach': 150, 'exang': 0, 'oldpeak': 2.3, 'slope': 0, 'ca': 0, 'thal': 1}})
+
+
+def pss_kb(pid):
+    with open(f"/proc/{pid}/smaps_rollup", encoding='utf-8') as f:
+        for line in f:
+            if line.startswith('Pss:'):
+                return int(line.split()[1])
+    return 0
+
+
+def children(pid):
+    with open(f"/proc/{pid}/task/{pid}/children", encoding='utf-8') as f:
+        return [int(child) for child in f.read().split()]
+
+
+def healthy(port):
+    try:
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+        connection.request('GET', '/health')
+        return connection.getresponse().status == 200
+    except OSError:
+        return False
+
+
+def touch(port, requests):
+    """Send a few predictions so workers fault in the pages they use to serve"""
+    for _ in range(requests):
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        connection.request('POST', '/predict', body=HEART_REQUEST, headers={'Content-Type': 'application/json'})
+        connection.getresponse().read()
+        connection.close()
+
+
+def wait_until(condition, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def run_prefork(n_workers, port, timeout):
+    started = time.perf_counter()
+    master = subprocess.Popen([sys.executable, 'ml_prefork.py', '--workers', str(n_workers), '--port', str(port),
+                               '--host', '127.0.0.1'], cwd=BASE_DIR,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not wait_until(lambda: len(children(master.pid)) >= n_workers and healthy(port), timeout):
+            raise TimeoutError('workers did not become healthy')
+        elapsed = time.perf_counter() - started
+        touch(port, 4 * n_workers)
+        pids = [master.pid] + children(master.pid)
+        return sum(pss_kb(pid) for pid in pids), elapsed
+    finally:
+        master.terminate()
+        master.wait(timeout=60)
+
+
+def run_independent(n_workers, port, timeout):
+    started = time.perf_counter()
+    servers = [subprocess.Popen([sys.executable, 'ml_service.py'], cwd=BASE_DIR,
+                                env=dict(os.environ, ML_PORT=str(port + i)),
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+               for i in range(n_workers)]
+    try:
+        if not wait_until(lambda: all(healthy(port + i) for i in range(n_workers)), timeout):
+            raise TimeoutError('servers did not become healthy')
+        elapsed = time.perf_counter() - started
+        for i in range(n_workers):
+            touch(port + i, 4)
+        return sum(pss_kb(server.pid) for server in servers), elapsed
+    finally:
+        for server in servers:
+            server.terminate()
+        for server in servers:
+            server.wait(timeout=60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare pre-forked and independent worker processes')
+    parser.add_argument('--workers', nargs='+', type=int, default=[1, 2, 4, 8])
+    parser.add_argument('--modes', nargs='+', choices=('prefork', 'independent'), default=['prefork', 'independent'])
+    parser.add_argument('--port', type=int, default=5201, help='First port to use')
+    parser.add_argument('--timeout', type=float, default=300.0, help='Seconds to wait for startup')
+    args = parser.parse_args()
+
+    if not Path('/proc/self/smaps_rollup').exists():
+        print('[bench][SKIP] /proc/<pid>/smaps_rollup is not available on this system')
+        return
+
+    runners = {'prefork': run_prefork, 'independent': run_independent}
+    for n_workers in args.workers:
+        for mode in args.modes:
+            try:
+                pss, elapsed = runners[mode](n_workers, args.port, args.timeout)
+            except Exception as e:
+                print(f"[bench][SKIP] {mode} workers {n_workers}: {e}")
+                continue
+            print(f"[bench] {mode:<11} workers {n_workers:>2}: ready in {elapsed:6.2f}s | "
+                  f"PSS {pss / 1024:8.1f} MB | PSS/worker {pss / 1024 / n_workers:7.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Benchmark: Flask (ml_service.py) vs ASGI (ml_asgi.py) serving under concurrent
+keep-alive clients, reporting throughput, p50/p99 latency and 429s
+"""
+
+import argparse
+import http.client
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import numpy as np
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+HEART_SAMPLE = {'age': 63, 'sex': 1, 'cp': 3, 'trestbps': 145, 'chol': 233, 'fbs': 1, 'restecg': 0,
+                'thalach': 150, 'exang': 0, 'oldpeak': 2.3, 'slope': 0, 'ca': 0, 'thal': 1}
+
+
+def server_command(mode, port):
+    if mode == 'flask':
+        return [sys.executable, 'ml_service.py']
+    return [sys.executable, '-m', 'uvicorn', 'ml_asgi:app', '--host', '127.0.0.1', '--port', str(port),
+            '--log-level', 'warning']
+
+
+def wait_for_health(url, timeout):
+    parts = urlsplit(url)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=2)
+            connection.request('GET', '/health')
+            if connection.getresponse().status == 200:
+                return True
+        except OSError:
+            pass
+        time.sleep(0.2)
+    return False
+
+
+def hammer(url, path, body, clients, seconds):
+    """``clients`` threads each sending requests back to back over one keep-alive connection"""
+    parts = urlsplit(url)
+    headers = {'Content-Type': 'application/json', 'Connection': 'keep-alive'}
+    deadline = time.monotonic() + seconds
+    results = [([], {}) for _ in range(clients)]
+
+    def client(timings, statuses):
+        connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=30)
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                connection.request('POST', path, body=body, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=30)
+                status = 'error'
+            timings.append(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+        connection.close()
+
+    threads = [threading.Thread(target=client, args=result) for result in results]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    timings = np.array([t for result in results for t in result[0]]) * 1000
+    statuses = {}
+    for _, counts in results:
+        for status, count in counts.items():
+            statuses[status] = statuses.get(status, 0) + count
+    return {
+        'requests': len(timings),
+        'rps': statuses.get(200, 0) / elapsed,
+        'p50_ms': float(np.percentile(timings, 50)) if len(timings) else 0.0,
+        'p99_ms': float(np.percentile(timings, 99)) if len(timings) else 0.0,
+        'rejected': statuses.get(429, 0),
+        'errors': sum(count for status, count in statuses.items() if status not in (200, 429)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare Flask and ASGI serving throughput and tail latency')
+    parser.add_argument('--modes', nargs='+', choices=('flask', 'asgi'), default=['flask', 'asgi'])
+    parser.add_argument('--path', default='/predict')
+    parser.add_argument('--payload', help='JSON file with the request body (default: one heart /predict row)')
+    parser.add_argument('--clients', nargs='+', type=int, default=[1, 8, 32])
+    parser.add_argument('--seconds', type=float, default=5.0, help='Duration of each run')
+    parser.add_argument('--port', type=int, default=5101, help='First port for the servers started here')
+    parser.add_argument('--flask-url', help='Benchmark an already running Flask server instead of starting one')
+    parser.add_argument('--asgi-url', help='Benchmark an already running ASGI server instead of starting one')
+    parser.add_argument('--startup-timeout', type=float, default=120.0)
+    args = parser.parse_args()
+
+    if args.payload:
+        body = Path(args.payload).read_bytes()
+    else:
+        body = json.dumps({'model': 'heart', 'data': HEART_SAMPLE}).encode('utf-8')
+
+    for offset, mode in enumerate(args.modes):
+        url = getattr(args, f"{mode}_url")
+        server = None
+        if url is None:
+            if mode == 'asgi':
+                try:
+                    import uvicorn  # noqa: F401
+                except ImportError:
+                    print('[bench][SKIP] asgi: uvicorn is not installed')
+                    continue
+            port = args.port + offset
+            url = f"http://127.0.0.1:{port}"
+            env = dict(os.environ, ML_PORT=str(port))
+            server = subprocess.Popen(server_command(mode, port), cwd=BASE_DIR, env=env,
+                                      stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            if not wait_for_health(url, args.startup_timeout):
+                print(f"[bench][SKIP] {mode}: {url}/health did not respond")
+                continue
+            hammer(url, args.path, body, 1, 0.5)  # warm up
+            for clients in args.clients:
+                result = hammer(url, args.path, body, clients, args.seconds)
+                print(f"[bench] {mode:<5} {clients:>4} clients: {result['rps']:>9,.0f} req/s | "
+                      f"p50 {result['p50_ms']:8.2f} ms | p99 {result['p99_ms']:8.2f} ms | "
+                      f"429 {result['rejected']:>6} | errors {result['errors']:>4}")
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait(timeout=30)
+
+
+if __name__ == '__main__':
+    main()
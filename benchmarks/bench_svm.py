@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Benchmark: scikit-learn SVC vs its precomputed serving form (ML/svm_engine.py)
+for the SVM in the common disease artifact and any SVC .sav models.
+For each number of expansion vectors (0: every support vector, exact decision
+values) it reports label agreement with the SVC, accuracy on the bundled
+dataset and its change, the largest probability difference, and latency per
+batch size. Rows for the common model are the symptom pivot plus
+patient-like subsets of each row, scaled as the SVM was trained.
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+os.environ.setdefault('ML_EAGER_WARMUP', '0')
+os.environ.setdefault('ML_MODEL_WATCH', '0')
+
+import ml_service  # noqa: E402
+from ML.datasets import load_model_dataset  # noqa: E402
+from ML.pivot import load_pivot  # noqa: E402
+from ML.selection import augment_symptom_subsets  # noqa: E402
+from ML.svm_engine import COUPLINGS, ApproximateSVC, is_svm_model  # noqa: E402
+
+
+def svm_models(keys):
+    """(name, estimator, rows, labels) for every SVC among the model keys"""
+    models = []
+    for model_key in keys:
+        try:
+            model = ml_service.read_model_artifact(ml_service.model_artifact_path(model_key))
+        except Exception as e:
+            print(f"[bench][SKIP] {model_key}: {e}")
+            continue
+        if isinstance(model, dict):
+            if not is_svm_model(model.get('svm_model')):
+                continue
+            pivot = load_pivot()
+            rows, labels = augment_symptom_subsets(pivot.matrix(), np.asarray(pivot.diseases, dtype=object), copies=4)
+            models.append((f"{model_key}/svm_model", model['svm_model'], model['scaler'].transform(rows.toarray()),
+                           labels))
+        elif is_svm_model(model):
+            try:
+                rows, labels, _ = load_model_dataset(model_key)
+            except (FileNotFoundError, ValueError) as e:
+                print(f"[bench][SKIP] {model_key}: {e}")
+                continue
+            models.append((model_key, model, rows.astype(np.float64), labels))
+    return models
+
+
+def seconds_per_call(predict, rows, batch_size, min_seconds):
+    """Best-effort steady-state latency of one call at a batch size"""
+    batches = [rows[i:i + batch_size] for i in range(0, len(rows) - batch_size + 1, batch_size)]
+    predict(batches[0])  # warm up
+    calls, start = 0, time.perf_counter()
+    while time.perf_counter() - start < min_seconds:
+        for batch in batches:
+            predict(batch)
+            calls += 1
+    return (time.perf_counter() - start) / calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare exact SVC inference with its precomputed serving form')
+    parser.add_argument('--models', nargs='+', help='Model keys (default: all in MODEL_PATHS)')
+    parser.add_argument('--model-file', action='append', default=[], metavar='KEY=PATH',
+                        help='Load a model key from another artifact (repeatable)')
+    parser.add_argument('--components', nargs='+', type=int, default=[0, 256, 128, 64],
+                        help='Expansion vectors to try (0: every support vector)')
+    parser.add_argument('--coupling', choices=COUPLINGS, default='average',
+                        help='How multiclass pairwise probabilities are combined')
+    parser.add_argument('--batch-sizes', nargs='+', type=int, default=[1, 8, 32, 256])
+    parser.add_argument('--seconds', type=float, default=1.0, help='Minimum timing window per measurement')
+    args = parser.parse_args()
+
+    for override in args.model_file:
+        model_key, _, path = override.partition('=')
+        ml_service.MODEL_PATHS[model_key] = Path(path)
+
+    for name, estimator, rows, labels in svm_models(args.models or list(ml_service.MODEL_PATHS)):
+        n_support = len(estimator.support_vectors_)
+        print(f"[bench] {name}: {estimator.kernel} kernel, {len(estimator.classes_)} classes, "
+              f"{n_support} support vectors, {len(rows)} rows")
+        exact_labels = estimator.predict(rows)
+        exact_accuracy = float(np.mean(exact_labels == labels))
+        has_probabilities = hasattr(estimator, 'predict_proba')
+        reference = estimator.predict_proba if has_probabilities else estimator.predict
+        tiled = np.tile(rows, (max(1, -(-max(args.batch_sizes) // len(rows))), 1))
+        sklearn_seconds = {batch_size: seconds_per_call(reference, tiled, batch_size, args.seconds)
+                           for batch_size in args.batch_sizes}
+
+        # Linear kernels always collapse to exact primal weights
+        candidates = [n_support] if estimator.kernel == 'linear' else args.components
+        for components in sorted({min(c, n_support) if c > 0 else n_support for c in candidates}, reverse=True):
+            started = time.perf_counter()
+            approximation = ApproximateSVC(estimator, n_components=components, coupling=args.coupling)
+            build_seconds = time.perf_counter() - started
+            approx_labels = approximation.predict(rows)
+            accuracy = float(np.mean(approx_labels == labels))
+            line = (f"[bench]   {components:>5} vectors{' (exact)' if approximation.exact else ''}: "
+                    f"built in {build_seconds:.2f}s | agreement {np.mean(approx_labels == exact_labels):.4f} | "
+                    f"accuracy {accuracy:.4f} ({accuracy - exact_accuracy:+.4f})")
+            if has_probabilities:
+                error = np.abs(approximation.predict_proba(rows) - estimator.predict_proba(rows)).max()
+                line += f" | max probability error {error:.2e}"
+            print(line)
+
+            candidate = approximation.predict_proba if has_probabilities else approximation.predict
+            for batch_size in args.batch_sizes:
+                approx_seconds = seconds_per_call(candidate, tiled, batch_size, args.seconds)
+                print(f"[bench]     batch {batch_size:>5}: sklearn {sklearn_seconds[batch_size] * 1000:8.2f} ms | "
+                      f"approx {approx_seconds * 1000:8.2f} ms | "
+                      f"speedup {sklearn_seconds[batch_size] / approx_seconds:5.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Benchmark: scikit-learn vs the flattened tree engine (ML/tree_engine.py) for
+the tree models in the common disease artifact and any tree .sav models.
+Rows are the bundled symptom pivot plus patient-like subsets of each row.
+Parity is checked over every row with the engine forced on for all of them.
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+os.environ.setdefault('ML_EAGER_WARMUP', '0')
+os.environ.setdefault('ML_MODEL_WATCH', '0')
+
+import ml_service  # noqa: E402
+from ML.datasets import load_model_dataset  # noqa: E402
+from ML.pivot import load_pivot  # noqa: E402
+from ML.selection import augment_symptom_subsets  # noqa: E402
+from ML.tree_engine import FlatTreeEnsemble, is_tree_model  # noqa: E402
+
+COMMON_MODELS = ['ensemble_model', 'rf_model', 'gb_model', 'dt_model']
+
+
+def tree_models(keys):
+    """(name, estimator, rows) for every tree model among the model keys"""
+    models = []
+    for model_key in keys:
+        try:
+            model = ml_service.read_model_artifact(ml_service.model_artifact_path(model_key))
+        except Exception as e:
+            print(f"[bench][SKIP] {model_key}: {e}")
+            continue
+        if isinstance(model, dict):
+            pivot = load_pivot()
+            rows, _ = augment_symptom_subsets(pivot.matrix(), np.asarray(pivot.diseases, dtype=object), copies=4)
+            rows = rows.toarray().astype(np.float32)
+            models += [(f"{model_key}/{name}", model[name], rows) for name in COMMON_MODELS
+                       if is_tree_model(model.get(name))]
+        elif is_tree_model(model):
+            try:
+                rows, _, _ = load_model_dataset(model_key)
+            except (FileNotFoundError, ValueError) as e:
+                print(f"[bench][SKIP] {model_key}: {e}")
+                continue
+            models.append((model_key, model, rows))
+    return models
+
+
+def seconds_per_call(predict, rows, batch_size, min_seconds):
+    """Best-effort steady-state latency of one predict_proba call at a batch size"""
+    batches = [rows[i:i + batch_size] for i in range(0, len(rows) - batch_size + 1, batch_size)]
+    predict(batches[0])  # warm up
+    calls, start = 0, time.perf_counter()
+    while time.perf_counter() - start < min_seconds:
+        for batch in batches:
+            predict(batch)
+            calls += 1
+    return (time.perf_counter() - start) / calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare scikit-learn tree inference with the flattened tree engine')
+    parser.add_argument('--models', nargs='+', help='Model keys (default: all in MODEL_PATHS)')
+    parser.add_argument('--model-file', action='append', default=[], metavar='KEY=PATH',
+                        help='Load a model key from another artifact (repeatable)')
+    parser.add_argument('--batch-sizes', nargs='+', type=int, default=[1, 8, 16, 32, 256])
+    parser.add_argument('--seconds', type=float, default=1.0, help='Minimum timing window per measurement')
+    args = parser.parse_args()
+
+    for override in args.model_file:
+        model_key, _, path = override.partition('=')
+        ml_service.MODEL_PATHS[model_key] = Path(path)
+
+    for name, estimator, rows in tree_models(args.models or list(ml_service.MODEL_PATHS)):
+        started = time.perf_counter()
+        engine = FlatTreeEnsemble(estimator)
+        compile_seconds = time.perf_counter() - started
+
+        forced = engine.unlimited()
+        exact = (np.array_equal(forced.predict_proba(rows), estimator.predict_proba(rows))
+                 and np.array_equal(forced.predict(rows), estimator.predict(rows)))
+        print(f"[bench] {name}: {engine.n_trees} trees, {engine.n_nodes} nodes, compiled in {compile_seconds:.2f}s | "
+              f"parity over {len(rows)} rows {'EXACT' if exact else 'FAILED'}")
+
+        rows = np.tile(rows, (max(1, -(-max(args.batch_sizes) // len(rows))), 1))
+        for batch_size in args.batch_sizes:
+            sklearn_seconds = seconds_per_call(estimator.predict_proba, rows, batch_size, args.seconds)
+            engine_seconds = seconds_per_call(engine.predict_proba, rows, batch_size, args.seconds)
+            path = 'engine' if engine._use_engine(rows[:batch_size]) else 'fallback'
+            print(f"[bench]   batch {batch_size:>5}: sklearn {sklearn_seconds * 1000:8.2f} ms | "
+                  f"{path:<8} {engine_seconds * 1000:8.2f} ms | speedup {sklearn_seconds / engine_seconds:5.1f}x")
+
+
+if __name__ == '__main__':
+    main()
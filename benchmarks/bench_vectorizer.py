@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: per-request symptom vectorization cost for the common model,
+comparing the old list.index() loop with SymptomVectorizer
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+from ML.vectorizer import SymptomVectorizer  # noqa: E402
+
+PIVOT_CSV = BASE_DIR / 'Datasets' / 'common Pivoted.csv'
+
+
+def load_feature_cols():
+    columns = pd.read_csv(PIVOT_CSV, nrows=0).columns
+    return [col for col in columns if col not in ('Source', 'Unnamed: 0')]
+
+
+def vectorize_with_index(feature_cols, symptoms):
+    """The original per-request loop from prepare_input / predict_disease"""
+    input_vector = [0] * len(feature_cols)
+    for symptom in symptoms:
+        if symptom in feature_cols:
+            input_vector[feature_cols.index(symptom)] = 1
+    return np.array([input_vector])
+
+
+def time_per_call(fn, requests, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for symptoms in requests:
+            fn(symptoms)
+        best = min(best, time.perf_counter() - start)
+    return best / len(requests)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark symptom vectorization')
+    parser.add_argument('--requests', type=int, default=2000, help='Number of symptom sets')
+    parser.add_argument('--symptoms', type=int, default=6, help='Symptoms per request')
+    parser.add_argument('--repeat', type=int, default=5, help='Timing repeats (best is reported)')
+    args = parser.parse_args()
+
+    feature_cols = load_feature_cols()
+    rng = random.Random(42)
+    requests = [rng.sample(feature_cols, args.symptoms) for _ in range(args.requests)]
+
+    start = time.perf_counter()
+    vectorizer = SymptomVectorizer(feature_cols)
+    build_us = (time.perf_counter() - start) * 1e6
+
+    row = np.zeros((1, len(feature_cols)), dtype=np.float32)
+    timings = {
+        'list.index loop': time_per_call(lambda s: vectorize_with_index(feature_cols, s), requests, args.repeat),
+        'vectorizer (new row)': time_per_call(vectorizer.transform_one, requests, args.repeat),
+        'vectorizer (reused row)': time_per_call(lambda s: vectorizer.transform_one(s, out=row), requests, args.repeat),
+    }
+
+    batch_start = time.perf_counter()
+    vectorizer.transform(requests)
+    timings['vectorizer batch (dense)'] = (time.perf_counter() - batch_start) / len(requests)
+    batch_start = time.perf_counter()
+    vectorizer.transform(requests, as_sparse=True)
+    timings['vectorizer batch (CSR)'] = (time.perf_counter() - batch_start) / len(requests)
+
+    baseline = timings['list.index loop']
+    print(f"[bench] {len(feature_cols)} features, {args.requests} requests x {args.symptoms} symptoms")
+    print(f"[bench] index build (once per model load): {build_us:.1f} us")
+    for name, seconds in timings.items():
+        print(f"[bench] {name:<26} {seconds * 1e6:8.2f} us/request  ({baseline / seconds:5.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+"""
+Open-loop load generator and soak harness for ml_service.
+
+Sends requests on a fixed schedule at a target rate, whether or not earlier
+ones have finished. Latency is counted from each request's scheduled send
+time, so a saturated server shows up as growing latency, not a lower send
+rate. Payloads are sampled from the bundled datasets: rows of diabetes.csv,
+heart.csv and parkinsons.csv, and symptom subsets of one disease from
+common_clean.csv.
+
+    python benchmarks/loadgen.py --rps 50 100 200 400 --duration 60
+    python benchmarks/loadgen.py --rps 100 --duration 3600 --report-interval 60 \\
+        --server-cmd "python ml_prefork.py --workers 4 --port 5001"
+
+Every report window prints achieved rate, p50/p95/p99/max latency, error
+rate and the server's RSS (the server process plus its children), and the
+run ends with the RSS growth rate, a hint of leaks on long soaks.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import shlex
+import subprocess
+import sys
+import time
+from array import array
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+os.environ.setdefault('ML_EAGER_WARMUP', '0')
+os.environ.setdefault('ML_MODEL_WATCH', '0')
+
+from ML.datasets import DATASETS_DIR, dataset_path  # noqa: E402
+from ml_service import FEATURE_MAPPINGS, SYMPTOM_MODELS  # noqa: E402
+
+EDGES_CSV = DATASETS_DIR / 'common_clean.csv'
+
+
+def feature_name(column):
+    """CSV column -> FEATURE_MAPPINGS name, e.g. 'MDVP:Jitter(%)' -> 'mdvp_jitter_percent'"""
+    name = column.replace('(%)', '_percent').replace('(dB)', '_db')
+    name = re.sub(r'([a-z])([A-Z])', r'\1_\2', name).lower()
+    return re.sub(r'[^a-z0-9]+', '_', name).strip('_')
+
+
+def feature_records(model_key, n_rows=None):
+    """Dataset rows as /predict input records, matched to the service's feature names"""
+    path = dataset_path(model_key)
+    df = pd.read_csv(path, nrows=n_rows)
+    columns = {feature_name(column): column for column in df.columns}
+    missing = [name for name in FEATURE_MAPPINGS[model_key] if name not in columns]
+    if missing:
+        raise ValueError(f"{path.name} has no columns for {missing}")
+    frame = df[[columns[name] for name in FEATURE_MAPPINGS[model_key]]]
+    frame.columns = FEATURE_MAPPINGS[model_key]
+    return frame.to_dict(orient='records')
+
+
+def symptom_sets(rng, count, min_symptoms=2, max_symptoms=6):
+    """Random subsets of one disease's symptoms from the edge list"""
+    edges = pd.read_csv(EDGES_CSV).dropna(subset=['Source', 'Target'])
+    by_disease = [group.tolist() for _, group in edges.groupby('Source')['Target']]
+    sets = []
+    for _ in range(count):
+        symptoms = rng.choice(by_disease)
+        size = min(len(symptoms), rng.randint(min_symptoms, max_symptoms))
+        sets.append({'symptoms': rng.sample(symptoms, size)})
+    return sets
+
+
+class PayloadPool:
+    """Pre-encoded request bodies for each (endpoint, model) pair, sampled at random"""
+
+    def __init__(self, models, mix, batch_size, seed, pool_size=1000):
+        self.rng = random.Random(seed)
+        records = {}
+        for model_key in models:
+            if model_key in SYMPTOM_MODELS:
+                records[model_key] = symptom_sets(self.rng, pool_size)
+            else:
+                records[model_key] = feature_records(model_key)
+        self.bodies = {}
+        for endpoint in mix:
+            for model_key, rows in records.items():
+                if endpoint == 'predict':
+                    bodies = [{'model': model_key, 'data': self.rng.choice(rows)} for _ in range(pool_size)]
+                else:
+                    bodies = [{'model': model_key, 'records': self.rng.choices(rows, k=batch_size)}
+                              for _ in range(max(1, pool_size // batch_size))]
+                self.bodies[endpoint, model_key] = [json.dumps(body).encode('utf-8') for body in bodies]
+        self.keys = list(self.bodies)
+        self.weights = [mix[endpoint] for endpoint, _ in self.keys]
+
+    def sample(self):
+        endpoint, model_key = self.rng.choices(self.keys, weights=self.weights)[0]
+        path = '/predict' if endpoint == 'predict' else f"/predict/{endpoint}"
+        return path, model_key, self.rng.choice(self.bodies[endpoint, model_key])
+
+
+class HttpConnection:
+    """Minimal keep-alive HTTP/1.1 client connection"""
+
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self.reader = self.writer = None
+
+    async def request(self, path, body):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        head = (f"POST {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: keep-alive\r\n\r\n").encode('latin-1')
+        self.writer.write(head + body)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError('Connection closed by server')
+        status = int(status_line.split()[1])
+        length, chunked, close = None, False, status_line.startswith(b'HTTP/1.0')
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            name, value = name.strip().lower(), value.strip().lower()
+            if name == 'content-length':
+                length = int(value)
+            elif name == 'transfer-encoding':
+                chunked = 'chunked' in value
+            elif name == 'connection':
+                close = value == 'close'
+        if chunked:
+            while True:
+                size = int((await self.reader.readline()).split(b';')[0], 16)
+                await self.reader.readexactly(size + 2)
+                if size == 0:
+                    break
+        elif length is not None:
+            await self.reader.readexactly(length)
+        else:
+            await self.reader.read()
+            close = True
+        if close:
+            self.close()
+        return status
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+class Window:
+    """Results of one report interval"""
+
+    def __init__(self):
+        self.latencies = array('d')
+        self.sent = 0
+        self.errors = 0
+        self.dropped = 0
+        self.statuses = {}
+        self.started = time.monotonic()
+
+
+def process_rss_mb(pid):
+    """RSS of a process and all its descendants, in MB"""
+    total, pending = 0, [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f"/proc/{current}/status", encoding='utf-8') as f:
+                total += next(int(line.split()[1]) for line in f if line.startswith('VmRSS:'))
+            with open(f"/proc/{current}/task/{current}/children", encoding='utf-8') as f:
+                pending.extend(int(child) for child in f.read().split())
+        except (OSError, StopIteration):
+            continue
+    return total / 1024
+
+
+class LoadGenerator:
+    def __init__(self, url, payloads, max_connections, max_in_flight, timeout, poisson, seed):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.payloads = payloads
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+        self.poisson = poisson
+        self.rng = random.Random(seed)
+        self.idle = []
+        self.connection_slots = asyncio.Semaphore(max_connections)
+        self.in_flight = 0
+        self.window = Window()
+        self.all_latencies = array('d')
+        self.total_errors = 0
+
+    async def fire(self, scheduled):
+        path, _, body = self.payloads.sample()
+        window = self.window
+        self.in_flight += 1
+        try:
+            async with self.connection_slots:
+                connection = self.idle.pop() if self.idle else HttpConnection(self.host, self.port)
+                try:
+                    status = await asyncio.wait_for(connection.request(path, body), self.timeout)
+                    self.idle.append(connection)
+                except BaseException:
+                    connection.close()
+                    raise
+            error = status >= 400
+        except (OSError, asyncio.TimeoutError, ValueError, asyncio.IncompleteReadError) as e:
+            status, error = type(e).__name__, True
+        finally:
+            self.in_flight -= 1
+        window.statuses[status] = window.statuses.get(status, 0) + 1
+        window.errors += error
+        self.total_errors += error
+        latency = (time.monotonic() - scheduled) * 1000
+        window.latencies.append(latency)
+        self.all_latencies.append(latency)
+
+    async def prime(self):
+        """One unrecorded request per endpoint and model, so lazy model loads stay out of the results"""
+        connection = HttpConnection(self.host, self.port)
+        statuses = {}
+        for endpoint, model_key in self.payloads.keys:
+            path = '/predict' if endpoint == 'predict' else f"/predict/{endpoint}"
+            statuses[endpoint, model_key] = await asyncio.wait_for(
+                connection.request(path, self.payloads.bodies[endpoint, model_key][0]), self.timeout)
+        connection.close()
+        return statuses
+
+    async def run_stage(self, rps, duration, report_interval, server_pid, report):
+        """Send at ``rps`` for ``duration`` seconds, reporting every ``report_interval``"""
+        started = next_send = self.window.started = time.monotonic()
+        next_report = started + report_interval
+        tasks = set()
+        while True:
+            now = time.monotonic()
+            if now >= next_report:
+                report(self.rotate(rps, server_pid))
+                next_report += report_interval
+            if now - started >= duration:
+                break
+            if next_send > now:
+                await asyncio.sleep(min(next_send, next_report) - now)
+                continue
+            if self.in_flight >= self.max_in_flight:
+                # Client-side limit: count it rather than queue without bound
+                self.window.dropped += 1
+            else:
+                task = asyncio.create_task(self.fire(next_send))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                self.window.sent += 1
+            next_send += self.rng.expovariate(rps) if self.poisson else 1 / rps
+        if tasks:
+            await asyncio.wait(tasks, timeout=self.timeout)
+        if self.window.sent or self.window.dropped:
+            report(self.rotate(rps, server_pid))
+
+    def rotate(self, rps, server_pid):
+        window, self.window = self.window, Window()
+        elapsed = max(time.monotonic() - window.started, 1e-9)
+        latencies = np.frombuffer(window.latencies, dtype=np.float64) if len(window.latencies) else np.zeros(1)
+        return {
+            'time': time.time(),
+            'target_rps': rps,
+            'sent_rps': window.sent / elapsed,
+            'completed_rps': len(window.latencies) / elapsed,
+            'p50_ms': float(np.percentile(latencies, 50)),
+            'p95_ms': float(np.percentile(latencies, 95)),
+            'p99_ms': float(np.percentile(latencies, 99)),
+            'max_ms': float(latencies.max()),
+            'error_rate': window.errors / max(len(window.latencies), 1),
+            'dropped': window.dropped,
+            'in_flight': self.in_flight,
+            'statuses': {str(status): count for status, count in window.statuses.items()},
+            'server_rss_mb': process_rss_mb(server_pid) if server_pid else None,
+        }
+
+
+def print_window(row):
+    rss = f" | RSS {row['server_rss_mb']:8.1f} MB" if row['server_rss_mb'] is not None else ''
+    print(f"[load] target {row['target_rps']:7.1f} | sent {row['sent_rps']:7.1f} | done {row['completed_rps']:7.1f} rps"
+          f" | p50 {row['p50_ms']:7.1f} p95 {row['p95_ms']:7.1f} p99 {row['p99_ms']:8.1f} max {row['max_ms']:8.1f} ms"
+          f" | errors {row['error_rate']:6.2%} | dropped {row['dropped']:>5}{rss}", flush=True)
+
+
+def wait_for_health(host, port, timeout):
+    import http.client
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection(host, port, timeout=2)
+            connection.request('GET', '/health')
+            if connection.getresponse().status == 200:
+                return True
+        except OSError:
+            pass
+        time.sleep(0.5)
+    return False
+
+
+def rss_growth(windows):
+    """Least-squares RSS slope in MB/hour over the run"""
+    points = [(row['time'], row['server_rss_mb']) for row in windows if row['server_rss_mb'] is not None]
+    if len(points) < 3:
+        return None
+    times, rss = np.array(points).T
+    return float(np.polyfit(times - times[0], rss, 1)[0] * 3600)
+
+
+async def main_async(args, server_pid):
+    mix = dict((part.split('=')[0], float(part.split('=')[1])) for part in args.mix.split(','))
+    payloads = PayloadPool(args.models, mix, args.batch_size, args.seed)
+    generator = LoadGenerator(args.url, payloads, args.max_connections, args.max_in_flight,
+                              args.timeout, args.arrival == 'poisson', args.seed)
+    try:
+        primed = await generator.prime()
+    except (OSError, asyncio.TimeoutError) as e:
+        sys.exit(f"Cannot reach {args.url}: {e}")
+    for (endpoint, model_key), status in primed.items():
+        if status >= 400:
+            print(f"[load][WARN] {endpoint} {model_key} answered {status} before the run")
+    windows = []
+
+    def report(row):
+        windows.append(row)
+        print_window(row)
+
+    for rps in args.rps:
+        await generator.run_stage(rps, args.duration, args.report_interval, server_pid, report)
+
+    latencies = np.frombuffer(generator.all_latencies, dtype=np.float64)
+    summary = {
+        'requests': int(len(latencies)),
+        'p50_ms': float(np.percentile(latencies, 50)) if len(latencies) else None,
+        'p99_ms': float(np.percentile(latencies, 99)) if len(latencies) else None,
+        'errors': generator.total_errors,
+        'rss_growth_mb_per_hour': rss_growth(windows),
+    }
+    growth = summary['rss_growth_mb_per_hour']
+    print(f"[load] total {summary['requests']} requests | p50 {summary['p50_ms'] or 0:.1f} ms | "
+          f"p99 {summary['p99_ms'] or 0:.1f} ms | errors {summary['errors']}" + (f" | server RSS {growth:+.1f} MB/hour" if growth is not None else ''))
+    if args.output:
+        Path(args.output).write_text(json.dumps({'settings': vars(args), 'windows': windows, 'summary': summary},
+                                                indent=2, default=str) + '\n', encoding='utf-8')
+        print(f"[load] wrote {args.output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Open-loop load generator and soak harness for ml_service')
+    parser.add_argument('--url', default='http://127.0.0.1:5001')
+    parser.add_argument('--rps', nargs='+', type=float, default=[50.0],
+                        help='Target rate; several values run as consecutive stages (to find saturation)')
+    parser.add_argument('--duration', type=float, default=60.0, help='Seconds per stage')
+    parser.add_argument('--report-interval', type=float, default=10.0)
+    parser.add_argument('--models', nargs='+', default=['diabetes', 'heart', 'parkinsons', 'common'])
+    parser.add_argument('--mix', default='predict=0.9,batch=0.1',
+                        help='Endpoint weights: predict (/predict), batch (/predict/batch)')
+    parser.add_argument('--batch-size', type=int, default=16, help='Records per /predict/batch request')
+    parser.add_argument('--arrival', choices=('uniform', 'poisson'), default='poisson')
+    parser.add_argument('--max-connections', type=int, default=256)
+    parser.add_argument('--max-in-flight', type=int, default=10000,
+                        help='Requests beyond this many outstanding are dropped and counted')
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--server-pid', type=int, help='Server process to track RSS of (with its children)')
+    parser.add_argument('--server-cmd', help='Start this server command first, wait for /health and track it')
+    parser.add_argument('--output', help='Write every window and the summary to this JSON file')
+    args = parser.parse_args()
+
+    server, server_pid = None, args.server_pid
+    if args.server_cmd:
+        parts = urlsplit(args.url)
+        server = subprocess.Popen(shlex.split(args.server_cmd), cwd=BASE_DIR,
+                                  env=dict(os.environ, ML_PORT=str(parts.port or 80)),
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        server_pid = server.pid
+        if not wait_for_health(parts.hostname, parts.port or 80, 300):
+            server.terminate()
+            sys.exit(f"{args.server_cmd} did not become healthy")
+    try:
+        asyncio.run(main_async(args, server_pid))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=60)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark suite: data loading, training, inference per model key and
+backend, Flask round trips and memory peaks, written to JSON and compared
+against a stored baseline.
+
+    python benchmarks/suite.py run --output benchmarks/baseline.json
+    python benchmarks/suite.py run --output current.json
+    python benchmarks/suite.py compare benchmarks/baseline.json current.json
+
+Every section runs in its own process, so its peak RSS is its own. Inputs
+are fixed (bundled CSVs, seeded random rows), timings are the best of
+``--repeats`` runs, and nothing touches the network.
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+RESULTS_DIR = BASE_DIR / 'benchmarks' / 'results'
+SECTIONS = ('data_load', 'train', 'inference', 'service')
+# Environment for the service under test: every request takes the same path
+SERVICE_ENV = {'ML_EAGER_WARMUP': '0', 'ML_MODEL_WATCH': '0', 'ML_CACHE': '0', 'ML_MICROBATCH': '0'}
+LFS_POINTER_PREFIX = b'version https://git-lfs'
+
+
+def metric(value, unit, better='lower'):
+    return {'value': round(float(value), 6), 'unit': unit, 'better': better}
+
+
+def is_lfs_pointer(path):
+    with open(path, 'rb') as f:
+        return f.read(len(LFS_POINTER_PREFIX)) == LFS_POINTER_PREFIX
+
+
+def best_of(repeats, fn):
+    """Minimum wall time of ``fn`` over ``repeats`` calls, and its last result"""
+    best, result = float('inf'), None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def bench_data_load(args):
+    import pandas as pd
+
+    metrics, skipped = {}, {}
+    for path in sorted((BASE_DIR / 'Datasets').glob('*.csv')):
+        name = f"data_load/{path.name}"
+        if is_lfs_pointer(path):
+            skipped[name] = 'Git LFS pointer'
+            continue
+        seconds, df = best_of(args.repeats, lambda: pd.read_csv(path, low_memory=False))
+        tracemalloc.start()
+        pd.read_csv(path, low_memory=False)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        metrics[f"{name}/seconds"] = metric(seconds, 's')
+        metrics[f"{name}/rows_per_second"] = metric(len(df) / seconds, 'rows/s', 'higher')
+        metrics[f"{name}/peak_alloc_mb"] = metric(peak / 2**20, 'MB')
+    return metrics, skipped
+
+
+def bench_train(args):
+    sys.path.insert(0, str(BASE_DIR / 'ML'))
+    from common import DiseasePredictionModel
+
+    model = DiseasePredictionModel()
+    started = time.perf_counter()
+    # One process and no CV, so per-estimator times are not contended or noisy
+    model.train_models(n_jobs=1, use_cache=False, cv_folds=0)
+    metrics = {'train/total_seconds': metric(time.perf_counter() - started, 's')}
+    for name, row in model.selection['results'].items():
+        key = name.lower().replace(' ', '_')
+        metrics[f"train/{key}/fit_seconds"] = metric(row['fit_seconds'], 's')
+        metrics[f"train/{key}/train_accuracy"] = metric(row['train_accuracy'], 'ratio', 'higher')
+    return metrics, {}
+
+
+def load_service(args):
+    os.environ.update(SERVICE_ENV)
+    sys.path.insert(0, str(BASE_DIR))
+    import ml_service
+
+    for override in args.model_file:
+        model_key, path = override.split('=', 1)
+        ml_service.MODEL_PATHS[model_key] = Path(path)
+    return ml_service
+
+
+def bench_inference(args):
+    ml_service = load_service(args)
+    from ML.selection import measure_latency
+    from serving.backends import OnnxBackend
+
+    manifest = ml_service.load_onnx_manifest()
+    metrics, skipped = {}, {}
+    for model_key in args.models or list(ml_service.MODEL_PATHS):
+        backends = {}
+        try:
+            backends['sklearn'] = ml_service.build_sklearn_backend(model_key, ml_service.load_model(model_key))
+        except Exception as e:
+            skipped[f"inference/{model_key}/sklearn"] = str(e)
+        if model_key in manifest:
+            entry = manifest[model_key]
+            reference = backends.get('sklearn')
+            try:
+                backends['onnx'] = OnnxBackend(
+                    ml_service.ONNX_DIR / entry['file'],
+                    classes=entry.get('classes', reference.classes if reference else None),
+                    has_probabilities=reference.has_probabilities if reference else True
+                )
+            except Exception as e:
+                skipped[f"inference/{model_key}/onnx"] = str(e)
+
+        for backend_name, backend in backends.items():
+            name = f"inference/{model_key}/{backend_name}"
+            try:
+                n_features = backend.n_features or len(ml_service.FEATURE_MAPPINGS.get(model_key, []))
+                rows = ml_service.parity_sample(model_key, n_features)
+                latency = min((measure_latency(backend.predict, rows, batch_size=args.batch_size)
+                               for _ in range(args.repeats)), key=lambda result: result['batch_ms'])
+            except Exception as e:
+                skipped[name] = str(e)
+                continue
+            metrics[f"{name}/p50_ms"] = metric(latency['p50_ms'], 'ms')
+            metrics[f"{name}/p99_ms"] = metric(latency['p99_ms'], 'ms')
+            metrics[f"{name}/batch_rows_per_second"] = metric(
+                latency['batch_size'] / latency['batch_ms'] * 1000, 'rows/s', 'higher')
+    return metrics, skipped
+
+
+def service_payload(ml_service, model_key):
+    from benchmarks.loadgen import feature_records
+
+    if model_key in ml_service.SYMPTOM_MODELS:
+        return {'symptoms': ml_service.COMMON_SYMPTOMS[:5]}
+    if model_key not in ml_service.FEATURE_MAPPINGS:
+        raise ValueError(f"/predict has no feature mapping for {model_key}")
+    return feature_records(model_key, n_rows=1)[0]
+
+
+def bench_service(args):
+    import numpy as np
+
+    ml_service = load_service(args)
+    client = ml_service.app.test_client()
+    metrics, skipped = {}, {}
+    for model_key in args.models or list(ml_service.MODEL_PATHS):
+        name = f"service/{model_key}"
+        try:
+            body = {'model': model_key, 'data': service_payload(ml_service, model_key)}
+            response = client.post('/predict', json=body)
+            if response.status_code != 200:
+                raise RuntimeError(response.get_json().get('details', response.status_code))
+        except Exception as e:
+            skipped[name] = str(e)
+            continue
+        timings = []
+        for _ in range(args.requests):
+            started = time.perf_counter()
+            client.post('/predict', json=body)
+            timings.append(time.perf_counter() - started)
+        timings = np.array(timings) * 1000
+        metrics[f"{name}/p50_ms"] = metric(np.percentile(timings, 50), 'ms')
+        metrics[f"{name}/p99_ms"] = metric(np.percentile(timings, 99), 'ms')
+        metrics[f"{name}/requests_per_second"] = metric(1000 / timings.mean(), 'req/s', 'higher')
+    return metrics, skipped
+
+
+def run_section(args):
+    runner = {'data_load': bench_data_load, 'train': bench_train,
+              'inference': bench_inference, 'service': bench_service}[args.section]
+    metrics, skipped = runner(args)
+    # ru_maxrss is in KB on Linux
+    metrics[f"{args.section}/peak_rss_mb"] = metric(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 'MB')
+    print(json.dumps({'metrics': metrics, 'skipped': skipped}))
+
+
+def environment():
+    import numpy
+    import sklearn
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=BASE_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': numpy.__version__,
+        'scikit-learn': sklearn.__version__,
+    }
+
+
+def run(args):
+    report = {'environment': environment(), 'settings': {
+        'repeats': args.repeats, 'requests': args.requests, 'batch_size': args.batch_size}, 'metrics': {}, 'skipped': {}}
+    for section in args.sections:
+        command = [sys.executable, __file__, 'section', section, '--repeats', str(args.repeats),
+                   '--requests', str(args.requests), '--batch-size', str(args.batch_size)]
+        command += [f"--model-file={override}" for override in args.model_file]
+        command += ['--models', *args.models] if args.models else []
+        started = time.perf_counter()
+        completed = subprocess.run(command, cwd=BASE_DIR, capture_output=True, text=True)
+        try:
+            result = json.loads(completed.stdout.strip().splitlines()[-1])
+        except (IndexError, ValueError):
+            error = (completed.stderr.strip().splitlines() or ['no output'])[-1]
+            report['skipped'][section] = error
+            print(f"[bench][SKIP] {section}: {error}")
+            continue
+        report['metrics'].update(result['metrics'])
+        report['skipped'].update(result['skipped'])
+        print(f"[bench] {section}: {len(result['metrics'])} metrics, {len(result['skipped'])} skipped "
+              f"in {time.perf_counter() - started:.1f}s")
+        for name, reason in result['skipped'].items():
+            print(f"[bench][SKIP] {name}: {reason}")
+
+    output = Path(args.output) if args.output else \
+        RESULTS_DIR / f"{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2, sort_keys=True) + '\n', encoding='utf-8')
+    print(f"[bench] wrote {output}")
+
+
+def compare(args):
+    """Print every shared metric's change; exit 1 if any got worse by more than the threshold"""
+    baseline = json.loads(Path(args.baseline).read_text(encoding='utf-8'))['metrics']
+    if args.current:
+        current = json.loads(Path(args.current).read_text(encoding='utf-8'))['metrics']
+    else:
+        reports = sorted(RESULTS_DIR.glob('*.json'))
+        if not reports:
+            sys.exit('No results to compare; run the suite first')
+        current = json.loads(reports[-1].read_text(encoding='utf-8'))['metrics']
+
+    regressions = []
+    for name in sorted(set(baseline) & set(current)):
+        before, after = baseline[name]['value'], current[name]['value']
+        if before == 0:
+            continue
+        change = (after - before) / abs(before)
+        worse = change if baseline[name]['better'] == 'lower' else -change
+        flag = ''
+        if worse > args.threshold:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        elif worse < -args.threshold:
+            flag = '  improved'
+        print(f"{name:<60} {before:>12.4f} -> {after:>12.4f} {baseline[name]['unit']:<7} {change:+7.1%}{flag}")
+
+    for name in sorted(set(baseline) - set(current)):
+        print(f"{name:<60} missing from current run")
+    print(f"{len(regressions)} regressions (threshold {args.threshold:.0%})")
+    sys.exit(1 if regressions else 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline performance benchmark suite')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    def add_common(command):
+        command.add_argument('--repeats', type=int, default=5, help='Timed repeats; the best is kept')
+        command.add_argument('--requests', type=int, default=500, help='Flask round trips per model')
+        command.add_argument('--batch-size', type=int, default=256)
+        command.add_argument('--models', nargs='+', help='Model keys (default: all in MODEL_PATHS)')
+        command.add_argument('--model-file', action='append', default=[], metavar='KEY=PATH',
+                             help='Load a model key from another artifact (repeatable)')
+
+    run_parser = commands.add_parser('run', help='Run the suite and write a JSON report')
+    add_common(run_parser)
+    run_parser.add_argument('--sections', nargs='+', choices=SECTIONS, default=list(SECTIONS))
+    run_parser.add_argument('--output', help=f"Report path (default: {RESULTS_DIR.relative_to(BASE_DIR)}/<time>.json)")
+
+    section_parser = commands.add_parser('section', help=argparse.SUPPRESS)
+    section_parser.add_argument('section', choices=SECTIONS)
+    add_common(section_parser)
+
+    compare_parser = commands.add_parser('compare', help='Compare a report against a baseline')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current', nargs='?', help='Report to check (default: the latest in results/)')
+    compare_parser.add_argument('--threshold', type=float, default=0.15,
+                                help='Relative change counted as a regression (default 0.15)')
+
+    args = parser.parse_args()
+    {'run': run, 'section': run_section, 'compare': compare}[args.command](args)
+
+
+if __name__ == '__main__':
+    main()
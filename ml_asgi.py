@@ -0,0 +1,76 @@
+"""
+ASGI entry point for the ML prediction service
+
+Serves the same routes and response schemas as ml_service.py, but accepts
+requests on an event loop and runs inference on a bounded thread pool per
+model, answering 429 when a model's queue is full:
+
+    uvicorn ml_asgi:app --host 0.0.0.0 --port 5001
+"""
+
+import json
+import os
+from urllib.parse import parse_qs
+
+from ml_service import MICROBATCH_ENABLED, MICROBATCH_MAX_SIZE, MODEL_PATHS, app as flask_app
+from serving.asgi import AsgiGateway
+
+# Threads running / requests allowed to wait, per model. Each running request
+# holds its thread while it waits in the micro-batcher, so by default a lane
+# can fill a whole batch; the pool only starts threads as requests need them
+ASGI_WORKERS_PER_MODEL = int(os.environ.get('ML_ASGI_WORKERS_PER_MODEL',
+                                            MICROBATCH_MAX_SIZE if MICROBATCH_ENABLED else 2))
+ASGI_QUEUE_PER_MODEL = int(os.environ.get('ML_ASGI_QUEUE_PER_MODEL', 64))
+# Lane for /screen, which fans out to the models itself, and for everything else
+ASGI_SCREEN_WORKERS = int(os.environ.get('ML_ASGI_SCREEN_WORKERS', 4))
+ASGI_CONTROL_WORKERS = int(os.environ.get('ML_ASGI_CONTROL_WORKERS', 2))
+# Seconds in-flight requests get to finish on shutdown
+ASGI_DRAIN_SECONDS = float(os.environ.get('ML_ASGI_DRAIN_SECONDS', 30))
+
+MODEL_ROUTES = ('/predict', '/predict/batch', '/predict/topk')
+
+def model_lane(model_key):
+    """A model key's own lane, or 'control' for anything that isn't one (the service rejects it)"""
+    return model_key if isinstance(model_key, str) and model_key in MODEL_PATHS else 'control'
+
+def route_hint(method, path, query, headers):
+    """Lane from the URL or headers alone, or None when only the body names the model
+
+    Prediction routes take the lane from ?model= or an X-Model header when
+    the client sends one, so their body is not parsed before Flask parses
+    it. The hint only picks the lane; the service still reads the body.
+    """
+    if path == '/screen':
+        return 'screen'
+    if path == '/predict/stream':
+        return model_lane(parse_qs(query).get('model', ['control'])[0])
+    if method != 'POST' or path not in MODEL_ROUTES:
+        return 'control'
+    model_key = parse_qs(query).get('model', [headers.get('x-model')])[0]
+    return model_lane(model_key) if model_key else None
+
+def route_request(method, path, query, body):
+    """Lane for a request: its model key for prediction routes, else screen/control
+
+    Parses the body, so the gateway runs it off the event loop, and only
+    when route_hint could not pick a lane.
+    """
+    if path == '/predict/stream':
+        return model_lane(parse_qs(query).get('model', ['control'])[0])
+    if path == '/screen':
+        return 'screen'
+    if method == 'POST' and path in MODEL_ROUTES:
+        try:
+            payload = json.loads(body or b'{}')
+        except ValueError:
+            return 'control'
+        default = 'common' if path == '/predict/topk' else 'control'
+        return model_lane(payload.get('model', default)) if isinstance(payload, dict) else 'control'
+    return 'control'
+
+lanes = {model_key: (ASGI_WORKERS_PER_MODEL, ASGI_QUEUE_PER_MODEL) for model_key in MODEL_PATHS}
+lanes['screen'] = (ASGI_SCREEN_WORKERS, ASGI_QUEUE_PER_MODEL)
+lanes['control'] = (ASGI_CONTROL_WORKERS, ASGI_QUEUE_PER_MODEL)
+
+app = AsgiGateway(flask_app, route_request, lanes, default_lane='control', drain_seconds=ASGI_DRAIN_SECONDS,
+                  hint=route_hint)
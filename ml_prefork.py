@@ -0,0 +1,62 @@
+"""
+Pre-fork launcher for the ML prediction service
+
+Loads and warms every model in MODEL_PATHS once in a master process, then
+forks workers that share the loaded estimators copy-on-write, so startup
+time and total memory stay roughly flat as the worker count grows:
+
+    python ml_prefork.py --workers 8 --cpu-affinity
+
+Send SIGHUP to the master for a rolling restart of the workers and SIGTERM
+to stop.
+"""
+
+import argparse
+import logging
+import os
+
+# Models are loaded once by preload() below, in the master, not at import time;
+# the model watcher is a thread, so it is started in each worker after the fork
+MODEL_WATCH = os.environ.get('ML_MODEL_WATCH', '1') == '1'
+os.environ['ML_EAGER_WARMUP'] = '0'
+os.environ['ML_MODEL_WATCH'] = '0'
+
+import ml_service  # noqa: E402
+from serving.prefork import PreforkServer  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+# Worker processes and per-worker CPU pinning
+PREFORK_WORKERS = int(os.environ.get('ML_WORKERS', os.cpu_count() or 1))
+PREFORK_CPU_AFFINITY = os.environ.get('ML_CPU_AFFINITY', '0') == '1'
+# Seconds a stopping worker gets to finish in-flight requests
+PREFORK_GRACEFUL_TIMEOUT = float(os.environ.get('ML_GRACEFUL_TIMEOUT', 30))
+
+def preload():
+    """Load and warm every model before forking"""
+    if ml_service.INFERENCE_BACKEND == 'onnx' and max(ml_service.ONNX_INTRA_OP_THREADS,
+                                                       ml_service.ONNX_INTER_OP_THREADS) > 1:
+        # onnxruntime thread pools started in the master do not exist in forked workers
+        logger.warning('ONNX sessions with more than one thread are not fork-safe; '
+                       'use ML_ONNX_INTRA_OP_THREADS=1 and ML_ONNX_INTER_OP_THREADS=1 with ml_prefork')
+    ml_service.model_registry.warm_all(ml_service.MODEL_PATHS, max_workers=ml_service.WARMUP_WORKERS).join()
+
+def post_fork(slot):
+    if MODEL_WATCH:
+        ml_service.model_watcher.start()
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve ml_service from pre-forked workers sharing loaded models')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=int(os.environ.get('ML_PORT', 5001)))
+    parser.add_argument('--workers', type=int, default=PREFORK_WORKERS)
+    parser.add_argument('--cpu-affinity', action='store_true', default=PREFORK_CPU_AFFINITY,
+                        help='Pin each worker to one CPU')
+    parser.add_argument('--graceful-timeout', type=float, default=PREFORK_GRACEFUL_TIMEOUT)
+    args = parser.parse_args()
+
+    PreforkServer(ml_service.app, args.host, args.port, args.workers, preload=preload, post_fork=post_fork,
+                  cpu_affinity=args.cpu_affinity, graceful_timeout=args.graceful_timeout).run()
+
+if __name__ == '__main__':
+    main()
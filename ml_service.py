@@ -2,16 +2,46 @@
 """
 Lightweight Python microservice for ML predictions
 Fallback service when ONNX integration doesn't work in browser
+
+Each model is served by the first backend that applies and passes its
+parity check against the pickle at load time:
+  1. an in-process engine: the tree engine (ML/tree_engine.py) for tree
+     models, the sparse linear scorer (ML/linear_engine.py) for Naive Bayes
+     and Logistic Regression, or the SVM mode set in ML_SVM_APPROX
+     (ML/svm_engine.py) for SVCs;
+  2. the model's ONNX export, with ML_BACKEND=onnx;
+  3. the pickled estimator itself.
+An engine that serves makes the ONNX session redundant, so it is not built.
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 import pandas as pd
 import numpy as np
-import pickle
+import hashlib
+import json
 import os
 from pathlib import Path
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ML.datasets import load_model_dataset
+from ML.linear_engine import SparseLinearScorer, is_linear_model
+from ML.model_store import artifact_version_file, load_any, resolve_artifact
+from ML.ranking import top_k
+from ML.svm_engine import ApproximateSVC, is_svm_model
+from ML.tree_engine import FlatTreeEnsemble, is_tree_model
+from ML.vectorizer import SymptomVectorizer
+from serving.backends import (ApproximateSVMBackend, LinearScorerBackend, OnnxBackend, SklearnBackend,
+                              TreeEngineBackend, check_parity)
+from serving.batcher import MicroBatcher
+from serving.cache import ResultCache, file_sha256
+from serving.instrumentation import RequestInstrumentation, SlowRequestProfiler, set_model, stage
+from serving.metrics import REGISTRY
+from serving.registry import ModelRegistry
+from serving.watcher import ModelWatcher, stat_signature
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -21,7 +51,7 @@ app = Flask(__name__)
 CORS(app)
 
 # Base directory setup
-BASE_DIR = Path(__file__).resolve().parent.parent
+BASE_DIR = Path(__file__).resolve().parent
 DATASETS_DIR = BASE_DIR / 'Datasets'
 SAV_DIR = DATASETS_DIR / 'sav files'
 PKL_DIR = DATASETS_DIR / 'pkl'
@@ -33,7 +63,99 @@ MODEL_PATHS = {
     'parkinsons': SAV_DIR / 'parkinsons_model.sav',
     'decision_tree': SAV_DIR / 'decision_tree_model.sav',
     'common': PKL_DIR / 'disease_prediction_model.pkl',
+    'common_teacher': PKL_DIR / 'disease_prediction_model.pkl',
+}
+
+# Symptom models served from the common bundle (see ML/common.py) and the model
+# each key serves: 'common' the student distilled from the voting ensemble
+# (ML_COMMON_VARIANT=best: the selected best_model), 'common_teacher' the
+# ensemble itself. 'common' serves best_model instead when the bundle has no
+# student or its recorded top-1 agreement with the teacher is below
+# ML_STUDENT_MIN_AGREEMENT
+COMMON_VARIANT = os.environ.get('ML_COMMON_VARIANT', 'student')
+SYMPTOM_MODELS = {
+    'common': 'student_model' if COMMON_VARIANT == 'student' else 'best_model',
+    'common_teacher': 'ensemble_model',
+}
+STUDENT_MIN_AGREEMENT = float(os.environ.get('ML_STUDENT_MIN_AGREEMENT', 0.95))
+
+# ONNX exports (see ML/export_onnx.py) and backend selection: 'onnx' or 'sklearn'
+ONNX_DIR = BASE_DIR / 'web' / 'models'
+ONNX_MANIFEST = ONNX_DIR / 'models_manifest.json'
+INFERENCE_BACKEND = os.environ.get('ML_BACKEND', 'onnx')
+ONNX_INTRA_OP_THREADS = int(os.environ.get('ML_ONNX_INTRA_OP_THREADS', 1))
+ONNX_INTER_OP_THREADS = int(os.environ.get('ML_ONNX_INTER_OP_THREADS', 1))
+PARITY_SAMPLE_ROWS = 200
+
+# Tree models (decision tree, random forest, gradient boosting, soft voting) run
+# through the flattened tree engine (see ML/tree_engine.py) for batches of up to
+# ML_TREE_ENGINE_MAX_ROWS rows; larger ones use the estimator itself
+TREE_ENGINE = os.environ.get('ML_TREE_ENGINE', '1') == '1'
+TREE_ENGINE_MAX_ROWS = int(os.environ.get('ML_TREE_ENGINE_MAX_ROWS', 32))
+
+# Naive Bayes and Logistic Regression models score from each row's nonzero
+# features with any scaler folded in (see ML/linear_engine.py). Probabilities
+# differ from the pickle's by rounding only, which float32 input makes ~1e-7
+LINEAR_SCORER = os.environ.get('ML_LINEAR_SCORER', '1') == '1'
+LINEAR_SCORER_TOLERANCE = 1e-6
+
+# Opt-in SVM serving per model key (see ML/svm_engine.py), e.g.
+# ML_SVM_APPROX=common,parkinsons=128: a bare key keeps every support vector
+# (exact decision values, libsvm's probability coupling), key=N reduces the
+# model to N expansion vectors. Kept only if at most
+# ML_SVM_APPROX_LABEL_TOLERANCE of the parity sample's labels change and no
+# probability moves by more than ML_SVM_APPROX_PROBABILITY_TOLERANCE
+SVM_APPROX = {
+    key.strip(): int(components) if components.strip() else None
+    for key, _, components in (item.partition('=') for item in os.environ.get('ML_SVM_APPROX', '').split(','))
+    if key.strip()
 }
+SVM_APPROX_LABEL_TOLERANCE = float(os.environ.get('ML_SVM_APPROX_LABEL_TOLERANCE', 0.02))
+SVM_APPROX_PROBABILITY_TOLERANCE = float(os.environ.get('ML_SVM_APPROX_PROBABILITY_TOLERANCE', 0.01))
+
+# Model artifacts: 'auto' prefers a memory-mapped directory artifact next to
+# each pickle (see ML/model_store.py); 'pickle' always unpickles the file
+MODEL_FORMAT = os.environ.get('ML_MODEL_FORMAT', 'auto')
+MODEL_MMAP_MODE = os.environ.get('ML_MODEL_MMAP_MODE', 'c')
+
+# Prediction result cache
+CACHE_ENABLED = os.environ.get('ML_CACHE', '1') == '1'
+CACHE_MAX_ENTRIES = int(os.environ.get('ML_CACHE_MAX_ENTRIES', 10000))
+CACHE_MAX_BYTES = int(os.environ.get('ML_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+CACHE_TTL_SECONDS = float(os.environ.get('ML_CACHE_TTL_SECONDS', 3600))
+
+# Hot reload: poll model files and the ONNX manifest, swapping in changed models
+MODEL_WATCH = os.environ.get('ML_MODEL_WATCH', '1') == '1'
+MODEL_CHECK_INTERVAL = float(os.environ.get('ML_MODEL_CHECK_INTERVAL', 1))
+
+# Startup: load and warm every model in parallel when the app is created
+EAGER_WARMUP = os.environ.get('ML_EAGER_WARMUP', '1') == '1'
+WARMUP_WORKERS = int(os.environ.get('ML_WARMUP_WORKERS', 4))
+# /health stays 503 if any of these fail to load (comma-separated keys);
+# with none listed it is 503 only when every model failed
+REQUIRED_MODELS = [key.strip() for key in os.environ.get('ML_REQUIRED_MODELS', '').split(',') if key.strip()]
+
+# Batch limits
+MAX_BATCH_RECORDS = int(os.environ.get('ML_MAX_BATCH_RECORDS', 10000))
+STREAM_CHUNK_SIZE = int(os.environ.get('ML_STREAM_CHUNK_SIZE', 256))
+
+# Ranked predictions returned by /predict/topk when the request gives no k
+DEFAULT_TOP_K = int(os.environ.get('ML_DEFAULT_TOP_K', 5))
+
+# Threads shared by all /screen requests to run models concurrently
+SCREEN_WORKERS = int(os.environ.get('ML_SCREEN_WORKERS', 8))
+
+# Micro-batching of concurrent /predict requests
+MICROBATCH_ENABLED = os.environ.get('ML_MICROBATCH', '1') == '1'
+MICROBATCH_MAX_SIZE = int(os.environ.get('ML_MICROBATCH_MAX_SIZE', 32))
+MICROBATCH_MAX_WAIT_MS = float(os.environ.get('ML_MICROBATCH_MAX_WAIT_MS', 2))
+
+# Request instrumentation: per-stage timings at /metrics, plus an opt-in profiler
+# that writes sampled stacks of requests slower than ML_PROFILE_SLOW_MS (0 = off)
+REQUEST_METRICS = os.environ.get('ML_REQUEST_METRICS', '1') == '1'
+PROFILE_SLOW_MS = float(os.environ.get('ML_PROFILE_SLOW_MS', 0))
+PROFILE_INTERVAL_MS = float(os.environ.get('ML_PROFILE_INTERVAL_MS', 5))
+PROFILE_DIR = Path(os.environ.get('ML_PROFILE_DIR', BASE_DIR / 'profiles'))
 
 # Feature mappings
 FEATURE_MAPPINGS = {
@@ -154,136 +276,839 @@ COMMON_SYMPTOMS = [
     'wheelchair bound', 'wheezing', 'withdraw', 'worry', 'yellow sputum'
 ]
 
-# Cache for loaded models
-loaded_models = {}
-
-def load_model(model_key):
-    """Load and cache a model"""
-    if model_key in loaded_models:
-        return loaded_models[model_key]
+# Request counts, latency and per-stage histograms for every route
+instrumentation = None
+if REQUEST_METRICS:
+    instrumentation = RequestInstrumentation(
+        profiler=SlowRequestProfiler(PROFILE_SLOW_MS, PROFILE_DIR, PROFILE_INTERVAL_MS) if PROFILE_SLOW_MS > 0 else None
+    )
     
-    model_path = MODEL_PATHS.get(model_key)
-    if not model_path or not model_path.exists():
-        raise FileNotFoundError(f"Model file not found: {model_path}")
+    @app.before_request
+    def begin_request_trace():
+        instrumentation.begin(request.url_rule.rule if request.url_rule else 'unmatched')
     
-    with open(model_path, 'rb') as f:
-        model = pickle.load(f)
+    @app.after_request
+    def end_request_trace(response):
+        if response.is_streamed:
+            # The generator has not run yet; the body ends the trace when it is done
+            response.response = instrumentation.stream(response.response, response.status_code)
+        else:
+            instrumentation.end(response.status_code)
+        return response
     
-    loaded_models[model_key] = model
-    logger.info(f"Loaded model: {model_key}")
-    return model
+    @app.teardown_request
+    def end_failed_request_trace(exc=None):
+        # after_request is skipped when a route raises; no-op otherwise
+        instrumentation.end(500)
 
-def prepare_input(model_key, data):
-    """Prepare input data for model prediction"""
-    if model_key == 'common':
+def label_request(model_key):
+    """Label the current request's metrics with its model; unknown keys share one label"""
+    set_model(model_key if model_key in MODEL_PATHS else 'unknown')
+
+def format_prediction(prediction):
+    """Convert a predicted label into a JSON-serializable value"""
+    return int(prediction) if isinstance(prediction, (int, np.integer)) else str(prediction)
+
+def prepare_batch(model_key, records):
+    """Build one (N, n_features) float32 matrix for a list of input records
+
+    Rows that fail validation stay zero-filled and are reported in the
+    returned errors dict (row index -> message) so callers can skip them.
+    """
+    errors = {}
+    
+    if model_key in SYMPTOM_MODELS:
         # Handle common disease model from DiseasePredictionModel class
-        model_data = loaded_models[model_key]
-        feature_cols = model_data['feature_cols']
-        symptoms = data.get('symptoms', [])
+        vectorizer = model_registry.get(model_key).vectorizer
+        symptom_lists = []
         
-        input_vector = [0] * len(feature_cols)
-        for symptom in symptoms:
-            if symptom in feature_cols:
-                input_vector[feature_cols.index(symptom)] = 1
+        for i, record in enumerate(records):
+            if not isinstance(record, dict):
+                errors[i] = 'Record must be a JSON object'
+                symptoms = []
+            else:
+                symptoms = record.get('symptoms', [])
+                if not isinstance(symptoms, list):
+                    errors[i] = 'symptoms must be a list'
+                    symptoms = []
+                elif not all(isinstance(symptom, str) for symptom in symptoms):
+                    errors[i] = 'symptoms must be a list of strings'
+                    symptoms = []
+            symptom_lists.append(symptoms)
         
-        return np.array([input_vector])
+        return vectorizer.transform(symptom_lists), errors
     
     elif model_key in FEATURE_MAPPINGS:
         # Handle specific disease models
         feature_names = FEATURE_MAPPINGS[model_key]
-        input_vector = []
+        rows = [
+            [record.get(name, 0) for name in feature_names] if isinstance(record, dict) else None
+            for record in records
+        ]
         
-        for feature_name in feature_names:
-            value = data.get(feature_name, 0)
-            input_vector.append(float(value))
+        try:
+            # Fast path: the whole batch converts in one call
+            input_matrix = np.array(rows, dtype=np.float32).reshape(len(rows), len(feature_names))
+            if np.isfinite(input_matrix).all():
+                return input_matrix, errors
+        except (TypeError, ValueError):
+            pass
         
-        return np.array([input_vector])
+        # Slow path: convert row by row so one bad record doesn't fail the batch
+        input_matrix = np.zeros((len(records), len(feature_names)), dtype=np.float32)
+        for i, row in enumerate(rows):
+            if row is None:
+                errors[i] = 'Record must be a JSON object'
+                continue
+            try:
+                values = [float(value) for value in row]
+            except (TypeError, ValueError) as e:
+                errors[i] = f"Invalid feature value: {e}"
+                continue
+            if not np.isfinite(values).all():
+                errors[i] = 'Invalid feature value: must be finite'
+                continue
+            input_matrix[i] = values
+        
+        return input_matrix, errors
     
     else:
         raise ValueError(f"Unknown model: {model_key}")
 
+class InvalidRecord(ValueError):
+    """An input record failed validation (a client error, not a model failure)"""
+
+def prepare_input(model_key, data):
+    """Prepare input data for model prediction"""
+    input_matrix, errors = prepare_batch(model_key, [data])
+    if errors:
+        raise InvalidRecord(errors[0])
+    return input_matrix
+
+def served_estimator(model_key, model):
+    """The bundle entry a symptom key serves, and why it is not the configured one (None if it is)"""
+    name = SYMPTOM_MODELS[model_key]
+    if model.get(name) is None:
+        return 'best_model', f"bundle has no {name}"
+    if name == 'student_model':
+        agreement = (model.get('distillation') or {}).get('top1_agreement')
+        if agreement is None or agreement < STUDENT_MIN_AGREEMENT:
+            return 'best_model', (f"student top-1 agreement {agreement} is below "
+                                  f"ML_STUDENT_MIN_AGREEMENT={STUDENT_MIN_AGREEMENT}")
+    return name, None
+
+def build_sklearn_backend(model_key, model):
+    """Wrap a loaded pickle in the scikit-learn inference backend"""
+    if model_key in SYMPTOM_MODELS:
+        estimator = model[served_estimator(model_key, model)[0]]
+        # SVM and Logistic Regression were trained on scaled features
+        if estimator is model.get('svm_model') or estimator is model.get('lr_model'):
+            return SklearnBackend(estimator, transform=model['scaler'].transform)
+        return SklearnBackend(estimator)
+    return SklearnBackend(model)
+
+def build_tree_engine_backend(model_key, reference, status):
+    """Compile a tree model into the tree engine and check it matches the estimator exactly"""
+    engine = FlatTreeEnsemble(reference.estimator, max_rows=TREE_ENGINE_MAX_ROWS)
+    backend = TreeEngineBackend(engine, transform=reference.transform)
+    
+    # Checked without the batch limits, so every sample row goes through the engine
+    candidate = TreeEngineBackend(engine.unlimited(), transform=reference.transform)
+    status['tree_engine'] = check_parity(reference, candidate, parity_sample(model_key, reference.n_features),
+                                         label_tolerance=0.0, probability_tolerance=0.0)
+    if not status['tree_engine']['passed']:
+        raise ValueError(f"Tree engine parity check failed: {status['tree_engine']}")
+    return backend
+
+def build_linear_backend(model_key, model, reference, status):
+    """Fold a Naive Bayes or Logistic Regression model and its scaler into the
+    sparse linear scorer and check it matches the estimator"""
+    scaler = model['scaler'] if reference.transform is not None else None
+    backend = LinearScorerBackend(SparseLinearScorer(reference.estimator, scaler=scaler))
+    
+    status['linear_scorer'] = check_parity(reference, backend, parity_sample(model_key, reference.n_features),
+                                           label_tolerance=0.0, probability_tolerance=LINEAR_SCORER_TOLERANCE)
+    if not status['linear_scorer']['passed']:
+        raise ValueError(f"Linear scorer parity check failed: {status['linear_scorer']}")
+    return backend
+
+def build_svm_backend(model_key, reference, status):
+    """Precompute an SVC's decision functions (see SVM_APPROX) and measure how far it moves from the exact model"""
+    # 'solve' couples like libsvm, so /predict confidence and /predict/topk keep the SVC's probabilities
+    approximation = ApproximateSVC(reference.estimator, n_components=SVM_APPROX[model_key], coupling='solve')
+    backend = ApproximateSVMBackend(approximation, transform=reference.transform)
+    
+    parity = check_parity(reference, backend, parity_sample(model_key, reference.n_features),
+                          label_tolerance=SVM_APPROX_LABEL_TOLERANCE,
+                          probability_tolerance=SVM_APPROX_PROBABILITY_TOLERANCE)
+    status['svm_approx'] = {'n_components': approximation.n_components, 'exact': approximation.exact, **parity}
+    if not parity['passed']:
+        raise ValueError(f"SVM approximation moved too far from the exact model: {status['svm_approx']}")
+    return backend
+
+def load_onnx_manifest():
+    """Read the ONNX export manifest, keyed by model key"""
+    if not ONNX_MANIFEST.exists():
+        return {}
+    with open(ONNX_MANIFEST, encoding='utf-8') as f:
+        manifest = json.load(f)
+    return {entry['key']: entry for entry in manifest.get('models', [])}
+
+def parity_sample(model_key, n_features):
+    """Rows used to check an ONNX graph against its pickle at startup"""
+    try:
+        sample, _, _ = load_model_dataset(model_key, PARITY_SAMPLE_ROWS)
+        if sample.shape[1] == n_features:
+            return sample
+    except (FileNotFoundError, ValueError):
+        pass
+    rng = np.random.default_rng(0)
+    if model_key in FEATURE_MAPPINGS:
+        return rng.normal(size=(PARITY_SAMPLE_ROWS, n_features)).astype(np.float32)
+    return (rng.random((PARITY_SAMPLE_ROWS, n_features)) < 0.02).astype(np.float32)
+
+def build_onnx_backend(model_key, reference, status):
+    """Load a model's ONNX graph and verify it against the pickled estimator"""
+    entry = load_onnx_manifest().get(model_key)
+    if entry is None:
+        raise FileNotFoundError(f"No ONNX export in manifest for {model_key}")
+    
+    backend = OnnxBackend(
+        ONNX_DIR / entry['file'],
+        classes=entry.get('classes', reference.classes),
+        has_probabilities=reference.has_probabilities,
+        intra_op_threads=ONNX_INTRA_OP_THREADS,
+        inter_op_threads=ONNX_INTER_OP_THREADS
+    )
+    
+    n_features = reference.n_features or backend.n_features
+    status['parity'] = check_parity(reference, backend, parity_sample(model_key, n_features))
+    if not status['parity']['passed']:
+        raise ValueError(f"ONNX parity check failed: {status['parity']}")
+    return backend
+
+class LoadedModel:
+    """A loaded model artifact plus everything derived from it at load time"""
+    
+    def __init__(self, key, model, backend, backend_status, version, signature, vectorizer=None):
+        self.key = key
+        self.model = model
+        self.backend = backend
+        self.backend_status = backend_status
+        self.version = version
+        self.signature = signature
+        self.vectorizer = vectorizer
+
+def model_artifact_path(model_key):
+    """Path to load for a model: its directory artifact when present, else the pickle"""
+    model_path = MODEL_PATHS.get(model_key)
+    if not model_path:
+        raise FileNotFoundError(f"Model file not found: {model_path}")
+    return resolve_artifact(model_path, prefer_directory=MODEL_FORMAT == 'auto')
+
+def read_model_artifact(model_path):
+    """Load a pickle, or a directory artifact with its arrays memory-mapped"""
+    if not model_path.exists():
+        raise FileNotFoundError(f"Model file not found: {model_path}")
+    return load_any(model_path, mmap_mode=MODEL_MMAP_MODE)
+
+# Files hashed and artifacts read, by path, so keys served from one file
+# ('common' and 'common_teacher') hash it once per change and share one copy
+_shared_lock = threading.Lock()
+_file_hashes = {}
+_shared_artifacts = {}
+_artifact_locks = {}
+
+def cached_file_sha256(path):
+    """file_sha256, recomputed only when the file's mtime or size moved"""
+    signature = stat_signature([path])
+    with _shared_lock:
+        cached = _file_hashes.get(path)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+    digest = file_sha256(path)
+    with _shared_lock:
+        _file_hashes[path] = (signature, digest)
+    return digest
+
+def read_shared_artifact(model_path):
+    """read_model_artifact, returning the copy already loaded while the file's content is unchanged"""
+    with _shared_lock:
+        lock = _artifact_locks.setdefault(model_path, threading.Lock())
+    with lock:
+        digest = cached_file_sha256(artifact_version_file(model_path))
+        cached = _shared_artifacts.get(model_path)
+        if cached is not None and cached[0] == digest:
+            return cached[1]
+        model = read_model_artifact(model_path)
+        # Only the newest version is kept here; older ones live as long as their entries
+        _shared_artifacts[model_path] = (digest, model)
+        return model
+
+def model_source_files(model_key):
+    """Files a loaded model is built from: its artifact plus, with ONNX, the manifest and graph"""
+    files = [artifact_version_file(model_artifact_path(model_key))]
+    if INFERENCE_BACKEND == 'onnx' and ONNX_MANIFEST.exists():
+        files.append(ONNX_MANIFEST)
+        entry = load_onnx_manifest().get(model_key)
+        if entry is not None:
+            files.append(ONNX_DIR / entry['file'])
+    return files
+
+def compute_model_version(model_key):
+    """Content hash of a model's artifact, ONNX graph and its manifest entry"""
+    digest = hashlib.sha256()
+    for path in model_source_files(model_key):
+        if path == ONNX_MANIFEST:
+            entry = load_onnx_manifest().get(model_key)
+            digest.update(json.dumps(entry, sort_keys=True).encode('utf-8'))
+        elif path.exists():
+            digest.update(cached_file_sha256(path).encode('ascii'))
+    return digest.hexdigest()[:16]
+
+def load_model_entry(model_key):
+    """Load a model and build its inference backend and symptom index"""
+    model_path = model_artifact_path(model_key)
+    # Stat before hashing and hashing before reading, so a file replaced
+    # mid-load shows up as a change on the watcher's next poll
+    signature = stat_signature(model_source_files(model_key))
+    version = compute_model_version(model_key)
+    model = read_shared_artifact(model_path)
+    
+    # An engine that matches the pickle, else ONNX when available and verified,
+    # else the pickle itself (see the module docstring)
+    backend = build_sklearn_backend(model_key, model)
+    status = {'backend': backend.name, 'parity': None, 'fallback_reason': None, 'tree_engine': None,
+              'linear_scorer': None, 'svm_approx': None}
+    if model_key in SYMPTOM_MODELS:
+        status['estimator'], status['estimator_reason'] = served_estimator(model_key, model)
+        if status['estimator_reason']:
+            logger.warning(f"Serving {status['estimator']} for {model_key}: {status['estimator_reason']}")
+    if TREE_ENGINE and is_tree_model(backend.estimator):
+        try:
+            backend = build_tree_engine_backend(model_key, backend, status)
+            status['backend'] = backend.name
+        except Exception as e:
+            logger.warning(f"Using scikit-learn trees for {model_key}: {e}")
+    elif LINEAR_SCORER and is_linear_model(backend.estimator):
+        try:
+            backend = build_linear_backend(model_key, model, backend, status)
+            status['backend'] = backend.name
+        except Exception as e:
+            logger.warning(f"Using the scikit-learn model for {model_key}: {e}")
+    elif model_key in SVM_APPROX and is_svm_model(backend.estimator):
+        try:
+            backend = build_svm_backend(model_key, backend, status)
+            status['backend'] = backend.name
+        except Exception as e:
+            logger.warning(f"Using the exact SVM for {model_key}: {e}")
+    if INFERENCE_BACKEND == 'onnx' and backend.name == SklearnBackend.name:
+        try:
+            backend = build_onnx_backend(model_key, backend, status)
+            status['backend'] = backend.name
+        except Exception as e:
+            status['fallback_reason'] = str(e)
+            logger.warning(f"Using pickle backend for {model_key}: {e}")
+    
+    vectorizer = SymptomVectorizer(model['feature_cols']) if model_key in SYMPTOM_MODELS else None
+    
+    logger.info(f"Loaded model: {model_key} from {model_path.name} (backend: {backend.name}, version {version})")
+    return LoadedModel(model_key, model, backend, status, version, signature, vectorizer)
+
+def warmup_model(model_key, entry):
+    """Run one dummy inference so the first real request skips lazy setup"""
+    n_features = entry.backend.n_features or len(FEATURE_MAPPINGS.get(model_key, []))
+    if n_features:
+        entry.backend.predict(np.zeros((1, n_features), dtype=np.float32))
+
+# Loaded models; per-key locks make concurrent first requests load only once
+model_registry = ModelRegistry(load_model_entry, warmup=warmup_model)
+
+def load_model(model_key):
+    """Load and cache a model"""
+    return model_registry.get(model_key).model
+
+def get_backend(model_key):
+    """Return the inference backend for a model, loading it on first use"""
+    return model_registry.get(model_key).backend
+
+# Results of recent predictions, keyed on model version and input vector
+result_cache = ResultCache(
+    max_entries=CACHE_MAX_ENTRIES,
+    max_bytes=CACHE_MAX_BYTES,
+    ttl_seconds=CACHE_TTL_SECONDS
+)
+
+def model_version(model_key):
+    """Version hash of the model currently serving a key"""
+    return model_registry.get(model_key).version
+
+def on_model_reload(model_key, old_entry, new_entry):
+    """Drop results cached for the replaced version so nothing keeps it alive"""
+    result_cache.invalidate(model_key)
+
+# Hot-swaps loaded models when their files change; started by create_app()
+model_watcher = ModelWatcher(model_registry, model_source_files, compute_model_version,
+                             interval=MODEL_CHECK_INTERVAL, on_reload=on_model_reload)
+
+def predict_rows(model_key, input_matrix):
+    """Run a single vectorized inference pass and return one result per row
+
+    Labels come from the same pass as the class probabilities where the
+    model supports them, so each batch needs only one call into the backend.
+    """
+    if len(input_matrix) == 0:
+        return []
+    
+    # One registry lookup per pass, so every row reports the version that scored it
+    entry = model_registry.get(model_key)
+    labels, probabilities = entry.backend.predict(input_matrix)
+    
+    if probabilities is not None:
+        confidences = probabilities.max(axis=1)
+        return [
+            {
+                'prediction': format_prediction(label),
+                'probabilities': row.tolist(),
+                'confidence': float(confidence),
+                'model_version': entry.version
+            }
+            for label, row, confidence in zip(labels, probabilities, confidences)
+        ]
+    
+    return [
+        {'prediction': format_prediction(label), 'probabilities': None, 'confidence': None,
+         'model_version': entry.version}
+        for label in labels
+    ]
+
+# One micro-batcher per model key, created on first use
+batchers = {}
+batchers_lock = threading.Lock()
+
+def get_batcher(model_key):
+    """Return the micro-batcher that serves single-row requests for a model"""
+    with batchers_lock:
+        batcher = batchers.get(model_key)
+        if batcher is None:
+            batcher = batchers[model_key] = MicroBatcher(
+                model_key,
+                lambda input_matrix: predict_rows(model_key, input_matrix),
+                max_batch_size=MICROBATCH_MAX_SIZE,
+                max_wait_ms=MICROBATCH_MAX_WAIT_MS
+            )
+        return batcher
+
+def predict_rows_cached(model_key, input_matrix):
+    """predict_rows with the result cache in front; only misses reach the model"""
+    if not CACHE_ENABLED:
+        return predict_rows(model_key, input_matrix)
+    
+    version = model_version(model_key)
+    results = [result_cache.get(model_key, version, row) for row in input_matrix]
+    misses = [i for i, result in enumerate(results) if result is None]
+    
+    if misses:
+        for i, result in zip(misses, predict_rows(model_key, input_matrix[misses])):
+            result_cache.put(model_key, version, input_matrix[i], result)
+            results[i] = result
+    
+    return results
+
+def score_records(model_key, records, offset=0):
+    """Score a list of records and return per-record results or errors"""
+    with stage('prepare'):
+        input_matrix, errors = prepare_batch(model_key, records)
+    valid_rows = [i for i in range(len(records)) if i not in errors]
+    
+    if errors:
+        input_matrix = input_matrix[valid_rows]
+    
+    with stage('inference'):
+        scored = predict_rows_cached(model_key, input_matrix)
+    
+    results = [None] * len(records)
+    for i, result in zip(valid_rows, scored):
+        results[i] = {'index': offset + i, **result}
+    for i, message in errors.items():
+        results[i] = {'index': offset + i, 'error': message}
+    
+    return results
+
+def predict_one(model_key, input_data):
+    """Score one record through the result cache and the micro-batcher"""
+    # Load model
+    load_model(model_key)
+    
+    # Prepare input
+    with stage('prepare'):
+        input_array = prepare_input(model_key, input_data)
+    
+    # Repeated inputs are answered from the cache without touching the model
+    with stage('cache'):
+        version = model_version(model_key) if CACHE_ENABLED else None
+        result = result_cache.get(model_key, version, input_array[0]) if CACHE_ENABLED else None
+    
+    # Make prediction, coalescing with concurrent requests when enabled
+    if result is None:
+        with stage('inference'):
+            if MICROBATCH_ENABLED:
+                result = get_batcher(model_key).predict(input_array[0])
+            else:
+                result = predict_rows(model_key, input_array)[0]
+        if CACHE_ENABLED:
+            result_cache.put(model_key, version, input_array[0], result)
+    
+    return result
+
+# Shared pool for /screen; inference releases the GIL, so models run in parallel
+screen_pool = ThreadPoolExecutor(max_workers=SCREEN_WORKERS, thread_name_prefix='screen')
+
+def screening_plan(patient, requested=None):
+    """Split models into those the patient payload can feed and those it can't
+
+    A FEATURE_MAPPINGS model applies when every one of its features is
+    present; a symptom model ('common' unless requested) applies when the
+    payload has a symptoms list.
+    """
+    applicable, skipped = [], {}
+    for model_key in requested or [*FEATURE_MAPPINGS, 'common']:
+        if model_key in SYMPTOM_MODELS:
+            if isinstance(patient.get('symptoms'), list) and model_key in MODEL_PATHS:
+                applicable.append(model_key)
+            else:
+                skipped[model_key] = ['symptoms']
+        elif model_key in FEATURE_MAPPINGS:
+            missing = [name for name in FEATURE_MAPPINGS[model_key] if patient.get(name) is None]
+            if missing:
+                skipped[model_key] = missing
+            else:
+                applicable.append(model_key)
+        else:
+            skipped[model_key] = ['unknown model']
+    return applicable, skipped
+
+def timed_predict(model_key, patient):
+    started = time.perf_counter()
+    try:
+        return predict_one(model_key, patient), None, time.perf_counter() - started
+    except Exception as e:
+        return None, str(e), time.perf_counter() - started
+
+@app.route('/screen', methods=['POST'])
+def screen():
+    """Run every model a combined patient profile applies to, concurrently
+
+    Body: {"data": {...all known features and/or symptoms...}, "models": [optional keys]}
+    """
+    try:
+        started = time.perf_counter()
+        with stage('parse'):
+            data = request.get_json()
+        
+        if not data:
+            return jsonify({'error': 'No JSON data provided'}), 400
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Request body must be a JSON object'}), 400
+        
+        patient = data.get('data', {})
+        requested = data.get('models')
+        if not isinstance(patient, dict):
+            return jsonify({'error': 'data must be a JSON object'}), 400
+        if requested is not None and not (isinstance(requested, list)
+                                          and all(isinstance(model_key, str) for model_key in requested)):
+            return jsonify({'error': 'models must be a list of model names'}), 400
+        
+        applicable, skipped = screening_plan(patient, requested)
+        futures = {model_key: screen_pool.submit(timed_predict, model_key, patient) for model_key in applicable}
+        
+        results, errors = {}, {}
+        for model_key, future in futures.items():
+            result, error, seconds = future.result()
+            if error is None:
+                results[model_key] = {**result, 'latency_ms': round(seconds * 1000, 3)}
+            else:
+                errors[model_key] = {'error': error, 'latency_ms': round(seconds * 1000, 3)}
+        
+        return jsonify({
+            'results': results,
+            'errors': errors,
+            'skipped': {model_key: {'missing': missing} for model_key, missing in skipped.items()},
+            'latency_ms': round((time.perf_counter() - started) * 1000, 3),
+            'timestamp': pd.Timestamp.now().isoformat()
+        })
+        
+    except Exception as e:
+        logger.error(f"Screening error: {str(e)}")
+        return jsonify({
+            'error': 'Screening failed',
+            'details': str(e)
+        }), 500
+
 @app.route('/predict', methods=['POST'])
 def predict():
     """Main prediction endpoint"""
     try:
-        data = request.get_json()
+        with stage('parse'):
+            data = request.get_json()
         
         if not data:
             return jsonify({'error': 'No JSON data provided'}), 400
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Request body must be a JSON object'}), 400
         
         model_key = data.get('model')
         input_data = data.get('data', {})
         
         if not model_key:
             return jsonify({'error': 'Missing model parameter'}), 400
+        if not isinstance(model_key, str):
+            return jsonify({'error': 'model must be a string'}), 400
+        label_request(model_key)
         
-        # Load model
-        model = load_model(model_key)
+        result = predict_one(model_key, input_data)
         
-        # Prepare input
-        input_array = prepare_input(model_key, input_data)
+        with stage('serialize'):
+            response = jsonify({
+                'model': model_key,
+                **result,
+                'timestamp': pd.Timestamp.now().isoformat()
+            })
         
-        # Make prediction
-        if model_key == 'common':
-            # Handle common disease model
-            prediction = model['best_model'].predict(input_array)[0]
-            
-            # Get probabilities if available
-            try:
-                probabilities = model['best_model'].predict_proba(input_array)[0]
-                confidence = float(np.max(probabilities))
-            except:
-                probabilities = None
-                confidence = None
-                
-        else:
-            # Handle specific disease models
-            prediction = model.predict(input_array)[0]
-            
-            # Get probabilities if available
-            try:
-                probabilities = model.predict_proba(input_array)[0].tolist()
-                confidence = float(np.max(probabilities))
-            except:
-                probabilities = None
-                confidence = None
-        
-        response = {
-            'model': model_key,
-            'prediction': int(prediction) if isinstance(prediction, (int, np.integer)) else str(prediction),
-            'probabilities': probabilities,
-            'confidence': confidence,
-            'timestamp': pd.Timestamp.now().isoformat()
+        return response
+        
+    except InvalidRecord as e:
+        return jsonify({'error': 'Prediction failed', 'details': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Prediction error: {str(e)}")
+        return jsonify({
+            'error': 'Prediction failed',
+            'details': str(e)
+        }), 500
+
+@app.route('/predict/batch', methods=['POST'])
+def predict_batch():
+    """Score many records for one model in a single vectorized call"""
+    try:
+        with stage('parse'):
+            data = request.get_json()
+        
+        if not data:
+            return jsonify({'error': 'No JSON data provided'}), 400
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Request body must be a JSON object'}), 400
+        
+        model_key = data.get('model')
+        records = data.get('records')
+        
+        if not model_key:
+            return jsonify({'error': 'Missing model parameter'}), 400
+        if not isinstance(model_key, str):
+            return jsonify({'error': 'model must be a string'}), 400
+        if not isinstance(records, list):
+            return jsonify({'error': 'records must be a list'}), 400
+        if len(records) > MAX_BATCH_RECORDS:
+            return jsonify({'error': f'Batch too large (max {MAX_BATCH_RECORDS} records)'}), 413
+        label_request(model_key)
+        
+        load_model(model_key)
+        results = score_records(model_key, records)
+        
+        with stage('serialize'):
+            response = jsonify({
+                'model': model_key,
+                'count': len(results),
+                'errors': sum(1 for result in results if 'error' in result),
+                'results': results,
+                'timestamp': pd.Timestamp.now().isoformat()
+            })
+        
+        return response
+        
+    except Exception as e:
+        logger.error(f"Batch prediction error: {str(e)}")
+        return jsonify({
+            'error': 'Batch prediction failed',
+            'details': str(e)
+        }), 500
+
+def rank_records(model_key, records, k, min_probability=0.0):
+    """Top-k classes per record from one vectorized probability pass"""
+    with stage('prepare'):
+        input_matrix, errors = prepare_batch(model_key, records)
+    valid_rows = [i for i in range(len(records)) if i not in errors]
+    
+    results = [None] * len(records)
+    for i, message in errors.items():
+        results[i] = {'index': i, 'error': message}
+    if not valid_rows:
+        return results
+    
+    entry = model_registry.get(model_key)
+    backend = entry.backend
+    if not backend.has_probabilities:
+        raise ValueError(f"Model {model_key} does not provide class probabilities")
+    with stage('inference'):
+        _, probabilities = backend.predict(input_matrix[valid_rows] if errors else input_matrix)
+    classes = backend.classes if backend.classes is not None else np.arange(probabilities.shape[1])
+    
+    with stage('rank'):
+        ranked = top_k(probabilities, k, min_probability)
+    for i, (indices, values) in zip(valid_rows, ranked):
+        results[i] = {
+            'index': i,
+            'predictions': [
+                {'prediction': format_prediction(classes[idx]), 'probability': float(value), 'rank': rank}
+                for rank, (idx, value) in enumerate(zip(indices, values), start=1)
+            ],
+            'model_version': entry.version
         }
+    return results
+
+@app.route('/predict/topk', methods=['POST'])
+def predict_topk():
+    """Ranked top-k predictions (e.g. a differential diagnosis) for one or many records
+
+    Accepts {"model", "data"} for a single record or {"model", "records"}
+    for a batch, plus optional "k" and "min_probability".
+    """
+    try:
+        with stage('parse'):
+            data = request.get_json()
         
-        return jsonify(response)
+        if not data:
+            return jsonify({'error': 'No JSON data provided'}), 400
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Request body must be a JSON object'}), 400
+        
+        model_key = data.get('model', 'common')
+        if not isinstance(model_key, str):
+            return jsonify({'error': 'model must be a string'}), 400
+        label_request(model_key)
+        single = 'records' not in data
+        records = [data.get('data', {})] if single else data.get('records')
+        
+        if not isinstance(records, list):
+            return jsonify({'error': 'records must be a list'}), 400
+        if len(records) > MAX_BATCH_RECORDS:
+            return jsonify({'error': f'Batch too large (max {MAX_BATCH_RECORDS} records)'}), 413
+        try:
+            k = int(data.get('k', DEFAULT_TOP_K))
+            min_probability = float(data.get('min_probability', 0.0))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'k must be an integer and min_probability a number'}), 400
+        if k < 1 or not 0.0 <= min_probability <= 1.0:
+            return jsonify({'error': 'k must be >= 1 and min_probability between 0 and 1'}), 400
+        
+        load_model(model_key)
+        results = rank_records(model_key, records, k, min_probability)
+        
+        response = {'model': model_key, 'k': k, 'min_probability': min_probability}
+        if single:
+            if 'error' in results[0]:
+                return jsonify({'error': 'Prediction failed', 'details': results[0]['error']}), 400
+            response['predictions'] = results[0]['predictions']
+            response['model_version'] = results[0]['model_version']
+        else:
+            response.update(count=len(results), errors=sum(1 for result in results if 'error' in result),
+                            results=results)
+        response['timestamp'] = pd.Timestamp.now().isoformat()
+        
+        with stage('serialize'):
+            return jsonify(response)
         
     except Exception as e:
-        logger.error(f"Prediction error: {str(e)}")
+        logger.error(f"Top-k prediction error: {str(e)}")
         return jsonify({
             'error': 'Prediction failed',
             'details': str(e)
         }), 500
 
+@app.route('/predict/stream', methods=['POST'])
+def predict_stream():
+    """Score a JSON-lines body in chunks and stream JSON-lines results
+
+    The model is passed as ?model=<key>; each request line is one input
+    record and each response line is the matching result.
+    """
+    model_key = request.args.get('model')
+    if not model_key:
+        return jsonify({'error': 'Missing model parameter'}), 400
+    label_request(model_key)
+    
+    try:
+        load_model(model_key)
+    except Exception as e:
+        logger.error(f"Stream prediction error: {str(e)}")
+        return jsonify({'error': 'Prediction failed', 'details': str(e)}), 500
+    
+    def score_chunk(chunk, line_errors, offset):
+        try:
+            results = score_records(model_key, chunk, offset)
+        except Exception as e:
+            # The 200 is already sent, so the chunk's records report the failure themselves
+            logger.error(f"Stream prediction error: {str(e)}")
+            results = [{'index': offset + i, 'error': f"Prediction failed: {e}"} for i in range(len(chunk))]
+        for i, message in line_errors.items():
+            results[i] = {'index': offset + i, 'error': message}
+        return ''.join(json.dumps(result) + '\n' for result in results)
+    
+    def generate():
+        chunk, line_errors, offset = [], {}, 0
+        for line in request.stream:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                chunk.append(json.loads(line))
+            except ValueError as e:
+                line_errors[len(chunk)] = f"Invalid JSON: {e}"
+                chunk.append({})
+            if len(chunk) >= STREAM_CHUNK_SIZE:
+                yield score_chunk(chunk, line_errors, offset)
+                offset += len(chunk)
+                chunk, line_errors = [], {}
+        if chunk:
+            yield score_chunk(chunk, line_errors, offset)
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
 @app.route('/models', methods=['GET'])
 def get_models():
     """Get available models and their information"""
     try:
         available_models = []
         
-        for model_key, model_path in MODEL_PATHS.items():
-            if model_path.exists():
+        for model_key in MODEL_PATHS:
+            if model_artifact_path(model_key).exists():
+                entry = model_registry.peek(model_key)
                 model_info = {
                     'key': model_key,
                     'available': True,
-                    'features': FEATURE_MAPPINGS.get(model_key, COMMON_SYMPTOMS if model_key == 'common' else None)
+                    'features': FEATURE_MAPPINGS.get(model_key, COMMON_SYMPTOMS if model_key in SYMPTOM_MODELS else None),
+                    'status': model_registry.status().get(model_key, {'state': 'pending'}),
+                    'backend': entry.backend_status if entry else None,
+                    'version': entry.version if entry else None
                 }
+                if entry and isinstance(entry.model, dict):
+                    # Cross-validation/latency table saved by ML/common.py
+                    model_info['selection'] = entry.model.get('selection')
+                    # Student/teacher agreement saved by DiseasePredictionModel.distill
+                    model_info['distillation'] = entry.model.get('distillation')
+                    # Bundle version and last incremental update (DiseasePredictionModel.update_models)
+                    model_info['bundle_version'] = entry.model.get('bundle_version')
+                    model_info['last_update'] = entry.model.get('last_update')
                 available_models.append(model_info)
         
         return jsonify({
             'available_models': available_models,
             'endpoints': {
                 'predict': 'POST /predict',
+                'predict_batch': 'POST /predict/batch',
+                'predict_stream': 'POST /predict/stream?model=<key>',
+                'predict_topk': 'POST /predict/topk',
+                'screen': 'POST /screen',
+                'metrics': 'GET /metrics',
                 'models': 'GET /models'
             }
         })
@@ -292,23 +1117,54 @@ def get_models():
         logger.error(f"Error getting models: {str(e)}")
         return jsonify({'error': 'Failed to get models'}), 500
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus text-format metrics"""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/health', methods=['GET'])
 def health_check():
-    """Health check endpoint"""
+    """Health check endpoint with per-model readiness
+
+    Returns 503 while models are still warming up, and after warmup when a
+    required model (ML_REQUIRED_MODELS) or, with none required, every model
+    failed, so load balancers only route to an instance that can serve.
+    """
+    models = model_registry.status()
+    warmed = model_registry.is_ready()
+    failed = [key for key, status in models.items() if status['state'] == 'failed']
+    if REQUIRED_MODELS:
+        unavailable = [key for key in REQUIRED_MODELS if key in failed]
+    else:
+        unavailable = failed if models and len(failed) == len(models) else []
+    ready = warmed and not unavailable
+    
+    if not warmed:
+        status = 'starting'
+    elif unavailable:
+        status = 'unavailable'
+    else:
+        status = 'degraded' if failed else 'healthy'
+    
     return jsonify({
-        'status': 'healthy',
+        'status': status,
+        'ready': ready,
+        'unavailable': unavailable,
+        'models': models,
         'service': 'ML Prediction Service',
         'timestamp': pd.Timestamp.now().isoformat()
-    })
+    }), 200 if ready else 503
+
+def create_app(eager_warmup=EAGER_WARMUP, watch=MODEL_WATCH):
+    """Return the Flask app, loading and warming every model in the background"""
+    if eager_warmup:
+        model_registry.warm_all(MODEL_PATHS, max_workers=WARMUP_WORKERS)
+    if watch:
+        model_watcher.start()
+    return app
+
+# WSGI servers import `app`, so warmup starts at import time rather than on first request
+create_app()
 
 if __name__ == '__main__':
-    # Preload common models for faster response
-    try:
-        for model_key in ['common', 'diabetes', 'heart', 'parkinsons']:
-            if MODEL_PATHS[model_key].exists():
-                load_model(model_key)
-                logger.info(f"Preloaded model: {model_key}")
-    except Exception as e:
-        logger.warning(f"Failed to preload some models: {e}")
-    
-    app.run(host='0.0.0.0', port=5001, debug=False)
+    app.run(host='0.0.0.0', port=int(os.environ.get('ML_PORT', 5001)), debug=False, threaded=True)
@@ -0,0 +1,252 @@
+"""
+ASGI front end for a WSGI app with bounded per-lane executors, 429 backpressure
+and graceful draining
+"""
+
+from __future__ import annotations
+import asyncio
+import io
+import json
+import logging
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Callable
+
+from serving.metrics import REGISTRY, MetricsRegistry
+
+logger = logging.getLogger(__name__)
+
+
+class Lane:
+    """A bounded executor: ``max_workers`` running plus ``max_queue`` waiting requests."""
+
+    def __init__(self, name: str, max_workers: int, max_queue: int):
+        self.name = name
+        self.capacity = max_workers + max_queue
+        self.pending = 0
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"asgi-{name}")
+
+
+class AsgiGateway:
+    """Accepts requests on the event loop and runs the WSGI app on bounded lanes.
+
+    ``route(method, path, query, body)`` names the lane a request belongs to
+    (e.g. its model key); each lane has its own thread pool, so a slow model
+    cannot starve the others. It runs on a routing thread, so parsing a large
+    body does not stall the event loop; an optional ``hint(method, path,
+    query, headers)`` runs on the loop first and skips it when it returns a
+    lane. A request arriving at a full lane gets a 429
+    right away instead of queueing without bound. Response chunks are sent
+    as the app produces them, with at most ``buffer_chunks`` waiting on a
+    slow client. On lifespan shutdown new requests get 503 and in-flight
+    ones are given ``drain_seconds`` to finish.
+    """
+
+    def __init__(self, wsgi_app, route: Callable[[str, str, str, bytes], str], lanes: dict[str, tuple[int, int]],
+                 default_lane: str, drain_seconds: float = 30.0, max_body_bytes: int = 64 << 20,
+                 buffer_chunks: int = 8, hint: Callable[[str, str, str, dict], str | None] | None = None,
+                 metrics: MetricsRegistry = REGISTRY):
+        self.wsgi_app = wsgi_app
+        self.route = route
+        self.hint = hint
+        self._router = ThreadPoolExecutor(max_workers=1, thread_name_prefix='asgi-route')
+        self.lanes = {name: Lane(name, workers, queue) for name, (workers, queue) in lanes.items()}
+        self.default_lane = default_lane
+        self.drain_seconds = drain_seconds
+        self.max_body_bytes = max_body_bytes
+        self.buffer_chunks = buffer_chunks
+        self.draining = False
+        self._in_flight = 0
+        self._idle: asyncio.Event | None = None
+
+        self._in_flight_gauge = metrics.gauge('ml_asgi_in_flight', 'Requests running or queued per lane', ('lane',))
+        self._rejected = metrics.counter('ml_asgi_rejected_total', 'Requests rejected with 429 per lane', ('lane',))
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                self._idle = asyncio.Event()
+                self._idle.set()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.drain()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def drain(self):
+        """Stop taking requests and wait (bounded) for in-flight ones to finish."""
+        self.draining = True
+        if self._idle is not None and self._in_flight:
+            logger.info(f"Draining {self._in_flight} in-flight requests")
+            try:
+                await asyncio.wait_for(self._idle.wait(), self.drain_seconds)
+            except asyncio.TimeoutError:
+                logger.warning(f"Drain timed out with {self._in_flight} requests still running")
+        for lane in self.lanes.values():
+            lane.executor.shutdown(wait=False)
+        self._router.shutdown(wait=False)
+
+    async def _http(self, scope, receive, send):
+        if self.draining:
+            await self._respond(send, 503, {'error': 'Service is shutting down'}, [(b'connection', b'close')])
+            return
+
+        body = bytearray()
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            body += message.get('body', b'')
+            if len(body) > self.max_body_bytes:
+                await self._respond(send, 413, {'error': 'Request body too large'})
+                return
+            if not message.get('more_body'):
+                break
+
+        query = scope.get('query_string', b'').decode('latin-1')
+        try:
+            name = None
+            if self.hint is not None:
+                headers = {raw_name.decode('latin-1').lower(): raw_value.decode('latin-1')
+                           for raw_name, raw_value in scope.get('headers', [])}
+                name = self.hint(scope['method'], scope['path'], query, headers)
+            if name is None:
+                name = await asyncio.get_running_loop().run_in_executor(
+                    self._router, self.route, scope['method'], scope['path'], query, bytes(body))
+            lane = self.lanes.get(name) or self.lanes[self.default_lane]
+        except Exception as e:
+            await self._respond(send, 400, {'error': 'Could not route request', 'details': str(e)})
+            return
+        if lane.pending >= lane.capacity:
+            self._rejected.inc(lane=lane.name)
+            await self._respond(send, 429, {'error': 'Too many requests', 'details': f"{lane.name} queue is full"},
+                                [(b'retry-after', b'1')])
+            return
+
+        lane.pending += 1
+        self._in_flight += 1
+        if self._idle is not None:
+            self._idle.clear()
+        self._in_flight_gauge.set(lane.pending, lane=lane.name)
+        # Bounded, so a slow client pauses the app's iterator instead of buffering its output
+        messages = asyncio.Queue(maxsize=self.buffer_chunks)
+        abandoned = threading.Event()
+        try:
+            environ = self._environ(scope, bytes(body), query)
+            loop = asyncio.get_running_loop()
+            call = loop.run_in_executor(lane.executor, self._call_wsgi, environ, loop, messages, abandoned)
+            try:
+                await self._forward(send, messages, abandoned)
+            except BaseException:
+                # Cancelled: nothing reads the queue any more, so the app stops at its next chunk
+                abandoned.set()
+                raise
+            await call
+        finally:
+            lane.pending -= 1
+            self._in_flight -= 1
+            self._in_flight_gauge.set(lane.pending, lane=lane.name)
+            if self._in_flight == 0 and self._idle is not None:
+                self._idle.set()
+
+    async def _forward(self, send, messages: asyncio.Queue, abandoned: threading.Event):
+        """Send the response messages ``_call_wsgi`` queues until it is done (None)."""
+        while True:
+            message = await messages.get()
+            if message is None:
+                return
+            if abandoned.is_set():
+                continue
+            try:
+                await send(message)
+            except Exception as e:
+                # The client went away; the app stops at its next chunk
+                logger.info(f"Response abandoned: {e}")
+                abandoned.set()
+
+    def _environ(self, scope, body: bytes, query: str) -> dict:
+        server = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('', 0)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+            'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': query,
+            'SERVER_NAME': str(server[0]),
+            'SERVER_PORT': str(server[1]),
+            'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+            'REMOTE_ADDR': str(client[0]),
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        for raw_name, raw_value in scope.get('headers', []):
+            name = raw_name.decode('latin-1').upper().replace('-', '_')
+            value = raw_value.decode('latin-1')
+            if name == 'CONTENT_TYPE':
+                environ['CONTENT_TYPE'] = value
+            elif name != 'CONTENT_LENGTH':
+                key = f"HTTP_{name}"
+                environ[key] = f"{environ[key]},{value}" if key in environ else value
+        return environ
+
+    def _call_wsgi(self, environ: dict, loop, messages: asyncio.Queue, abandoned: threading.Event):
+        """Run the WSGI app on an executor thread, queueing each chunk for the event loop as it is produced."""
+        response = {'started': False}
+
+        def emit(message):
+            queued = asyncio.run_coroutine_threadsafe(messages.put(message), loop)
+            while True:
+                try:
+                    return queued.result(timeout=1.0)
+                except FutureTimeout:
+                    if abandoned.is_set():
+                        queued.cancel()
+                        return
+
+        def write(data):
+            if not response['started']:
+                response['started'] = True
+                emit({'type': 'http.response.start', 'status': response['status'], 'headers': response['headers']})
+            if data:
+                emit({'type': 'http.response.body', 'body': data, 'more_body': True})
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                                   for name, value in headers]
+            return write
+
+        try:
+            result = self.wsgi_app(environ, start_response)
+            try:
+                for chunk in result:
+                    write(chunk)
+                    if abandoned.is_set():
+                        break
+            finally:
+                if hasattr(result, 'close'):
+                    result.close()
+            write(b'')
+            emit({'type': 'http.response.body', 'body': b'', 'more_body': False})
+        finally:
+            emit(None)
+
+    async def _respond(self, send, status: int, payload: dict, extra_headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        headers = [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers + (extra_headers or [])})
+        await send({'type': 'http.response.body', 'body': body})
@@ -0,0 +1,136 @@
+"""
+Inference backends: pickled scikit-learn estimators and ONNX Runtime sessions
+"""
+
+from __future__ import annotations
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+from sklearn.svm import SVC, NuSVC
+
+try:
+    import onnxruntime as ort
+except ImportError:  # optional: the service falls back to the pickled models
+    ort = None
+
+
+class SklearnBackend:
+    """Runs a pickled estimator; ``transform`` is applied to inputs first (e.g. a scaler)."""
+
+    name = 'sklearn'
+    # An SVC's probabilities come from a separate Platt calibration and can
+    # rank a different class first than its decision function does
+    labels_from_probabilities = True
+
+    def __init__(self, estimator, transform: Callable | None = None):
+        self.estimator = estimator
+        self.transform = transform
+        self.has_probabilities = hasattr(estimator, 'predict_proba')
+        self.classes = getattr(estimator, 'classes_', None)
+        self.n_features = getattr(estimator, 'n_features_in_', None)
+        if isinstance(estimator, (SVC, NuSVC)):
+            self.labels_from_probabilities = False
+
+    def predict(self, input_matrix: np.ndarray):
+        """Return ``(labels, probabilities)``; probabilities is None if unsupported."""
+        if self.transform is not None:
+            input_matrix = self.transform(input_matrix)
+        if not self.has_probabilities:
+            return self.estimator.predict(input_matrix), None
+        probabilities = self.estimator.predict_proba(input_matrix)
+        if not self.labels_from_probabilities:
+            return self.estimator.predict(input_matrix), probabilities
+        # One pass: labels are the argmax of the class probabilities
+        return self.classes[np.argmax(probabilities, axis=1)], probabilities
+
+
+class TreeEngineBackend(SklearnBackend):
+    """Runs a tree model compiled by ``ML.tree_engine.FlatTreeEnsemble``."""
+
+    name = 'tree_engine'
+
+
+class LinearScorerBackend(SklearnBackend):
+    """Runs a Naive Bayes or Logistic Regression model through ``ML.linear_engine.SparseLinearScorer``."""
+
+    name = 'linear_scorer'
+
+
+class ApproximateSVMBackend(SklearnBackend):
+    """Runs an SVC through ``ML.svm_engine.ApproximateSVC``."""
+
+    name = 'svm_approx'
+    labels_from_probabilities = False
+
+
+class OnnxBackend:
+    """Runs an exported ONNX graph in a CPU onnxruntime session."""
+
+    name = 'onnx'
+
+    def __init__(self, path: Path, classes=None, has_probabilities: bool = True,
+                 intra_op_threads: int = 1, inter_op_threads: int = 1):
+        if ort is None:
+            raise ImportError('onnxruntime is not installed')
+        if not Path(path).is_file():
+            raise FileNotFoundError(f"ONNX model not found: {path}")
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = inter_op_threads
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(str(path), sess_options=options, providers=['CPUExecutionProvider'])
+
+        model_input = self.session.get_inputs()[0]
+        outputs = self.session.get_outputs()
+        self.input_name = model_input.name
+        self.n_features = model_input.shape[1] if isinstance(model_input.shape[1], int) else None
+        self.label_name = outputs[0].name
+        self.probability_name = outputs[1].name if has_probabilities and len(outputs) > 1 else None
+        self.has_probabilities = self.probability_name is not None
+        self.classes = np.asarray(classes) if classes is not None else None
+        self._output_names = [self.label_name] + ([self.probability_name] if self.probability_name else [])
+
+    def predict(self, input_matrix: np.ndarray):
+        """Return ``(labels, probabilities)``; probabilities is None if unsupported."""
+        input_matrix = np.ascontiguousarray(input_matrix, dtype=np.float32)
+        outputs = self.session.run(self._output_names, {self.input_name: input_matrix})
+        labels = np.asarray(outputs[0])
+        if not self.has_probabilities:
+            return labels, None
+
+        probabilities = outputs[1]
+        if isinstance(probabilities, list):
+            # ZipMap output: one {class: probability} dict per row
+            classes = self.classes if self.classes is not None else sorted(probabilities[0])
+            probabilities = np.array([[row[c] for c in classes] for row in probabilities], dtype=np.float32)
+        return labels, probabilities
+
+
+def check_parity(reference, candidate, sample: np.ndarray,
+                 label_tolerance: float = 0.01, probability_tolerance: float = 1e-3) -> dict:
+    """Compare two backends on the same rows.
+
+    Passes when at most ``label_tolerance`` of the labels differ and the
+    largest absolute probability difference is within ``probability_tolerance``.
+    """
+    reference_labels, reference_probabilities = reference.predict(sample)
+    candidate_labels, candidate_probabilities = candidate.predict(sample)
+
+    label_mismatch = float(np.mean(
+        np.asarray(reference_labels).astype(str) != np.asarray(candidate_labels).astype(str)))
+    max_probability_error = None
+    if reference_probabilities is not None and candidate_probabilities is not None:
+        max_probability_error = float(np.max(np.abs(
+            np.asarray(reference_probabilities, dtype=np.float64) - candidate_probabilities)))
+
+    passed = label_mismatch <= label_tolerance and (
+        max_probability_error is None or max_probability_error <= probability_tolerance)
+    return {
+        'passed': bool(passed),
+        'rows': int(len(sample)),
+        'label_mismatch': label_mismatch,
+        'max_probability_error': max_probability_error,
+    }
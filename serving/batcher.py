@@ -0,0 +1,111 @@
+"""
+In-process micro-batching for single-row inference requests
+"""
+
+from __future__ import annotations
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable
+
+import numpy as np
+
+from serving.metrics import BATCH_SIZE_BUCKETS, REGISTRY, MetricsRegistry
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """Coalesces concurrent single-row requests for one model into batches.
+
+    Callers block in ``predict(row)`` while a background thread collects rows
+    until ``max_batch_size`` is reached or ``max_wait_ms`` has passed since the
+    first queued row, runs ``predict_fn`` once on the stacked matrix and hands
+    each caller its own result. ``predict_fn`` must return one result per row.
+    """
+
+    def __init__(self, name: str, predict_fn: Callable[[np.ndarray], list],
+                 max_batch_size: int = 32, max_wait_ms: float = 2.0,
+                 metrics: MetricsRegistry = REGISTRY):
+        self.name = name
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._closed = threading.Event()
+
+        self._queue_depth = metrics.gauge(
+            'ml_batcher_queue_depth', 'Rows waiting to be batched', ('model',))
+        self._batch_size = metrics.histogram(
+            'ml_batcher_batch_size', 'Rows per flushed batch', ('model',), buckets=BATCH_SIZE_BUCKETS)
+        self._queue_wait = metrics.histogram(
+            'ml_batcher_queue_wait_seconds', 'Time a row waited before its batch ran', ('model',))
+        self._batch_latency = metrics.histogram(
+            'ml_batcher_inference_seconds', 'Inference time per flushed batch', ('model',))
+
+        self._thread = threading.Thread(target=self._run, name=f'batcher-{name}', daemon=True)
+        self._thread.start()
+
+    def submit(self, row: np.ndarray) -> Future:
+        """Queue one feature row and return a future for its result."""
+        if self._closed.is_set():
+            raise RuntimeError(f"Batcher '{self.name}' is closed")
+        future: Future = Future()
+        self._queue_depth.inc(model=self.name)
+        self._queue.put((np.asarray(row).reshape(-1), future, time.perf_counter()))
+        return future
+
+    def predict(self, row: np.ndarray, timeout: float | None = None):
+        return self.submit(row).result(timeout)
+
+    def close(self, timeout: float | None = None):
+        """Stop accepting rows, flush what is queued and stop the worker."""
+        self._closed.set()
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _collect(self, first) -> list:
+        batch = [first]
+        deadline = first[2] + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # Re-queue the sentinel so the run loop exits after this batch
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = self._collect(first)
+            self._queue_depth.dec(len(batch), model=self.name)
+            self._flush(batch)
+
+    def _flush(self, batch: list):
+        started = time.perf_counter()
+        for _, _, queued_at in batch:
+            self._queue_wait.observe(started - queued_at, model=self.name)
+        self._batch_size.observe(len(batch), model=self.name)
+
+        futures = [future for _, future, _ in batch]
+        try:
+            results = self.predict_fn(np.vstack([row for row, _, _ in batch]))
+            for future, result in zip(futures, results):
+                future.set_result(result)
+        except Exception as e:
+            logger.error(f"Batch inference failed for {self.name}: {e}")
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            self._batch_latency.observe(time.perf_counter() - started, model=self.name)
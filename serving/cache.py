@@ -0,0 +1,112 @@
+"""
+LRU/TTL cache of prediction results keyed on canonicalized input vectors
+"""
+
+from __future__ import annotations
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+from serving.metrics import REGISTRY, MetricsRegistry
+
+
+def vector_digest(row: np.ndarray) -> bytes:
+    """Hash of one feature row; binary symptom rows are order-independent by construction."""
+    row = np.ascontiguousarray(row, dtype=np.float32)
+    return hashlib.blake2b(row.tobytes(), digest_size=16).digest()
+
+
+def estimate_size(result: dict) -> int:
+    """Rough in-memory size of a cached result, in bytes."""
+    probabilities = result.get('probabilities') or ()
+    return 256 + 32 * len(probabilities) + len(str(result.get('prediction', '')))
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """Thread-safe LRU cache with a TTL and limits in entries and bytes.
+
+    Keys are ``(model_key, model_version, vector_digest)``; entries of a model
+    are dropped wholesale with ``invalidate(model_key)``.
+    """
+
+    def __init__(self, max_entries: int = 10000, max_bytes: int = 64 << 20, ttl_seconds: float = 3600,
+                 metrics: MetricsRegistry = REGISTRY):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self._hits = metrics.counter('ml_cache_hits_total', 'Prediction cache hits', ('model',))
+        self._misses = metrics.counter('ml_cache_misses_total', 'Prediction cache misses', ('model',))
+        self._evictions = metrics.counter(
+            'ml_cache_evictions_total', 'Prediction cache evictions', ('reason',))
+        self._size = metrics.gauge('ml_cache_entries', 'Entries in the prediction cache')
+        self._size_bytes = metrics.gauge('ml_cache_bytes', 'Estimated bytes held by the prediction cache')
+
+    def get(self, model_key: str, version: str, row: np.ndarray):
+        key = (model_key, version, vector_digest(row))
+        now = time.monotonic()
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None and item[1] <= now:
+                self._remove(key, 'ttl')
+                item = None
+            if item is not None:
+                self._entries.move_to_end(key)
+        if item is None:
+            self._misses.inc(model=model_key)
+            return None
+        self._hits.inc(model=model_key)
+        return item[0]
+
+    def put(self, model_key: str, version: str, row: np.ndarray, result: dict):
+        key = (model_key, version, vector_digest(row))
+        size = estimate_size(result)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key, None)
+            self._entries[key] = (result, time.monotonic() + self.ttl_seconds, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)), 'lru')
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)), 'bytes')
+            self._publish_size()
+
+    def invalidate(self, model_key: str | None = None):
+        """Drop every entry, or only those of one model."""
+        with self._lock:
+            for key in [key for key in self._entries if model_key is None or key[0] == model_key]:
+                self._remove(key, 'invalidated')
+            self._publish_size()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._bytes,
+                    'max_entries': self.max_entries, 'max_bytes': self.max_bytes}
+
+    def _remove(self, key, reason: str | None):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+        if reason:
+            self._evictions.inc(reason=reason)
+
+    def _publish_size(self):
+        self._size.set(len(self._entries))
+        self._size_bytes.set(self._bytes)
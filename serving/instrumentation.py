@@ -0,0 +1,267 @@
+"""
+Per-request stage timings and an opt-in sampling profiler for slow requests
+"""
+
+from __future__ import annotations
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter as StackCounter
+from pathlib import Path
+
+from serving.metrics import REGISTRY, STAGE_BUCKETS, MetricsRegistry
+
+logger = logging.getLogger(__name__)
+
+class _RequestLocal(threading.local):
+    # Class default, so threads outside a request read None without an AttributeError
+    trace = None
+
+
+_local = _RequestLocal()
+
+
+class RequestTrace:
+    """Timings of one request, filled in by ``stage`` blocks on the handling thread."""
+
+    __slots__ = ('endpoint', 'model', 'started', 'stages', 'samples', 'streaming', 'thread')
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.model = ''
+        # Ident of the thread handling the request, the one the profiler samples
+        self.thread = threading.get_ident()
+        self.started = time.perf_counter()
+        self.stages: list[tuple[str, float]] = []
+        self.samples: StackCounter | None = None
+        # Set once the response body is handed to a _TracedStream
+        self.streaming = False
+
+
+class _Stage:
+    __slots__ = ('trace', 'name', 'started')
+
+    def __init__(self, trace: RequestTrace, name: str):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.trace.stages.append((self.name, time.perf_counter() - self.started))
+        return False
+
+
+class _NoStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NO_STAGE = _NoStage()
+
+
+def stage(name: str):
+    """Time a block as ``name`` in the current thread's request; a no-op outside one."""
+    trace = _local.trace
+    return _NO_STAGE if trace is None else _Stage(trace, name)
+
+
+def set_model(model_key: str):
+    """Label the current thread's request with the model it is for."""
+    trace = _local.trace
+    if trace is not None:
+        trace.model = model_key
+
+
+def _folded(frame, thread_name: str) -> str:
+    """One stack in flamegraph.pl's folded format, outermost frame first"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    names.append(thread_name)
+    return ';'.join(reversed(names))
+
+
+class SlowRequestProfiler:
+    """Samples thread stacks while requests run and keeps them for slow ones.
+
+    Every ``interval_ms`` a background thread snapshots, for each in-flight
+    request, the stacks of its handling thread and of the batcher thread
+    for its model (named ``batcher-<model>``), which does its inference. The
+    batcher thread is shared by concurrent requests for the same model;
+    each folded stack starts with its thread's name, so the two can be told
+    apart. Other requests' handlers and idle pool threads are not sampled.
+    A request that
+    takes at least ``threshold_ms`` has its samples written to
+    ``output_dir`` as a ``.folded`` file, ready for ``flamegraph.pl`` or
+    speedscope. Samples per request are capped at ``max_samples``.
+    """
+
+    def __init__(self, threshold_ms: float, output_dir: Path, interval_ms: float = 5.0,
+                 max_samples: int = 20000, metrics: MetricsRegistry = REGISTRY):
+        self.threshold = threshold_ms / 1000.0
+        self.output_dir = Path(output_dir)
+        self.interval = interval_ms / 1000.0
+        self.max_samples = max_samples
+        self._active: dict[int, RequestTrace] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='slow-request-profiler', daemon=True)
+        self._slow = metrics.counter('ml_slow_requests_total', 'Requests profiled for exceeding the threshold',
+                                     ('endpoint', 'model'))
+        self._thread.start()
+
+    def begin(self, trace: RequestTrace):
+        trace.samples = StackCounter()
+        with self._lock:
+            self._active[id(trace)] = trace
+        self._wakeup.set()
+
+    def end(self, trace: RequestTrace, duration: float):
+        with self._lock:
+            self._active.pop(id(trace), None)
+        if duration >= self.threshold and trace.samples:
+            self._slow.inc(endpoint=trace.endpoint, model=trace.model)
+            self._write(trace, duration)
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while True:
+            with self._lock:
+                active = list(self._active.values())
+            if not active:
+                self._wakeup.clear()
+                self._wakeup.wait()
+                continue
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            batchers = {name[len('batcher-'):]: thread_id for thread_id, name in names.items()
+                        if name.startswith('batcher-')}
+            threads = {id(trace): (trace.thread, batchers.get(trace.model)) for trace in active}
+            frames = sys._current_frames()
+            stacks = {thread_id: _folded(frames[thread_id], names.get(thread_id, str(thread_id)))
+                      for thread_ids in threads.values() for thread_id in thread_ids
+                      if thread_id in frames and thread_id != own_id}
+            # Under the lock, so a request that has ended is never written to
+            with self._lock:
+                for trace in self._active.values():
+                    if sum(trace.samples.values()) < self.max_samples:
+                        trace.samples.update(stacks[thread_id] for thread_id in threads.get(id(trace), ())
+                                             if thread_id in stacks)
+            time.sleep(self.interval)
+
+    def _write(self, trace: RequestTrace, duration: float):
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        endpoint = trace.endpoint.strip('/').replace('/', '_') or 'root'
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{endpoint}-{trace.model or 'none'}-{duration * 1000:.0f}ms.folded"
+        path = self.output_dir / name
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in trace.samples.most_common():
+                f.write(f"{stack} {count}\n")
+        logger.info(f"Slow request {trace.endpoint} ({trace.model}) took {duration * 1000:.1f}ms; stacks in {path}")
+
+
+class _TracedStream:
+    """A streamed response body that keeps its request's trace open until it is done.
+
+    The trace is current on the thread while each chunk is produced, so
+    ``stage`` blocks inside the generator are recorded, and the request
+    ends when the body is exhausted or closed, whichever comes first.
+    """
+
+    def __init__(self, instrumentation: RequestInstrumentation, trace: RequestTrace, body, status: int):
+        self._instrumentation = instrumentation
+        self._trace = trace
+        self._body = body
+        self._iterator = iter(body)
+        self._status = status
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        _local.trace = self._trace
+        self._trace.thread = threading.get_ident()
+        try:
+            return next(self._iterator)
+        except StopIteration:
+            self.close()
+            raise
+        except BaseException:
+            # The status line is already sent; the metrics still count a failure
+            self._status = 500
+            self.close()
+            raise
+        finally:
+            _local.trace = None
+
+    def close(self):
+        trace, self._trace = self._trace, None
+        if trace is None:
+            return
+        try:
+            if hasattr(self._body, 'close'):
+                self._body.close()
+        finally:
+            self._instrumentation._record(trace, self._status)
+
+
+class RequestInstrumentation:
+    """Request counts, latency and per-stage histograms labelled by endpoint and model.
+
+    ``begin(endpoint)`` and ``end(status)`` bracket a request on its handling
+    thread; ``stage`` blocks in between are recorded against it. A streamed
+    response is ended by the body ``stream`` returns instead. With a
+    ``profiler``, slow requests also get their stacks sampled.
+    """
+
+    def __init__(self, profiler: SlowRequestProfiler | None = None, metrics: MetricsRegistry = REGISTRY):
+        self.profiler = profiler
+        self._requests = metrics.counter('ml_requests_total', 'Requests by endpoint, model and status',
+                                         ('endpoint', 'model', 'status'))
+        self._latency = metrics.histogram('ml_request_seconds', 'End-to-end request handling time',
+                                          ('endpoint', 'model'))
+        self._stages = metrics.histogram('ml_request_stage_seconds', 'Time per request stage',
+                                         ('endpoint', 'model', 'stage'), buckets=STAGE_BUCKETS)
+
+    def begin(self, endpoint: str) -> RequestTrace:
+        trace = _local.trace = RequestTrace(endpoint)
+        if self.profiler is not None:
+            self.profiler.begin(trace)
+        return trace
+
+    def end(self, status: int):
+        trace = _local.trace
+        # A streaming request is ended by its body, not by the request teardown
+        if trace is None or trace.streaming:
+            return
+        _local.trace = None
+        self._record(trace, status)
+
+    def stream(self, body, status: int):
+        """Hand the current request to its streamed ``body``; returns the body to send instead."""
+        trace = _local.trace
+        if trace is None:
+            return body
+        _local.trace = None
+        trace.streaming = True
+        return _TracedStream(self, trace, body, status)
+
+    def _record(self, trace: RequestTrace, status: int):
+        duration = time.perf_counter() - trace.started
+        self._requests.inc(endpoint=trace.endpoint, model=trace.model, status=status)
+        self._latency.observe(duration, endpoint=trace.endpoint, model=trace.model)
+        for name, seconds in trace.stages:
+            self._stages.observe(seconds, endpoint=trace.endpoint, model=trace.model, stage=name)
+        if self.profiler is not None:
+            self.profiler.end(trace, duration)
@@ -0,0 +1,198 @@
+"""
+Pre-fork WSGI server: load models once in a master process, then fork workers
+that share them copy-on-write
+"""
+
+from __future__ import annotations
+import gc
+import logging
+import os
+import select
+import signal
+import socket
+import threading
+import time
+from typing import Callable
+
+from werkzeug.serving import make_server
+
+logger = logging.getLogger(__name__)
+
+
+class PreforkServer:
+    """Master process that preloads, binds one socket and supervises forked workers.
+
+    ``preload()`` runs once in the master before any fork, so everything it
+    loads is shared by the workers until they write to it. Garbage collection
+    is disabled while preloading and the surviving objects are frozen
+    (``gc.freeze``) before forking, so the collector never touches those
+    pages in a worker. Each worker serves the same listening socket with a
+    threaded WSGI server and can be pinned to one CPU. ``post_fork(slot)``
+    runs in each worker before it starts serving, e.g. to start threads,
+    which do not survive a fork.
+
+    Signals to the master: SIGHUP replaces workers one at a time (each new
+    worker is accepting before the old one is stopped), SIGTERM/SIGINT stop
+    all workers, giving in-flight requests ``graceful_timeout`` seconds.
+    Workers that die are replaced.
+    """
+
+    def __init__(self, app, host: str, port: int, workers: int, preload: Callable[[], None] | None = None,
+                 post_fork: Callable[[int], None] | None = None, cpu_affinity: bool = False,
+                 graceful_timeout: float = 30.0, backlog: int = 2048):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.workers = max(1, int(workers))
+        self.preload = preload
+        self.post_fork = post_fork
+        self.cpu_affinity = cpu_affinity and hasattr(os, 'sched_setaffinity')
+        self.graceful_timeout = graceful_timeout
+        self.backlog = backlog
+        self.cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else []
+        self.socket: socket.socket | None = None
+        self._slots: dict[int, int] = {}  # pid -> slot
+        self._stopping = False
+        self._restart_requested = False
+
+    def run(self):
+        started = time.perf_counter()
+        gc.disable()
+        if self.preload is not None:
+            self.preload()
+        gc.collect()
+        gc.freeze()
+        gc.enable()
+        logger.info(f"Preloaded in {time.perf_counter() - started:.2f}s; "
+                    f"{gc.get_freeze_count()} objects frozen for copy-on-write sharing")
+
+        self.socket = socket.create_server((self.host, self.port), backlog=self.backlog)
+        signal.signal(signal.SIGHUP, self._on_hup)
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+
+        for slot in range(self.workers):
+            self._spawn(slot)
+        logger.info(f"{self.workers} workers serving on http://{self.host}:{self.port} "
+                    f"in {time.perf_counter() - started:.2f}s")
+
+        try:
+            while not self._stopping:
+                self._reap()
+                if self._restart_requested:
+                    self._restart_requested = False
+                    self._rolling_restart()
+                for slot in set(range(self.workers)) - set(self._slots.values()):
+                    if not self._stopping:
+                        logger.warning(f"Worker slot {slot} is empty; starting a new worker")
+                        self._spawn(slot)
+                time.sleep(0.2)
+        finally:
+            self._stop_all()
+            self.socket.close()
+
+    def _on_hup(self, signum, frame):
+        self._restart_requested = True
+
+    def _on_stop(self, signum, frame):
+        self._stopping = True
+
+    def _spawn(self, slot: int) -> int:
+        """Fork a worker for ``slot`` and wait until it is accepting connections"""
+        ready_read, ready_write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(ready_read)
+            status = 1
+            try:
+                self._serve(slot, ready_write)
+                status = 0
+            except BaseException:
+                logger.exception(f"Worker {slot} crashed")
+            finally:
+                os._exit(status)
+
+        os.close(ready_write)
+        self._slots[pid] = slot
+        try:
+            if not select.select([ready_read], [], [], self.graceful_timeout)[0] or not os.read(ready_read, 1):
+                logger.warning(f"Worker {pid} (slot {slot}) did not report ready")
+        finally:
+            os.close(ready_read)
+        return pid
+
+    def _serve(self, slot: int, ready_fd: int):
+        """Worker body: serve the inherited socket until SIGTERM"""
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        if self.cpu_affinity and self.cpus:
+            os.sched_setaffinity(0, {self.cpus[slot % len(self.cpus)]})
+        if self.post_fork is not None:
+            self.post_fork(slot)
+
+        server = make_server(self.host, self.port, self.app, threaded=True, fd=self.socket.fileno())
+        # Let in-flight requests finish when shutting down
+        server.daemon_threads = False
+        server.block_on_close = True
+        signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=server.shutdown).start())
+
+        os.write(ready_fd, b'1')
+        os.close(ready_fd)
+        server.serve_forever()
+        server.server_close()
+
+    def _reap(self) -> list[int]:
+        exited = []
+        while self._slots:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            slot = self._slots.pop(pid, None)
+            if slot is not None and not self._stopping:
+                logger.info(f"Worker {pid} (slot {slot}) exited with status {os.waitstatus_to_exitcode(status)}")
+            exited.append(pid)
+        return exited
+
+    def _wait_for(self, pids: set[int], timeout: float) -> set[int]:
+        """Wait for ``pids`` to exit; returns those still running after ``timeout``"""
+        deadline = time.monotonic() + timeout
+        pids = set(pids)
+        while pids and time.monotonic() < deadline:
+            pids -= set(self._reap())
+            pids &= set(self._slots)
+            if pids:
+                time.sleep(0.05)
+        return pids
+
+    def _terminate(self, pids: set[int]):
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in self._wait_for(pids, self.graceful_timeout):
+            logger.warning(f"Worker {pid} did not stop within {self.graceful_timeout}s; killing it")
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        self._wait_for(pids, 5)
+
+    def _rolling_restart(self):
+        """Replace workers one at a time so the socket always has live acceptors"""
+        logger.info('Rolling restart of all workers')
+        for pid, slot in sorted(self._slots.items(), key=lambda item: item[1]):
+            if self._stopping:
+                return
+            if pid not in self._slots:
+                continue
+            self._spawn(slot)
+            self._terminate({pid})
+        logger.info('Rolling restart finished')
+
+    def _stop_all(self):
+        logger.info(f"Stopping {len(self._slots)} workers")
+        self._terminate(set(self._slots))
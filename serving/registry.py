@@ -0,0 +1,180 @@
+"""
+Thread-safe model registry with parallel warmup and per-model readiness
+"""
+
+from __future__ import annotations
+import logging
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable
+
+from serving.metrics import REGISTRY, MetricsRegistry
+
+logger = logging.getLogger(__name__)
+
+PENDING, LOADING, READY, FAILED = 'pending', 'loading', 'ready', 'failed'
+
+
+class ModelRegistry:
+    """Loads models once per key, even when many threads ask at the same time.
+
+    ``loader(key)`` builds the object to cache; the optional
+    ``warmup(key, obj)`` runs a dummy inference so lazy caches are filled
+    before the key is reported ready. Failed loads are not cached, so the
+    next ``get`` retries. ``reload(key)`` builds and warms a replacement
+    while the current object keeps serving, then swaps it in.
+    """
+
+    def __init__(self, loader: Callable[[str], Any], warmup: Callable[[str, Any], None] | None = None,
+                 metrics: MetricsRegistry = REGISTRY):
+        self.loader = loader
+        self.warmup = warmup
+        self._entries: dict[str, Any] = {}
+        self._status: dict[str, dict] = {}
+        self._locks: dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._warmup_thread: threading.Thread | None = None
+
+        self._load_seconds = metrics.gauge(
+            'ml_model_load_seconds', 'Time to load a model artifact', ('model',))
+        self._warmup_seconds = metrics.gauge(
+            'ml_model_warmup_seconds', 'Time for the warmup inference of a model', ('model',))
+        self._cold_start_seconds = metrics.gauge(
+            'ml_cold_start_seconds', 'Time from warmup start until every model was ready or failed')
+        self._ready = metrics.gauge('ml_model_ready', '1 when a model is loaded and warm', ('model',))
+        self._reloads = metrics.counter('ml_model_reloads_total', 'Hot reloads per model and result',
+                                        ('model', 'result'))
+
+    def _key_lock(self, key: str) -> threading.Lock:
+        with self._lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def _set_status(self, key: str, state: str, **fields):
+        with self._lock:
+            status = self._status.setdefault(key, {'state': PENDING})
+            status.update(state=state, **fields)
+        self._ready.set(1 if state == READY else 0, model=key)
+
+    def get(self, key: str) -> Any:
+        """Return the cached object for a key, loading and warming it if needed."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            return entry
+
+        with self._key_lock(key):
+            entry = self._entries.get(key)
+            if entry is not None:
+                return entry
+
+            self._set_status(key, LOADING, error=None)
+            try:
+                started = time.perf_counter()
+                entry = self.loader(key)
+                load_seconds = time.perf_counter() - started
+
+                started = time.perf_counter()
+                if self.warmup is not None:
+                    self.warmup(key, entry)
+                warmup_seconds = time.perf_counter() - started
+            except Exception as e:
+                self._set_status(key, FAILED, error=str(e))
+                raise
+
+            self._entries[key] = entry
+            self._load_seconds.set(load_seconds, model=key)
+            self._warmup_seconds.set(warmup_seconds, model=key)
+            self._set_status(key, READY, load_seconds=round(load_seconds, 4),
+                             warmup_seconds=round(warmup_seconds, 4))
+            return entry
+
+    def reload(self, key: str) -> Any:
+        """Load and warm a new object for a key, then swap it in atomically.
+
+        Requests already holding the old object finish on it; it is freed
+        once the last of them drops its reference. If loading or warmup
+        fails, the old object stays in place and the error is raised.
+        """
+        with self._key_lock(key):
+            old = self._entries.get(key)
+            try:
+                started = time.perf_counter()
+                entry = self.loader(key)
+                load_seconds = time.perf_counter() - started
+
+                started = time.perf_counter()
+                if self.warmup is not None:
+                    self.warmup(key, entry)
+                warmup_seconds = time.perf_counter() - started
+            except Exception as e:
+                self._reloads.inc(model=key, result='failed')
+                with self._lock:
+                    self._status.setdefault(key, {'state': PENDING})['reload_error'] = str(e)
+                raise
+
+            self._entries[key] = entry
+            self._reloads.inc(model=key, result='ok')
+            self._load_seconds.set(load_seconds, model=key)
+            self._warmup_seconds.set(warmup_seconds, model=key)
+            self._set_status(key, READY, load_seconds=round(load_seconds, 4),
+                             warmup_seconds=round(warmup_seconds, 4), reload_error=None,
+                             reloaded_at=time.time())
+            if old is not None:
+                try:
+                    weakref.finalize(old, logger.info, f"Released previous {key} model")
+                except TypeError:
+                    pass
+            return entry
+
+    def loaded(self) -> dict[str, Any]:
+        """Snapshot of every loaded key and its current object."""
+        return dict(self._entries)
+
+    def peek(self, key: str) -> Any | None:
+        """Return the cached object without loading it."""
+        return self._entries.get(key)
+
+    def warm_all(self, keys: Iterable[str], max_workers: int | None = None) -> threading.Thread:
+        """Load and warm every key concurrently in the background."""
+        keys = list(keys)
+        for key in keys:
+            if key not in self._entries:
+                self._set_status(key, PENDING)
+
+        def run():
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=max_workers or len(keys) or 1,
+                                    thread_name_prefix='model-warmup') as pool:
+                for key, error in zip(keys, pool.map(self._try_get, keys)):
+                    if error:
+                        logger.warning(f"Failed to preload model {key}: {error}")
+            cold_start = time.perf_counter() - started
+            self._cold_start_seconds.set(cold_start)
+            logger.info(f"Model warmup finished in {cold_start:.2f}s")
+
+        self._warmup_thread = threading.Thread(target=run, name='model-warmup', daemon=True)
+        self._warmup_thread.start()
+        return self._warmup_thread
+
+    def _try_get(self, key: str) -> str | None:
+        try:
+            self.get(key)
+            return None
+        except Exception as e:
+            return str(e)
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """Block until a running warm_all has finished; returns False on timeout."""
+        if self._warmup_thread is not None:
+            self._warmup_thread.join(timeout)
+            return not self._warmup_thread.is_alive()
+        return True
+
+    def status(self) -> dict[str, dict]:
+        with self._lock:
+            return {key: dict(status) for key, status in self._status.items()}
+
+    def is_ready(self) -> bool:
+        """True once no model is still pending or loading."""
+        return all(status['state'] in (READY, FAILED) for status in self.status().values())
@@ -0,0 +1,96 @@
+"""
+Background watcher that hot-swaps models when the files behind them change
+"""
+
+from __future__ import annotations
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Callable, Iterable
+
+from serving.registry import ModelRegistry
+
+logger = logging.getLogger(__name__)
+
+
+def stat_signature(paths: Iterable[Path]) -> tuple:
+    """(path, mtime_ns, size) of each file; missing files count as (path, None, None)"""
+    signature = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            signature.append((str(path), stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            signature.append((str(path), None, None))
+    return tuple(signature)
+
+
+class ModelWatcher:
+    """Polls the source files of every loaded model and reloads those whose content changed.
+
+    Loaded objects expose ``signature`` (the ``stat_signature`` of their
+    files, taken before they were read) and ``version`` (a content hash).
+    Each poll only stats files; ``version_for(key)`` rehashes them when
+    mtime or size moved, so touching a file without changing it does not
+    trigger a reload. Reloads run on the watcher thread through
+    ``registry.reload`` while the old model keeps serving; ``on_reload(key,
+    old, new)`` runs after each swap.
+    """
+
+    def __init__(self, registry: ModelRegistry, files_for: Callable[[str], list[Path]],
+                 version_for: Callable[[str], str], interval: float = 1.0,
+                 on_reload: Callable[[str, object, object], None] | None = None):
+        self.registry = registry
+        self.files_for = files_for
+        self.version_for = version_for
+        self.interval = interval
+        self.on_reload = on_reload
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> threading.Thread:
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='model-watcher', daemon=True)
+            self._thread.start()
+        return self._thread
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                logger.error(f"Model watcher poll failed: {e}")
+
+    def check(self) -> list[str]:
+        """One poll over every loaded model; returns the keys that were reloaded."""
+        reloaded = []
+        for key, entry in self.registry.loaded().items():
+            signature = None
+            try:
+                signature = stat_signature(self.files_for(key))
+                if signature == entry.signature:
+                    continue
+                if any(mtime is None for _, mtime, _ in signature):
+                    # Mid-replace or removed; keep serving the loaded model
+                    continue
+                if self.version_for(key) == entry.version:
+                    entry.signature = signature
+                    continue
+                logger.info(f"Model files for {key} changed; loading the new version in the background")
+                new = self.registry.reload(key)
+            except Exception as e:
+                logger.error(f"Hot reload of {key} failed; still serving version {entry.version}: {e}")
+                if signature is not None:
+                    # Retry only once the files change again
+                    entry.signature = signature
+                continue
+            logger.info(f"Swapped {key} from version {entry.version} to {new.version}")
+            if self.on_reload is not None:
+                self.on_reload(key, entry, new)
+            reloaded.append(key)
+        return reloaded
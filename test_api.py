@@ -0,0 +1,238 @@
+"""
+Flask test-client tests for the prediction service endpoints
+
+Models are small estimators fitted on synthetic rows and pickled to a
+temporary directory, so these run without the trained artifacts in Git LFS.
+"""
+
+import json
+import os
+import pickle
+
+# Read by ml_service at import: no background warmup, watcher or ONNX sessions
+os.environ.setdefault('ML_EAGER_WARMUP', '0')
+os.environ.setdefault('ML_MODEL_WATCH', '0')
+os.environ.setdefault('ML_BACKEND', 'sklearn')
+
+import numpy as np  # noqa: E402
+import pytest  # noqa: E402
+from sklearn.ensemble import RandomForestClassifier  # noqa: E402
+from sklearn.linear_model import LogisticRegression  # noqa: E402
+from sklearn.naive_bayes import MultinomialNB  # noqa: E402
+from sklearn.preprocessing import StandardScaler  # noqa: E402
+
+import ml_service  # noqa: E402
+
+SYMPTOMS = ['cough', 'fever', 'chills', 'headache', 'nausea', 'fatigue', 'wheezing', 'vomiting']
+HEART = {'age': 54, 'sex': 1, 'cp': 2, 'trestbps': 130, 'chol': 240, 'fbs': 0, 'restecg': 1,
+         'thalach': 150, 'exang': 0, 'oldpeak': 1.0, 'slope': 1, 'ca': 0, 'thal': 2}
+
+
+def symptom_bundle():
+    """A common-model bundle in the layout ML/common.py saves"""
+    rng = np.random.default_rng(0)
+    x = (rng.random((120, len(SYMPTOMS))) < 0.3).astype(np.float32)
+    y = np.array(['flu', 'cold', 'migraine', 'food poisoning'], dtype=object)[np.argmax(x[:, :4], axis=1)]
+    naive_bayes = MultinomialNB().fit(x, y)
+    forest = RandomForestClassifier(n_estimators=10, max_depth=5, random_state=0).fit(x, y)
+    return {'feature_cols': SYMPTOMS, 'best_model': naive_bayes, 'nb_model': naive_bayes,
+            'ensemble_model': forest, 'rf_model': forest, 'scaler': StandardScaler().fit(x)}
+
+
+def heart_model():
+    rng = np.random.default_rng(1)
+    features = ml_service.FEATURE_MAPPINGS['heart']
+    x = rng.normal(size=(200, len(features))) * 10 + 50
+    return LogisticRegression(max_iter=1000).fit(x, (x[:, 0] > 50).astype(int))
+
+
+@pytest.fixture(scope='module')
+def client(tmp_path_factory):
+    directory = tmp_path_factory.mktemp('models')
+    paths = {'common': directory / 'common.pkl', 'heart': directory / 'heart.sav'}
+    for model, path in ((symptom_bundle(), paths['common']), (heart_model(), paths['heart'])):
+        with open(path, 'wb') as f:
+            pickle.dump(model, f)
+
+    model_paths = dict(ml_service.MODEL_PATHS)
+    ml_service.MODEL_PATHS.update(common=paths['common'], common_teacher=paths['common'], heart=paths['heart'])
+    for key in ('diabetes', 'parkinsons', 'decision_tree'):
+        ml_service.MODEL_PATHS[key] = directory / f"{key}-missing.sav"
+    yield ml_service.app.test_client()
+    ml_service.MODEL_PATHS.clear()
+    ml_service.MODEL_PATHS.update(model_paths)
+
+
+def test_predict_symptoms(client):
+    response = client.post('/predict', json={'model': 'common', 'data': {'symptoms': ['cough', 'fever']}})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['prediction'] in {'flu', 'cold', 'migraine', 'food poisoning'}
+    assert 0 < body['confidence'] <= 1
+
+
+def test_predict_features(client):
+    response = client.post('/predict', json={'model': 'heart', 'data': HEART})
+    assert response.status_code == 200
+    assert response.get_json()['prediction'] in (0, 1)
+
+
+@pytest.mark.parametrize('body, message', [
+    ([1, 2], 'Request body must be a JSON object'),
+    ({'model': ['common'], 'data': {}}, 'model must be a string'),
+])
+@pytest.mark.parametrize('url', ['/predict', '/predict/batch', '/predict/topk'])
+def test_prediction_routes_reject_bad_bodies(client, url, body, message):
+    response = client.post(url, json=body)
+    assert response.status_code == 400
+    assert response.get_json()['error'] == message
+
+
+@pytest.mark.parametrize('url', ['/predict', '/predict/batch'])
+def test_prediction_routes_require_a_model(client, url):
+    response = client.post(url, json={'data': {}})
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Missing model parameter'
+
+
+def test_topk_rejects_a_non_list_batch(client):
+    response = client.post('/predict/topk', json={'model': 'common', 'records': {'symptoms': ['cough']}})
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'records must be a list'
+
+
+def test_predict_reports_invalid_symptoms_as_400(client):
+    response = client.post('/predict', json={'model': 'common', 'data': {'symptoms': [None]}})
+    assert response.status_code == 400
+    assert response.get_json()['details'] == 'symptoms must be a list of strings'
+
+
+def test_batch_reports_errors_per_record(client):
+    records = [{'symptoms': ['cough']}, {'symptoms': 'cough'}, [1], {'symptoms': ['fever', 'chills']}]
+    response = client.post('/predict/batch', json={'model': 'common', 'records': records})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert (body['count'], body['errors']) == (4, 2)
+    assert [result['index'] for result in body['results']] == [0, 1, 2, 3]
+    assert body['results'][1]['error'] == 'symptoms must be a list'
+    assert body['results'][2]['error'] == 'Record must be a JSON object'
+    assert 'prediction' in body['results'][3]
+
+
+def test_batch_matches_single_predictions(client):
+    records = [dict(HEART, age=age) for age in (30, 50, 70)]
+    batch = client.post('/predict/batch', json={'model': 'heart', 'records': records}).get_json()['results']
+    for record, result in zip(records, batch):
+        single = client.post('/predict', json={'model': 'heart', 'data': record}).get_json()
+        assert single['prediction'] == result['prediction']
+        assert single['probabilities'] == pytest.approx(result['probabilities'])
+
+
+def test_batch_limit(client, monkeypatch):
+    monkeypatch.setattr(ml_service, 'MAX_BATCH_RECORDS', 2)
+    response = client.post('/predict/batch', json={'model': 'heart', 'records': [HEART] * 3})
+    assert response.status_code == 413
+
+
+def test_stream_scores_lines_and_reports_bad_ones(client):
+    lines = [json.dumps({'symptoms': ['cough']}), 'not json', json.dumps({'symptoms': ['fever']})]
+    response = client.post('/predict/stream?model=common', data='\n'.join(lines) + '\n')
+    assert response.status_code == 200
+    results = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [result['index'] for result in results] == [0, 1, 2]
+    assert results[1]['error'].startswith('Invalid JSON')
+    assert 'prediction' in results[0] and 'prediction' in results[2]
+
+
+def test_stream_reports_a_failed_chunk_per_record(client, monkeypatch):
+    monkeypatch.setattr(ml_service, 'STREAM_CHUNK_SIZE', 2)
+    score_records = ml_service.score_records
+    calls = []
+
+    def fail_second_chunk(model_key, records, offset=0):
+        calls.append(offset)
+        if len(calls) == 2:
+            raise RuntimeError('backend went away')
+        return score_records(model_key, records, offset)
+
+    monkeypatch.setattr(ml_service, 'score_records', fail_second_chunk)
+    body = ''.join(json.dumps({'symptoms': ['cough']}) + '\n' for _ in range(5))
+    results = [json.loads(line) for line in
+               client.post('/predict/stream?model=common', data=body).get_data(as_text=True).splitlines()]
+    assert [result['index'] for result in results] == [0, 1, 2, 3, 4]
+    assert [result['error'] for result in results[2:4]] == ['Prediction failed: backend went away'] * 2
+    assert 'prediction' in results[4]
+
+
+def test_stream_requires_a_model(client):
+    assert client.post('/predict/stream', data='{}\n').status_code == 400
+
+
+def test_topk_ranks_predictions(client):
+    response = client.post('/predict/topk', json={'model': 'common', 'data': {'symptoms': ['cough']}, 'k': 3})
+    assert response.status_code == 200
+    predictions = response.get_json()['predictions']
+    assert [prediction['rank'] for prediction in predictions] == [1, 2, 3]
+    probabilities = [prediction['probability'] for prediction in predictions]
+    assert probabilities == sorted(probabilities, reverse=True)
+
+
+def test_topk_batch_and_min_probability(client):
+    response = client.post('/predict/topk', json={'model': 'common', 'records': [{'symptoms': ['fever']}, 'x'],
+                                                  'k': 4, 'min_probability': 0.2})
+    results = response.get_json()['results']
+    assert all(prediction['probability'] >= 0.2 for prediction in results[0]['predictions'])
+    assert results[1]['error'] == 'Record must be a JSON object'
+
+
+def test_screen_runs_applicable_models(client):
+    response = client.post('/screen', json={'data': dict(HEART, symptoms=['cough', 'fever'])})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert set(body['results']) == {'heart', 'common'}
+    assert 'pregnancies' in body['skipped']['diabetes']['missing']
+
+
+@pytest.mark.parametrize('body, message', [
+    ({'data': {}, 'models': ['common', {'a': 1}]}, 'models must be a list of model names'),
+    ({'data': {}, 'models': 'common'}, 'models must be a list of model names'),
+    ({'data': []}, 'data must be a JSON object'),
+    (['common'], 'Request body must be a JSON object'),
+])
+def test_screen_rejects_bad_bodies(client, body, message):
+    response = client.post('/screen', json=body)
+    assert response.status_code == 400
+    assert response.get_json()['error'] == message
+
+
+def test_models_reports_the_served_estimator(client):
+    client.post('/predict', json={'model': 'common', 'data': {'symptoms': ['cough']}})
+    models = {model['key']: model for model in client.get('/models').get_json()['available_models']}
+    status = models['common']['backend']
+    assert status['estimator'] == 'best_model'
+    assert status['estimator_reason'] == 'bundle has no student_model'
+    assert 'diabetes' not in models
+
+
+def test_health_is_degraded_with_some_models_failed(client, monkeypatch):
+    ml_service.model_registry.warm_all(ml_service.MODEL_PATHS, max_workers=2)
+    ml_service.model_registry._warmup_thread.join()
+    response = client.get('/health')
+    body = response.get_json()
+    assert response.status_code == 200
+    assert body['status'] == 'degraded' and body['ready']
+    assert body['models']['common']['state'] == 'ready'
+    assert body['models']['diabetes']['state'] == 'failed'
+
+    monkeypatch.setattr(ml_service, 'REQUIRED_MODELS', ['common', 'diabetes'])
+    response = client.get('/health')
+    assert response.status_code == 503
+    assert response.get_json()['unavailable'] == ['diabetes']
+
+
+def test_health_is_503_when_every_model_failed(client, monkeypatch):
+    monkeypatch.setattr(ml_service.model_registry, 'status',
+                        lambda: {key: {'state': 'failed'} for key in ml_service.MODEL_PATHS})
+    response = client.get('/health')
+    assert response.status_code == 503
+    assert response.get_json()['status'] == 'unavailable'
@@ -0,0 +1,204 @@
+"""
+Parity and round-trip tests for the serving engines, caches and training helpers
+
+Every model is fitted on small synthetic data, so these run without the
+trained artifacts in Git LFS.
+"""
+
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import sparse
+from sklearn.base import clone
+from sklearn.ensemble import GradientBoostingClassifier, RandomForestClassifier, VotingClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.naive_bayes import MultinomialNB
+from sklearn.preprocessing import StandardScaler
+from sklearn.svm import SVC
+from sklearn.tree import DecisionTreeClassifier
+
+from ML.incremental import changed_rows, refit_forest_trees, refit_naive_bayes, row_hashes
+from ML.linear_engine import SparseLinearScorer
+from ML.model_store import load_any, resolve_artifact, save_artifact
+from ML.pivot import SymptomPivot
+from ML.svm_engine import ApproximateSVC
+from ML.tree_engine import FlatTreeEnsemble
+from serving.backends import (ApproximateSVMBackend, LinearScorerBackend, SklearnBackend, TreeEngineBackend,
+                              check_parity)
+from serving.cache import ResultCache
+from serving.metrics import MetricsRegistry
+
+
+def symptom_rows(n_rows=240, n_features=40, n_classes=6, seed=0):
+    """Binary symptom rows whose class decides which features tend to be set"""
+    rng = np.random.default_rng(seed)
+    y = rng.integers(n_classes, size=n_rows)
+    profile = rng.random((n_classes, n_features)) < 0.25
+    x = ((profile[y] & (rng.random((n_rows, n_features)) < 0.8))
+         | (rng.random((n_rows, n_features)) < 0.03)).astype(np.float32)
+    return x, np.array([f"disease {label}" for label in y], dtype=object)
+
+
+def numeric_rows(n_rows=300, n_features=8, n_classes=4, seed=0):
+    rng = np.random.default_rng(seed)
+    y = rng.integers(n_classes, size=n_rows)
+    x = rng.normal(size=(n_rows, n_features)) + y[:, np.newaxis] * rng.normal(size=n_features)
+    return x.astype(np.float32), y
+
+
+@pytest.mark.parametrize('estimator', [
+    DecisionTreeClassifier(max_depth=6, random_state=0),
+    RandomForestClassifier(n_estimators=15, max_depth=6, random_state=0),
+    GradientBoostingClassifier(n_estimators=15, max_depth=3, random_state=0),
+], ids=['decision_tree', 'random_forest', 'gradient_boosting'])
+@pytest.mark.parametrize('rows', [symptom_rows, numeric_rows], ids=['binary', 'numeric'])
+def test_tree_engine_matches_estimator(estimator, rows):
+    x, y = rows()
+    model = clone(estimator).fit(x, y)
+    engine = FlatTreeEnsemble(model, max_rows=None)
+    parity = check_parity(SklearnBackend(model), TreeEngineBackend(engine), x,
+                          label_tolerance=0.0, probability_tolerance=1e-9)
+    assert parity['passed'], parity
+
+
+def test_tree_engine_matches_soft_voting_ensemble_on_sparse_rows():
+    x, y = symptom_rows()
+    ensemble = VotingClassifier([
+        ('dt', DecisionTreeClassifier(max_depth=5, random_state=0)),
+        ('rf', RandomForestClassifier(n_estimators=10, max_depth=5, random_state=0)),
+    ], voting='soft', flatten_transform=False).fit(x, y)
+    engine = FlatTreeEnsemble(ensemble, max_rows=None)
+    np.testing.assert_allclose(engine.predict_proba(sparse.csr_matrix(x)), ensemble.predict_proba(x), atol=1e-9)
+
+
+@pytest.mark.parametrize('estimator, scaled', [
+    (MultinomialNB(), False),
+    (LogisticRegression(max_iter=500), False),
+    (LogisticRegression(max_iter=500), True),
+], ids=['nb', 'lr', 'lr_scaled'])
+def test_linear_scorer_matches_estimator(estimator, scaled):
+    x, y = symptom_rows()
+    scaler = StandardScaler().fit(x) if scaled else None
+    model = clone(estimator).fit(scaler.transform(x) if scaled else x, y)
+    reference = SklearnBackend(model, transform=scaler.transform if scaled else None)
+    candidate = LinearScorerBackend(SparseLinearScorer(model, scaler=scaler))
+    parity = check_parity(reference, candidate, x, label_tolerance=0.0, probability_tolerance=1e-6)
+    assert parity['passed'], parity
+    np.testing.assert_allclose(candidate.predict(sparse.csr_matrix(x))[1], reference.predict(x)[1], atol=1e-6)
+
+
+@pytest.mark.filterwarnings('ignore::FutureWarning')
+@pytest.mark.parametrize('kernel', ['rbf', 'linear'])
+def test_svm_approximation_keeps_labels_and_probabilities(kernel):
+    x, y = numeric_rows()
+    model = SVC(kernel=kernel, probability=True, random_state=0).fit(x, y)
+    reference = SklearnBackend(model)
+    candidate = ApproximateSVMBackend(ApproximateSVC(model, coupling='solve'))
+    labels, _ = reference.predict(x)
+    np.testing.assert_array_equal(labels, model.predict(x))
+    parity = check_parity(reference, candidate, x, label_tolerance=0.0, probability_tolerance=0.01)
+    assert parity['passed'], parity
+
+
+@pytest.mark.filterwarnings('ignore::FutureWarning')
+def test_reduced_svm_fails_a_tight_parity_check():
+    x, y = numeric_rows()
+    model = SVC(probability=True, random_state=0).fit(x, y)
+    candidate = ApproximateSVMBackend(ApproximateSVC(model, n_components=4, coupling='solve'))
+    assert not check_parity(SklearnBackend(model), candidate, x, 0.0, 0.01)['passed']
+
+
+def test_symptom_pivot_appends_and_round_trips(tmp_path):
+    edges = tmp_path / 'edges.csv'
+    edges.write_text('Source,Target,Weight\nflu,fever,2\nflu,cough,1\ncold,cough,3\n')
+    pivot = SymptomPivot.from_edges(edges)
+    assert pivot.diseases == ['cold', 'flu'] and pivot.symptoms == ['cough', 'fever']
+    assert pivot.matrix().toarray().tolist() == [[1, 0], [1, 1]]
+
+    with open(edges, 'a') as f:
+        f.write('asthma,wheezing,1\nflu,cough,5\n')
+    assert pivot.update_from(edges) == 1
+    # New names go at the end, so existing positions never move
+    assert pivot.diseases == ['cold', 'flu', 'asthma'] and pivot.symptoms == ['cough', 'fever', 'wheezing']
+    assert pivot.matrix(weighted=True)[1, 0] == 5
+
+    pivot.save(tmp_path / 'pivot.npz')
+    loaded = SymptomPivot.load(tmp_path / 'pivot.npz')
+    assert (loaded.diseases, loaded.symptoms) == (pivot.diseases, pivot.symptoms)
+    assert (loaded.matrix(weighted=True) != pivot.matrix(weighted=True)).nnz == 0
+    assert loaded.update_from(edges) == 0
+
+
+def test_symptom_pivot_rebuilds_when_the_csv_is_rewritten(tmp_path):
+    edges = tmp_path / 'edges.csv'
+    edges.write_text('Source,Target,Weight\nflu,fever,2\n')
+    pivot = SymptomPivot.from_edges(edges)
+    edges.write_text('Source,Target,Weight\ncold,cough,1\n')
+    pivot.update_from(edges)
+    assert pivot.diseases == ['cold'] and pivot.symptoms == ['cough']
+
+
+def test_result_cache_lru_ttl_and_invalidation(monkeypatch):
+    cache = ResultCache(max_entries=2, ttl_seconds=10, metrics=MetricsRegistry())
+    rows = [np.array([i, 0, 1], dtype=np.float32) for i in range(3)]
+    cache.put('heart', 'v1', rows[0], {'prediction': 0})
+    cache.put('heart', 'v1', rows[1], {'prediction': 1})
+    assert cache.get('heart', 'v1', rows[0]) == {'prediction': 0}
+    # rows[1] is now least recently used
+    cache.put('heart', 'v1', rows[2], {'prediction': 2})
+    assert cache.get('heart', 'v1', rows[1]) is None
+    assert cache.get('heart', 'v2', rows[0]) is None
+
+    cache.invalidate('heart')
+    assert cache.stats()['entries'] == 0
+
+    cache.put('heart', 'v1', rows[0], {'prediction': 0})
+    now = time.monotonic()
+    monkeypatch.setattr('serving.cache.time.monotonic', lambda: now + 11)
+    assert cache.get('heart', 'v1', rows[0]) is None
+
+
+def test_model_store_round_trip_is_memory_mapped(tmp_path):
+    x, y = numeric_rows()
+    model = RandomForestClassifier(n_estimators=5, random_state=0).fit(x, y)
+    bundle = {'model': model, 'scaler': StandardScaler().fit(x), 'weights': np.arange(5000, dtype=np.float64)}
+    save_artifact(bundle, tmp_path / 'bundle')
+
+    assert resolve_artifact(tmp_path / 'bundle.pkl') == tmp_path / 'bundle'
+    loaded = load_any(tmp_path / 'bundle')
+    assert isinstance(loaded['weights'], np.memmap)
+    np.testing.assert_array_equal(loaded['weights'], bundle['weights'])
+    np.testing.assert_array_equal(loaded['model'].predict_proba(x), model.predict_proba(x))
+
+
+def test_refit_forest_trees_equals_a_fresh_fit():
+    x, y = symptom_rows()
+    forest = RandomForestClassifier(n_estimators=20, max_depth=8, random_state=0).fit(x, y)
+    x_new = x.copy()
+    x_new[[3, 50]] = 1 - x_new[[3, 50]]
+    changed = changed_rows({'hashes': row_hashes(x, y, [str(i) for i in range(x.shape[1])]), 'labels': list(y)},
+                           row_hashes(x_new, y, [str(i) for i in range(x.shape[1])]), y)
+    assert changed.tolist() == [3, 50]
+
+    refitted = refit_forest_trees(forest, sparse.csr_matrix(x_new), y, changed)
+    assert 0 < refitted <= len(forest.estimators_)
+    fresh = clone(forest).fit(x_new, y)
+    np.testing.assert_array_equal(forest.predict_proba(x_new), fresh.predict_proba(x_new))
+
+
+def test_refit_naive_bayes_equals_a_fresh_fit():
+    x, y = symptom_rows()
+    model = MultinomialNB().fit(x, y)
+    x_new = x.copy()
+    x_new[y == 'disease 2'] = 1 - x_new[y == 'disease 2']
+    refit_naive_bayes(model, pd.DataFrame(x_new), y, ['disease 2'])
+    np.testing.assert_allclose(model.predict_proba(x_new), MultinomialNB().fit(x_new, y).predict_proba(x_new))
+
+
+def test_changed_rows_refuses_a_different_shape():
+    x, y = symptom_rows(n_rows=20)
+    hashes = row_hashes(x, y, [str(i) for i in range(x.shape[1])])
+    assert changed_rows({'hashes': hashes[:-1], 'labels': list(y[:-1])}, hashes, y) is None
+    assert changed_rows(None, hashes, y) is None